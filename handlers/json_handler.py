@@ -3,13 +3,14 @@ import json
 import typing
 
 ## custom modules
+from modules.common.translation_job import JobScoped
 from modules.common.file_ensurer import FileEnsurer
 from modules.common.logger import Logger
 from modules.common.toolkit import Toolkit
 
 ##-------------------start-of-JsonHandler---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-class JsonHandler:
+class JsonHandler(metaclass=JobScoped):
 
     """
     
@@ -52,13 +53,21 @@ sentence_fragmenter_mode : 1 or 2 or 3 (1 - via regex and other nonsense, 2 - NL
 
 je_check_mode : 1 or 2, 1 will print out the jap then the english below separated by ---, 2 will attempt to pair the english and jap sentences, placing the jap above the eng. If it cannot, it will default to 1. Use 2 for gpt-4.
 
-num_malformed_batch_retries : How many times Kijiku will attempt to mend a malformed batch, only for gpt4. Be careful with increasing as cost increases at (cost * length * n) at worst case.
+num_malformed_batch_retries : How many times Kijiku will attempt to mend a malformed batch, only for gpt4. Be careful with increasing as cost increases at (cost * length * n) at worst case. Each retry first tries to keep the lines that line up with the Japanese and only re-request the ones that don't, only resending the whole batch if most of it is off.
 
 batch_retry_timeout : How long Kijiku will try to translate a batch in seconds, if a requests exceeds this duration, Kijiku will leave it untranslated.
 
-num_concurrent_batches : How many translations batches Kijiku will send to OpenAI at a time.
+num_concurrent_batches : How many translations batches Kijiku will send to OpenAI at a time. Kijiku starts lower and raises or lowers the number as OpenAI allows (backing off on rate limits and rising latency), this is the most it will ever send at once.
+
+batch_packing_mode : 1 or 2. 1 builds batches of num_lines lines. 2 packs each batch up to num_tokens_per_batch tokens instead, which sends far fewer requests on dialogue heavy text and keeps long narration from overflowing the context. In mode 2, lines that are too long for a batch on their own are split at the end of their sentences.
+
+num_tokens_per_batch : The number of tokens of Japanese text to pack into a batch when batch_packing_mode is 2. Kijiku will lower this if the batch, the system message and the expected translation would not fit in the model's context length.
+
+line_deduplication_mode : 1 or 2. 1 sends every line as it is. 2 sends each distinct line only once per run, so repeated lines like 「はい」, 「え？」, scene separators and chapter headers are translated the first time they appear and that translation is reused everywhere else they occur. The tokens this saves are shown with the cost estimate. A repeat is left untranslated if its first occurrence comes back malformed.
 ----------------------------------------------------------------------------------
 stream, logit_bias, stop and n are included for legacy purposes, current versions of Kudasai will hardcode their values when validating the Kijiku_rule.json to their default values.
+
+rate limit settings : An optional section of Kijiku_rule.json, separate from open ai settings, that sets your account's limits per model so Kijiku can pace its requests instead of running into them. i.e. "rate limit settings": {"gpt-4": {"requests_per_minute": 500, "tokens_per_minute": 10000}}. Either limit can be null. Models without an entry are not paced. Your limits are listed at https://platform.openai.com/account/limits.
     """
 
 ##-------------------start-of-validate_json()--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -90,7 +99,10 @@ stream, logit_bias, stop and n are included for legacy purposes, current version
             "je_check_mode",
             "num_malformed_batch_retries",
             "batch_retry_timeout",
-            "num_concurrent_batches"
+            "num_concurrent_batches",
+            "batch_packing_mode",
+            "num_tokens_per_batch",
+            "line_deduplication_mode"
         ]
 
         validation_rules = {
@@ -103,6 +115,9 @@ stream, logit_bias, stop and n are included for legacy purposes, current version
             "message_mode": lambda x: 1 <= x <= 2,
             "sentence_fragmenter_mode": lambda x: 1 <= x <= 3,
             "je_check_mode": lambda x: 1 <= x <= 2,
+            "batch_packing_mode": lambda x: 1 <= x <= 2,
+            "num_tokens_per_batch": lambda x: isinstance(x, int) and x > 0,
+            "line_deduplication_mode": lambda x: 1 <= x <= 2,
         }
 
         try:
@@ -113,6 +128,11 @@ stream, logit_bias, stop and n are included for legacy purposes, current version
             ## assign to a variable to reduce repetitive access
             settings = JsonHandler.current_kijiku_rules["open ai settings"]
 
+            ## settings added in newer versions of Kudasai are filled in with their defaults, so older rules files stay valid
+            for key in keys_list:
+                if(key not in settings):
+                    settings[key] = FileEnsurer.default_kijiku_rules["open ai settings"][key]
+
             ## ensure all keys are present
             assert all(key in settings for key in keys_list)
 
@@ -121,6 +141,12 @@ stream, logit_bias, stop and n are included for legacy purposes, current version
                 if(not validate(settings[key])):
                     raise ValueError(f"Invalid value for {key}")
 
+            ## the rate limit settings are optional, but if present each model needs a requests_per_minute and tokens_per_minute that are positive integers or None
+            for model, limits in JsonHandler.current_kijiku_rules.get("rate limit settings", {}).items():
+                assert model in FileEnsurer.allowed_models
+                assert set(limits.keys()) == {"requests_per_minute", "tokens_per_minute"}
+                assert all(limit is None or (isinstance(limit, int) and limit > 0) for limit in limits.values())
+
             ## force stop/logit_bias into None
             settings["stop"] = None
             settings["logit_bias"] = None
@@ -260,7 +286,10 @@ stream, logit_bias, stop and n are included for legacy purposes, current version
             "je_check_mode": {"type": int, "constraints": lambda x: 1 <= x <= 2},
             "num_malformed_batch_retries": {"type": int},
             "batch_retry_timeout": {"type": int},
-            "num_concurrent_batches": {"type": int}
+            "num_concurrent_batches": {"type": int},
+            "batch_packing_mode": {"type": int, "constraints": lambda x: 1 <= x <= 2},
+            "num_tokens_per_batch": {"type": int, "constraints": lambda x: x > 0},
+            "line_deduplication_mode": {"type": int, "constraints": lambda x: 1 <= x <= 2}
         }
 
         if(setting_name not in type_expectations):
@@ -1,26 +1,31 @@
 ## built-in libraries
 import os
 import sys
+import glob
 import json
 import asyncio
 import re
 import typing
 import traceback
 
-## third-party libraries
-from kairyou import Kairyou
-from kairyou import Indexer
-from kairyou.types import NameAndOccurrence
+from concurrent.futures import Future
 
-## custom modules
-from models.kaiseki import Kaiseki 
-from models.kijiku import Kijiku
+## kairyou, Kaiseki and Kijiku (and the openai, deepl, tiktoken and backoff imports that come with them) are only imported once they are needed, so startup doesn't pay for modules the run won't use
+if(typing.TYPE_CHECKING):
+    from kairyou.types import NameAndOccurrence
 
+## custom modules
 from handlers.json_handler import JsonHandler
 
 from modules.common.toolkit import Toolkit
 from modules.common.file_ensurer import FileEnsurer
 from modules.common.logger import Logger
+from modules.common.response_cache import ResponseCache
+from modules.common.fragment_cache import FragmentCache
+from modules.common.progress_renderer import ProgressRenderer
+from modules.common.name_marker import NameMarker
+from modules.common.stage_cache import StageCache
+from modules.common.knowledge_base_index import KnowledgeBaseIndex
 
 ##-------------------start-of-Kudasai---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -37,8 +42,18 @@ class Kudasai:
     text_to_preprocess:str
     replacement_json:dict
 
+    ## for a run over a directory or glob of files, (file name, text) of each file, empty for a single file
+    texts_to_preprocess:typing.List[typing.Tuple[str, str]] = []
+
     need_to_run_kairyou:bool = True
 
+    ## the update check started at boot, runs while the user is entering their input
+    update_check:Future | None = None
+
+    ## command line arguments, flags (--flag) are kept separate from the positional arguments so they can be given in any order
+    cli_arguments:typing.List[str] = []
+    cli_flags:typing.List[str] = []
+
 ##-------------------start-of-boot()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -56,6 +71,8 @@ class Kudasai:
 
         FileEnsurer.setup_needed_files()
 
+        Kudasai.update_check = Toolkit.start_update_check(FileEnsurer.update_check_cache_path)
+
         Logger.clear_log_file()
 
         Logger.log_barrier()
@@ -81,6 +98,47 @@ class Kudasai:
 
             raise Exception("Invalid kijiku_rules.json file. Please check the file for errors. If you are unsure, delete the file and run Kudasai again. Your kijiku rules file is located at: " + FileEnsurer.config_kijiku_rules_path)
         
+##-------------------start-of-load_input()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def load_input(input_path:str) -> None:
+
+        """
+
+        Loads the text to preprocess from a file, or every file matched by a directory (its .txt files) or a glob.
+
+        Parameters:
+        input_path (str) : the path to a file or directory, or a glob.
+
+        """
+
+        if(os.path.isfile(input_path)):
+            Kudasai.text_to_preprocess = FileEnsurer.standard_read_file(input_path)
+            return
+
+        if(os.path.isdir(input_path)):
+            input_file_paths = glob.glob(os.path.join(input_path, "*.txt"))
+
+        else:
+            input_file_paths = [path for path in glob.glob(input_path) if os.path.isfile(path)]
+
+        if(len(input_file_paths) == 0):
+            raise FileNotFoundError(f"No input files found at {input_path}")
+
+        ## sorted naturally, so chapter 10 comes after chapter 9 rather than chapter 1
+        input_file_paths.sort(key=lambda path: [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', os.path.basename(path))])
+
+        file_names = [os.path.basename(path) for path in input_file_paths]
+
+        ## each file's results are written to a directory named after it
+        if(len(set(os.path.splitext(name)[0] for name in file_names)) != len(file_names)):
+            raise Exception(f"Some of the input files at {input_path} share a name, please rename them so each file's results can be told apart.")
+
+        Kudasai.texts_to_preprocess = [(name, FileEnsurer.standard_read_file(path)) for name, path in zip(file_names, input_file_paths)]
+        Kudasai.text_to_preprocess = ""
+
+        Logger.log_action(f"Loaded {len(file_names)} input files from {input_path} : {', '.join(file_names)}")
+
 ##-------------------start-of-run_kairyou_indexer()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -103,21 +161,91 @@ class Kudasai:
 
         knowledge_base = input("Please enter the path to the knowledge base you would like to use for the indexer (can be text, a path to a txt file, or a path to a directory of txt files):\n").strip('"')
 
+        return Kudasai.index_text(text_to_index, knowledge_base, replacement_json)
+
+##-------------------start-of-index_text()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def index_text(text_to_index:str, knowledge_base:typing.Union[str, typing.List[str]], replacement_json:typing.Union[dict,str]) -> typing.Tuple[str, str]:
+
+        """
+
+        Runs the Kairyou Indexer and marks the names it flags, or restores the results from the stage cache if the text, knowledge base and replacement json are unchanged since a previous run.
+        The knowledge base's names come from the knowledge base index, so only files that are new or changed since they were last indexed are run through the NER model.
+
+        Parameters:
+        text_to_index (str): The text to index.
+        knowledge_base (str | list - str): The knowledge base, as text, a path to a txt file, a path to a directory of txt files, or a list of paths to txt files.
+        replacement_json (dict): The replacement json.
+
+        Returns:
+        indexed_text (str): The text with the flagged names marked.
+        indexing_log (str): The indexing log.
+
+        """
+
+        ## the knowledge base goes in by its contents, so editing a knowledge base file is noticed even though its path is the same
+        stage_inputs = [text_to_index, StageCache.fingerprint_source(knowledge_base), replacement_json]
+
+        stage_outputs = StageCache.get("index", stage_inputs)
+
+        if(stage_outputs is not None):
+            Logger.log_action("Text, knowledge base and replacement json are unchanged since a previous run, restored the indexing results from the stage cache.", output=True)
+            return stage_outputs["indexed_text"], stage_outputs["indexing_log"]
+
         ## unique names is a list of named tuples, with the fields name and occurrence
-        unique_names, indexing_log = Indexer.index(text_to_index, knowledge_base, replacement_json)
+        unique_names, indexing_log = KnowledgeBaseIndex.index(text_to_index, knowledge_base, replacement_json)
 
         ## for each name in unique_names, we need to replace that name in the text_to_process with >>>name<<<
         ## but since it returns the occurrence of the name, we only need to replace that occurrence of the name in the text_to_process
         ## So if a name has 42 occurrences, but only the 3rd and 4th occurrence were flagged, we only need to replace the 3rd and 4th occurrence of the name in the text_to_process
 
-        text_to_index = Kudasai.mark_indexed_names(text_to_index, unique_names)
+        indexed_text = Kudasai.mark_indexed_names(text_to_index, unique_names)
+
+        StageCache.put("index", stage_inputs, {"indexed_text": indexed_text, "indexing_log": indexing_log})
+
+        return indexed_text, indexing_log
+
+##-------------------start-of-preprocess_text()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def preprocess_text(text_to_preprocess:str, replacement_json:typing.Union[dict,str]) -> typing.Tuple[str, str, str]:
+
+        """
+
+        Runs Kairyou's preprocessing, or restores the results from the stage cache if the text and replacement json are unchanged since a previous run.
+
+        Parameters:
+        text_to_preprocess (str): The text to preprocess.
+        replacement_json (dict): The replacement json.
+
+        Returns:
+        preprocessed_text (str): The preprocessed text.
+        preprocessing_log (str): The preprocessing log.
+        error_log (str): The error log.
+
+        """
+
+        stage_inputs = [text_to_preprocess, replacement_json]
 
-        return text_to_index, indexing_log
+        stage_outputs = StageCache.get("preprocess", stage_inputs)
+
+        if(stage_outputs is not None):
+            Logger.log_action("Text and replacement json are unchanged since a previous run, restored the preprocessing results from the stage cache.", output=True)
+            return stage_outputs["preprocessed_text"], stage_outputs["preprocessing_log"], stage_outputs["error_log"]
+
+        from kairyou import Kairyou
+
+        preprocessed_text, preprocessing_log, error_log = Kairyou.preprocess(text_to_preprocess, replacement_json)
+
+        StageCache.put("preprocess", stage_inputs, {"preprocessed_text": preprocessed_text, "preprocessing_log": preprocessing_log, "error_log": error_log})
+
+        return preprocessed_text, preprocessing_log, error_log
     
 ##-------------------start-of-mark_indexed_names()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
     
     @staticmethod
-    def mark_indexed_names(text:str, unique_names:typing.List[NameAndOccurrence]) -> str:
+    def mark_indexed_names(text:str, unique_names:typing.List["NameAndOccurrence"]) -> str:
 
         """
 
@@ -132,24 +260,7 @@ class Kudasai:
 
         """
 
-        for name_tuple in unique_names:
-            name = name_tuple.name
-            pattern = re.compile(re.escape(name)) ## Prepare regex pattern, escaping the name to handle special characters
-
-            current_pos = 0
-            new_text = ""
-            last_end = 0
-
-            for match in pattern.finditer(text):
-                current_pos += 1
-                if(current_pos == name_tuple.occurrence):  
-                    new_text += text[last_end:match.start()] + f">>>{name}<<<"
-                    last_end = match.end()
-
-            new_text += text[last_end:]  # Append the rest of the text
-            text = new_text
-
-        return text
+        return NameMarker.mark(text, unique_names)
 
 ##-------------------start-of-run_kudasai()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
                 
@@ -164,14 +275,21 @@ class Kudasai:
 
         Kudasai.handle_update_check()
 
-        if(Kudasai.need_to_run_kairyou):
+        if(Kudasai.need_to_run_kairyou and len(Kudasai.texts_to_preprocess) > 0):
+
+            Kudasai.preprocess_files()
+
+            Toolkit.pause_console("\nPress any key to continue to Auto-Translation...")
+            Toolkit.clear_console()
+
+        elif(Kudasai.need_to_run_kairyou):
 
             indexing_log = ""
 
             if(Kudasai.replacement_json not in ["", FileEnsurer.blank_rules_path, FileEnsurer.standard_read_json(FileEnsurer.blank_rules_path)] and input("Would you like to use Kairyou's Indexer to index the preprocessed text? (1 for yes, 2 for no)\n") == "1"):
                 Kudasai.text_to_preprocess, indexing_log = Kudasai.run_kairyou_indexer(Kudasai.text_to_preprocess, Kudasai.replacement_json)
 
-            preprocessed_text, preprocessing_log, error_log = Kairyou.preprocess(Kudasai.text_to_preprocess, Kudasai.replacement_json)
+            preprocessed_text, preprocessing_log, error_log = Kudasai.preprocess_text(Kudasai.text_to_preprocess, Kudasai.replacement_json)
 
             ## Need to set this so auto-translation can use the preprocessed text
             Kudasai.text_to_preprocess = preprocessed_text
@@ -196,6 +314,44 @@ class Kudasai:
 
         Toolkit.pause_console("\nPress any key to exit...")
 
+##-------------------start-of-preprocess_files()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def preprocess_files() -> None:
+
+        """
+
+        Preprocesses every file of a run over several files, writing each file's results to its own directory as well as the combined results to the usual files.
+        The indexer is interactive, so it is not offered here.
+
+        """
+
+        preprocessed_texts = []
+        combined_preprocessing_log = ""
+        combined_error_log = ""
+
+        for file_name, text in Kudasai.texts_to_preprocess:
+
+            preprocessed_text, preprocessing_log, error_log = Kudasai.preprocess_text(text, Kudasai.replacement_json)
+
+            preprocessed_texts.append((file_name, preprocessed_text))
+
+            FileEnsurer.write_file_results(file_name, [('preprocessed_text', preprocessed_text),
+                                                       ('preprocessing_results', preprocessing_log),
+                                                       ('error_log', error_log)])
+
+            combined_preprocessing_log += f"{file_name}\n\n{preprocessing_log}\n\n"
+            combined_error_log += f"{file_name}\n\n{error_log}\n\n" if error_log else ""
+
+            print(f"{file_name} preprocessed.")
+
+        ## Need to set this so auto-translation can use the preprocessed text
+        Kudasai.texts_to_preprocess = preprocessed_texts
+
+        timestamp = Toolkit.get_timestamp(is_archival=True)
+
+        FileEnsurer.write_kairyou_results("\n".join(text for _, text in preprocessed_texts), combined_preprocessing_log, combined_error_log, timestamp)
+
 ##-------------------start-of-handle_update_check()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -207,7 +363,13 @@ class Kudasai:
 
         """
 
-        Kudasai.connection, update_prompt = Toolkit.check_update()
+        Kudasai.connection, update_prompt = Kudasai.get_update_check_result()
+
+        if(not Kudasai.connection):
+
+            print("You seem to lack an internet connection, this will prevent you from checking from update notification and machine translation.\n")
+
+            Toolkit.pause_console()
 
         if(update_prompt != ""):
             
@@ -215,6 +377,26 @@ class Kudasai:
 
             Toolkit.pause_console()
             Toolkit.clear_console()
+
+##-------------------start-of-get_update_check_result()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_update_check_result() -> typing.Tuple[bool, str]:
+
+        """
+
+        Waits for the update check started at boot, starting one if there wasn't one.
+
+        Returns:
+        is_connection (bool) : Whether or not the user has an internet connection.
+        update_prompt (str) : The update prompt to be displayed to the user, blank if there is no update.
+
+        """
+
+        if(Kudasai.update_check is None):
+            Kudasai.update_check = Toolkit.start_update_check(FileEnsurer.update_check_cache_path)
+
+        return Kudasai.update_check.result()
     
 ##-------------------start-of-determine_autotranslation_module()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -244,7 +426,7 @@ class Kudasai:
         Toolkit.clear_console()
 
         if(pathing == "1"):
-            Kudasai.run_kaiseki()
+            await Kudasai.run_kaiseki()
         elif(pathing == "2"):
             await Kudasai.run_kijiku()
         else:
@@ -254,7 +436,7 @@ class Kudasai:
 ##-------------------start-of-run_kaiseki()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    def run_kaiseki() -> None:
+    async def run_kaiseki() -> None:
 
         """
         
@@ -262,13 +444,50 @@ class Kudasai:
 
         """
 
+        from models.kaiseki import Kaiseki
+
+        Kaiseki.is_whole_sentence_mode = "--whole-sentences" in Kudasai.cli_flags
+
         Logger.log_action("--------------------")
         Logger.log_action("Kaiseki started")
         Logger.log_action("--------------------")
 
+        ## Kaiseki translates a file at a time, so a run over several files just goes through them one at a time
+        if(len(Kudasai.texts_to_preprocess) > 0):
+
+            ## every file's results are gathered up, so the combined output and the archive are written once for the whole run like Kijiku's
+            translated_text = []
+            je_check_text = []
+            error_text = []
+            file_results = []
+
+            for file_name, text in Kudasai.texts_to_preprocess:
+
+                Kaiseki.reset_static_variables()
+
+                Kaiseki.text_to_translate = [line for line in text.splitlines()]
+
+                await Kaiseki.translate_async()
+
+                print(file_name + "\n\n" + Kaiseki.translation_print_result)
+
+                translated_text.extend(Kaiseki.translated_text)
+                je_check_text.extend(Kaiseki.je_check_text)
+                error_text.extend(Kaiseki.error_text)
+                file_results.append((file_name, Kaiseki.translated_text, Kaiseki.je_check_text))
+
+            Kaiseki.translated_text = translated_text
+            Kaiseki.je_check_text = je_check_text
+            Kaiseki.error_text = error_text
+            Kaiseki.file_results = file_results
+
+            Kaiseki.write_kaiseki_results()
+
+            return
+
         Kaiseki.text_to_translate = [line for line in Kudasai.text_to_preprocess.splitlines()]
 
-        Kaiseki.translate()
+        await Kaiseki.translate_async()
 
         Toolkit.clear_console()
 
@@ -287,6 +506,8 @@ class Kudasai:
 
         """
 
+        from models.kijiku import Kijiku
+
         Logger.log_action("--------------------")
         Logger.log_action("Kijiku started")
         Logger.log_action("--------------------")
@@ -295,6 +516,11 @@ class Kudasai:
 
         Kijiku.text_to_translate = [line for line in Kudasai.text_to_preprocess.splitlines()]
 
+        ## every file's batches go through the one run, so the concurrency stays up across file boundaries
+        Kijiku.input_files = [(file_name, [line for line in text.splitlines()]) for file_name, text in Kudasai.texts_to_preprocess]
+
+        Kijiku.is_resuming = "--resume" in Kudasai.cli_flags
+
         await Kijiku.translate()
 
         Toolkit.clear_console()
@@ -316,12 +542,30 @@ async def main() -> None:
     Kudasai.boot()
     Toolkit.clear_console()
 
+    Kudasai.cli_arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    Kudasai.cli_flags = [argument for argument in sys.argv[1:] if argument.startswith("--")]
+
+    if("--debug" in Kudasai.cli_flags):
+        Logger.level = Logger.DEBUG
+
+    if("--quiet" in Kudasai.cli_flags):
+        ProgressRenderer.is_quiet = True
+
+    if("--no-stage-cache" in Kudasai.cli_flags):
+        StageCache.is_enabled = False
+
     try:
 
-        if(len(sys.argv) <= 1):
+        if(any(flag in Kudasai.cli_flags for flag in ["--cache-stats", "--purge-cache"])):
+            run_cache_maintenance()
+
+        elif("--compile-knowledge-base" in Kudasai.cli_flags and len(Kudasai.cli_arguments) == 1):
+            run_knowledge_base_compilation()
+
+        elif(len(Kudasai.cli_arguments) == 0):
             await run_console_version()
         
-        elif(len(sys.argv) in [2, 3]):
+        elif(len(Kudasai.cli_arguments) in [1, 2]):
             await run_cli_version()
 
         else:
@@ -342,8 +586,8 @@ async def run_console_version():
 
     try:
 
-        path_to_text_to_preprocess = input("Please enter the path to the input file to be processed:\n").strip('"')
-        Kudasai.text_to_preprocess = FileEnsurer.standard_read_file(path_to_text_to_preprocess)
+        path_to_text_to_preprocess = input("Please enter the path to the input file to be processed (or a directory or glob of files):\n").strip('"')
+        Kudasai.load_input(path_to_text_to_preprocess)
         Toolkit.clear_console()
 
         path_to_replacement_json = input("Please enter the path to the replacement json file:\n").strip('"')
@@ -374,8 +618,8 @@ async def run_cli_version():
 
     try:
 
-        Kudasai.text_to_preprocess = FileEnsurer.standard_read_file(sys.argv[1].strip('"'))
-        Kudasai.replacement_json = FileEnsurer.standard_read_json(sys.argv[2].strip('"') if(len(sys.argv) == 3) else FileEnsurer.blank_rules_path)
+        Kudasai.load_input(Kudasai.cli_arguments[0].strip('"'))
+        Kudasai.replacement_json = FileEnsurer.standard_read_json(Kudasai.cli_arguments[1].strip('"') if(len(Kudasai.cli_arguments) == 2) else FileEnsurer.blank_rules_path)
 
     except Exception as e:
         print_usage_statement()
@@ -386,12 +630,62 @@ async def run_cli_version():
 
         raise e
 
-    if(len(sys.argv) == 2):
+    if(len(Kudasai.cli_arguments) == 1):
         Kudasai.need_to_run_kairyou = False
 
     await Kudasai.run_kudasai()
     Logger.push_batch()
 
+##-------------------start-of-run_cache_maintenance()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+def run_cache_maintenance():
+
+    """
+
+    Inspects and/or purges Kijiku's response cache, Kaiseki's fragment cache, the stage cache and the knowledge base index, depending on the flags given.
+
+    """
+
+    if("--purge-cache" in Kudasai.cli_flags):
+        ResponseCache.purge()
+        FragmentCache.purge()
+        StageCache.purge()
+        KnowledgeBaseIndex.purge()
+        print("Response, fragment and stage caches and the knowledge base index purged.\n")
+
+    print(ResponseCache.get_stats() + "\n")
+    print(FragmentCache.get_stats() + "\n")
+
+    ResponseCache.close()
+    FragmentCache.close()
+
+    Logger.push_batch()
+
+##-------------------start-of-run_knowledge_base_compilation()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+def run_knowledge_base_compilation():
+
+    """
+
+    Indexes a knowledge base ahead of time, so the first run of the Indexer against it doesn't have to.
+
+    """
+
+    knowledge_base = Kudasai.cli_arguments[0].strip('"')
+
+    Toolkit.clear_console()
+
+    print("Indexing the knowledge base, this takes a while the first time.\n")
+
+    knowledge_base_names, num_files, num_indexed_files = KnowledgeBaseIndex.get_names(knowledge_base)
+
+    print("Knowledge Base Files : " + str(num_files) + " (" + str(num_indexed_files) + " newly indexed)")
+    print("Names : " + str(len(knowledge_base_names)) + "\n")
+
+    KnowledgeBaseIndex.close()
+
+    Logger.push_batch()
+
 ##-------------------start-of-print_usage_statement()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
 def print_usage_statement():
@@ -403,7 +697,17 @@ def print_usage_statement():
     """
 
     print("Usage: python Kudasai.py <input_file> <replacement_json>\n\n")
+    print("<input_file> can also be a directory (every .txt file in it is used) or a quoted glob such as \"chapters/*.txt\", to translate several files in one run.\n\n")
     print("or run Kudasai.py without any arguments to run the console version.\n\n")
+    print("Flags:\n")
+    print("    --resume : skip the Kijiku batches an interrupted run already finished, using the checkpoint journal in the output folder.")
+    print("    --cache-stats : print information about Kijiku's response cache and Kaiseki's fragment cache and exit.")
+    print("    --purge-cache : delete everything in Kijiku's response cache, Kaiseki's fragment cache, the preprocessing stage cache and the knowledge base index and exit.")
+    print("    --compile-knowledge-base : with a knowledge base as the only argument (e.g. python Kudasai.py --compile-knowledge-base <knowledge_base_dir>), index the names in it ahead of time and exit.")
+    print("    --no-stage-cache : always run preprocessing and indexing again, rather than restoring their results when the text, replacement json and knowledge base haven't changed.")
+    print("    --debug : also log the details of every line and batch to the debug log, which is slower on long texts.")
+    print("    --whole-sentences : have Kaiseki send each line to DeepL once rather than a part at a time.")
+    print("    --quiet : don't show the translation progress bar, for headless runs.\n\n")
     Logger.log_action("Usage: python Kudasai.py <input_file> <replacement_json>")
     Toolkit.pause_console()
     exit()
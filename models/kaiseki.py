@@ -1,23 +1,35 @@
 ## Basically Deprecated, use Kijiku instead. Currently only maintained for backwards compatibility.
 ##---------------------------------------
 ## built-in libraries
+import os
 import string
-import time
 import re
+import time
 import base64
 import time
+import typing
+import asyncio
+
+## third-party libraries
+import backoff
 
 ## custom modules
+from modules.common.translation_job import JobScoped
 from translation_services.deepl_service import DeepLService
 from modules.common.toolkit import Toolkit
 from modules.common.file_ensurer import FileEnsurer
 from modules.common.logger import Logger
+from modules.common.line_classifier import LineClassifier
+from modules.common.api_key_validations import ApiKeyValidations
 from modules.common.decorators import permission_error_decorator
-from modules.common.exceptions import AuthorizationException, QuotaExceededException
+from modules.common.exceptions import AuthorizationException, QuotaExceededException, TooManyRequestsException, ConnectionException
+from modules.common.adaptive_concurrency_limiter import AdaptiveConcurrencyLimiter
+from modules.common.progress_renderer import ProgressRenderer
+from modules.common.fragment_cache import FragmentCache
 
 ##-------------------start-of-Kaiseki--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-class Kaiseki:
+class Kaiseki(metaclass=JobScoped):
 
     """
 
@@ -38,6 +50,9 @@ class Kaiseki:
     error_text = []
 
     translation_print_result = ""
+
+    ## (file name, translated lines, je check lines) of each file in a run over several files, translated_text and je_check_text then hold every file's lines
+    file_results:typing.List[typing.Tuple[str, typing.List[str], typing.List[str]]] = []
     
     ##---------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -51,6 +66,34 @@ class Kaiseki:
     current_sentence = ""
 
     translated_sentence = ""
+
+    ## the most requests commence_translation_async() sends to DeepL at once, it starts lower and backs off if DeepL asks it to slow down
+    num_concurrent_requests = 8
+
+    ## how long a request is retried for when DeepL is rate limiting or can't be reached, before its texts are given up on
+    max_request_duration = 60.0
+
+    _concurrency_limiter = AdaptiveConcurrencyLimiter(8)
+
+    _progress = ProgressRenderer("Kaiseki", 0)
+
+    ## sends each line to DeepL whole instead of a part at a time, see realign_sentence()
+    is_whole_sentence_mode = False
+
+    ## where a sentence of a translation ends, its closing punctuation and any quotes or brackets right after it
+    sentence_end_pattern = re.compile(r"[^.!?]+(?:[.!?]+[\"')\]]*|$)|[.!?]+")
+
+    ## requests sent to DeepL this run and the characters in them, which is what the quota counts
+    num_requests = 0
+    num_sent_characters = 0
+
+    ## fragments served from the fragment cache rather than DeepL this run, and how many characters of quota that saved
+    num_cached_fragments = 0
+    num_cached_characters = 0
+    num_translated_fragments = 0
+
+    ## lines that are left as they are rather than translated
+    untranslated_line_types = (LineClassifier.POV_CHANGE, LineClassifier.PART_MARKER, LineClassifier.EMPTY, LineClassifier.PUNCTUATION, LineClassifier.LATIN)
         
 ##-------------------start-of-translate()--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -88,6 +131,42 @@ class Kaiseki:
 
             Kaiseki.assemble_results(time_start, time_end)
 
+##-------------------start-of-translate_async()--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def translate_async() -> None:
+
+        """
+
+        Translates the text, sending several requests to DeepL at once.
+
+        """
+
+        Logger.clear_batch()
+
+        time_start = time.time()
+
+        try:
+
+            Kaiseki.initialize() 
+
+            ## offset time, for if the user doesn't get through Kaiseki.initialize() before the translation starts.
+            time_start = time.time()
+
+            await Kaiseki.commence_translation_async()
+
+        except Exception as e:
+            
+            Kaiseki.translation_print_result += "An error has occurred, outputting results so far..."
+
+            FileEnsurer.handle_critical_exception(e)
+
+        finally:
+
+            time_end = time.time()
+
+            Kaiseki.assemble_results(time_start, time_end)
+
 ##-------------------start-of-initialize()--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -106,7 +185,17 @@ class Kaiseki:
                 api_key = base64.b64decode((file.read()).encode('utf-8')).decode('utf-8')
 
             DeepLService.set_api_key(api_key)
-            DeepLService.test_api_key_validity()
+
+            ## a key that worked recently isn't tested again, saving a round trip every run
+            if(not ApiKeyValidations.is_validated("deepl", api_key)):
+
+                is_valid, e = DeepLService.test_api_key_validity()
+
+                ## if not valid, raise the exception that caused the test to fail
+                if(not is_valid and e is not None):
+                    raise e
+
+                ApiKeyValidations.record_validation("deepl", api_key)
 
             Logger.log_action("Used saved api key in " + FileEnsurer.deepl_api_key_path, output=True)
 
@@ -119,13 +208,15 @@ class Kaiseki:
             try: 
 
                 DeepLService.set_api_key(api_key)
-                DeepLService.test_api_key_validity()
 
-                time.sleep(.1)
+                is_valid, e = DeepLService.test_api_key_validity()
+
+                if(not is_valid and e is not None):
+                    raise e
+
+                ApiKeyValidations.record_validation("deepl", api_key)
                     
                 FileEnsurer.standard_overwrite_file(FileEnsurer.deepl_api_key_path, base64.b64encode(api_key.encode('utf-8')).decode('utf-8'), omit=True)
-
-                time.sleep(.1)
                 
             ## if invalid key exit
             except AuthorizationException: 
@@ -171,11 +262,17 @@ class Kaiseki:
         Kaiseki.je_check_text = []
         Kaiseki.error_text = []
         Kaiseki.translation_print_result = ""
+        Kaiseki.file_results = []
         Kaiseki.sentence_parts = []
         Kaiseki.sentence_punctuation = []
         Kaiseki.special_punctuation = []
         Kaiseki.current_sentence = ""
         Kaiseki.translated_sentence = ""
+        Kaiseki.num_cached_fragments = 0
+        Kaiseki.num_cached_characters = 0
+        Kaiseki.num_translated_fragments = 0
+        Kaiseki.num_requests = 0
+        Kaiseki.num_sent_characters = 0
 
 ##-------------------start-of-commence_translation()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -185,47 +282,483 @@ class Kaiseki:
         """
         
         Commences the translation process using all the functions in the Kaiseki class.
+        Rather than a request per sentence part, the parts (and quotes) of as many lines as fit are gathered and sent to DeepL together, then each line is put back together in order.
+
+        """
+
+        Kaiseki._progress = ProgressRenderer("Kaiseki", len(Kaiseki.text_to_translate))
+
+        try:
+
+            for line_plans, texts in Kaiseki.plan_requests():
+
+                ## for webgui, if the user presses the clear button, raise an exception to stop the translation
+                if(FileEnsurer.do_interrupt == True):
+                    raise Exception("Interrupted by user.")
+
+                Kaiseki.reassemble_lines(line_plans, Kaiseki.translate_texts(texts))
+
+        finally:
+            Kaiseki._progress.finish()
+
+##-------------------start-of-commence_translation_async()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def commence_translation_async() -> None:
+
+        """
+        
+        Same as commence_translation(), but up to num_concurrent_requests requests are sent to DeepL at once.
+        Requests finish in whatever order DeepL answers them, lines are still put back together in order, each as soon as every request before it is done.
 
         """
 
-        i = 0 
+        ## DeepL charges and takes longer by the character
+        Kaiseki._concurrency_limiter = AdaptiveConcurrencyLimiter(Kaiseki.num_concurrent_requests, size_unit="character")
+
+        Logger.log_action(f"Concurrency limit starting at {Kaiseki._concurrency_limiter.limit} (ceiling {Kaiseki._concurrency_limiter.max_limit}).")
+
+        planned_requests = Kaiseki.plan_requests()
+
+        Kaiseki._progress = ProgressRenderer("Kaiseki", len(Kaiseki.text_to_translate), get_status=Kaiseki._concurrency_limiter.format_limit)
+
+        async_requests = [asyncio.create_task(Kaiseki.translate_texts_async(texts)) for _, texts in planned_requests]
+
+        try:
 
-        while(i < len(Kaiseki.text_to_translate)):
+            for (line_plans, _), async_request in zip(planned_requests, async_requests):
+                Kaiseki.reassemble_lines(line_plans, await async_request)
+
+        ## if anything stops the run (i.e. the quota running out), the requests still waiting are dropped
+        finally:
+
+            for async_request in async_requests:
+                async_request.cancel()
+
+            await asyncio.gather(*async_requests, return_exceptions=True)
+
+            Kaiseki._progress.finish()
+
+##-------------------start-of-plan_requests()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def plan_requests() -> typing.List[typing.Tuple[typing.List[dict], typing.List[str]]]:
+
+        """
+
+        Splits every line up and groups the lines so that the texts each group needs translated fit in a single request.
+
+        Returns:
+        planned_requests (list - tuple(list - dict, list - str)) : each group's lines, in order, and the texts they need translated, without duplicates.
+
+        """
+
+        line_types = LineClassifier.classify_lines(Kaiseki.text_to_translate)
+
+        planned_requests = []
+
+        ## lines waiting on the next request, in order, and the texts they need translated
+        pending_lines:typing.List[dict] = []
+        pending_texts:typing.Dict[str, None] = {}
+        num_pending_bytes = 0
+
+        for i, line in enumerate(Kaiseki.text_to_translate):
 
             ## for webgui, if the user presses the clear button, raise an exception to stop the translation
             if(FileEnsurer.do_interrupt == True):
                 raise Exception("Interrupted by user.")
 
-            Kaiseki.current_sentence = Kaiseki.text_to_translate[i]
+            line_plan = {"index": i, "line_type": line_types[i], "sentence": line}
+
+            line_texts = []
+
+            if(line_types[i] not in Kaiseki.untranslated_line_types):
+
+                Kaiseki.current_sentence = line
+
+                Kaiseki.separate_sentence()
+
+                line_plan.update(sentence=Kaiseki.current_sentence,
+                                 sentence_parts=list(Kaiseki.sentence_parts),
+                                 sentence_punctuation=list(Kaiseki.sentence_punctuation),
+                                 special_punctuation=list(Kaiseki.special_punctuation))
+
+                if(Kaiseki.is_whole_sentence_mode):
+
+                    whole_text = Kaiseki.current_sentence.replace("~", "").strip()
+
+                    ## punctuation before any text is put back as is by realign_sentence(), like translate_sentence() does, so it isn't sent as well
+                    if(len(Kaiseki.sentence_punctuation) > len(Kaiseki.sentence_parts) and whole_text.startswith(Kaiseki.sentence_punctuation[0])):
+                        whole_text = whole_text[len(Kaiseki.sentence_punctuation[0]):].strip()
+
+                    line_plan["whole_text"] = whole_text
+                    line_texts = [line_plan["whole_text"]] if line_plan["whole_text"] != "" else []
+
+                else:
+                    line_texts = list(dict.fromkeys(Kaiseki.collect_texts()))
+
+            num_line_bytes = sum(len(text.encode('utf-8')) for text in line_texts)
+
+            ## start a new request if this line won't fit in the same one
+            if(len(pending_texts) > 0 and (len(pending_texts) + len(line_texts) > DeepLService.max_texts_per_request or num_pending_bytes + num_line_bytes > DeepLService.max_request_bytes)):
+
+                planned_requests.append((pending_lines, list(pending_texts)))
+
+                pending_lines, pending_texts, num_pending_bytes = [], {}, 0
+
+            pending_lines.append(line_plan)
+            pending_texts.update(dict.fromkeys(line_texts))
+            num_pending_bytes += num_line_bytes
+
+        if(len(pending_lines) > 0):
+            planned_requests.append((pending_lines, list(pending_texts)))
+
+        return planned_requests
+
+##-------------------start-of-collect_texts()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def collect_texts() -> typing.List[str]:
+
+        """
+
+        Goes through translate_sentence() without translating anything, to find out which texts the current sentence needs translated.
+
+        Returns:
+        texts (list - str) : the sentence's parts and quotes, as they will be sent to DeepL.
+
+        """
+
+        texts = []
+
+        def collect_text(text:str) -> str:
+
+            ## DeepL can't take an empty text, translate_sentence() skips those
+            if(text == ""):
+                raise ValueError("Text must not be empty.")
+
+            texts.append(text)
+
+            return text
+
+        Kaiseki.translate_sentence(collect_text)
+
+        Kaiseki.translated_sentence = ""
+
+        return texts
+
+##-------------------start-of-get_cached_translations()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_cached_translations(texts:typing.List[str]) -> typing.Dict[str, str]:
+
+        """
+
+        Looks texts up in the fragment cache, so only the ones DeepL hasn't translated before are sent.
+
+        Parameters:
+        texts (list - str) : the texts to translate, without duplicates.
+
+        Returns:
+        translations (dict - str, str) : the cached translation of each text that had one.
+
+        """
+
+        translations = FragmentCache.get_many(texts, source_lang="JA", target_lang="EN-US")
+
+        Kaiseki.num_cached_fragments += len(translations)
+        Kaiseki.num_cached_characters += sum(len(text) for text in translations)
+
+        return translations
+
+##-------------------start-of-cache_translations()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def cache_translations(texts:typing.List[str], results:typing.List[str]) -> typing.Dict[str, str]:
+
+        """
+
+        Stores a request's translations in the fragment cache.
+
+        Parameters:
+        texts (list - str) : the texts sent.
+        results (list - str) : their translations, in the same order.
+
+        Returns:
+        translations (dict - str, str) : the translation of each text.
+
+        """
+
+        translations = dict(zip(texts, results))
+
+        FragmentCache.put_many(translations, source_lang="JA", target_lang="EN-US")
+
+        Kaiseki.num_translated_fragments += len(translations)
+
+        return translations
+
+##-------------------start-of-count_request()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_request(texts:typing.List[str]) -> None:
+
+        """
+
+        Counts a request about to be sent to DeepL, for the results.
+
+        Parameters:
+        texts (list - str) : the texts in the request.
+
+        """
+
+        Kaiseki.num_requests += 1
+        Kaiseki.num_sent_characters += sum(len(text) for text in texts)
+
+##-------------------start-of-split_into_requests()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def split_into_requests(texts:typing.List[str]) -> typing.Iterator[typing.List[str]]:
+
+        """
+
+        Splits texts into as few requests as DeepL's limits allow.
+
+        Parameters:
+        texts (list - str) : the texts to translate.
+
+        Returns:
+        request_texts (iterator - list - str) : the texts of each request.
+
+        """
+
+        request_texts = []
+        num_request_bytes = 0
+
+        for text in texts:
+
+            num_text_bytes = len(text.encode('utf-8'))
+
+            if(len(request_texts) > 0 and (len(request_texts) == DeepLService.max_texts_per_request or num_request_bytes + num_text_bytes > DeepLService.max_request_bytes)):
+
+                yield request_texts
+
+                request_texts = []
+                num_request_bytes = 0
+
+            request_texts.append(text)
+            num_request_bytes += num_text_bytes
+
+        if(len(request_texts) > 0):
+            yield request_texts
+
+##-------------------start-of-translate_texts()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def translate_texts(texts:typing.List[str]) -> typing.Dict[str, str | ValueError]:
+
+        """
+
+        Translates texts in as few requests as DeepL's limits allow.
+
+        Parameters:
+        texts (list - str) : the texts to translate, without duplicates.
+
+        Returns:
+        translations (dict - str, str | ValueError) : each text's translation, or the error its request failed with.
+
+        """
+
+        translations:typing.Dict[str, str | ValueError] = {}
+
+        translations.update(Kaiseki.get_cached_translations(texts))
+
+        for request_texts in Kaiseki.split_into_requests([text for text in texts if text not in translations]):
+
+            Kaiseki.count_request(request_texts)
+
+            try:
+                translations.update(Kaiseki.cache_translations(request_texts, DeepLService.translate_texts(request_texts, source_lang= "JA", target_lang="EN-US")))
+
+            except QuotaExceededException as e:
+
+                Logger.log_action("DeepL API quota exceeded.", output=True)
+
+                Toolkit.pause_console()
+                
+                raise e
+
+            except ValueError as e:
+                translations.update(dict.fromkeys(request_texts, e))
+
+        return translations
+
+##-------------------start-of-translate_texts_async()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def translate_texts_async(texts:typing.List[str]) -> typing.Dict[str, str | ValueError]:
+
+        """
+
+        Same as translate_texts(), but each request waits for a slot under the concurrency limit and is retried if DeepL asks to slow down or can't be reached.
+
+        Parameters:
+        texts (list - str) : the texts to translate, without duplicates.
+
+        Returns:
+        translations (dict - str, str | ValueError) : each text's translation, or the error its request failed with.
+
+        """
+
+        translations:typing.Dict[str, str | ValueError] = {}
+
+        translations.update(Kaiseki.get_cached_translations(texts))
+
+        for request_texts in Kaiseki.split_into_requests([text for text in texts if text not in translations]):
+
+            async with Kaiseki._concurrency_limiter:
+
+                ## For the webgui
+                if(FileEnsurer.do_interrupt == True):
+                    raise Exception("Interrupted by user.")
+
+                Kaiseki.count_request(request_texts)
+
+                try:
+                    request_start = time.time()
+
+                    translations.update(Kaiseki.cache_translations(request_texts, await Kaiseki.send_request_async(request_texts)))
+
+                    await Kaiseki._concurrency_limiter.record_success(time.time() - request_start, sum(len(text) for text in request_texts))
+
+                ## the quota won't come back by waiting, so the whole run stops
+                except QuotaExceededException as e:
+
+                    Logger.log_action("DeepL API quota exceeded.", output=True)
+                    
+                    raise e
+
+                except ValueError as e:
+                    translations.update(dict.fromkeys(request_texts, e))
+
+                ## still rate limited or unreachable after max_request_duration, the texts are marked as errors like any other failed request
+                except (TooManyRequestsException, ConnectionException) as e:
+                    translations.update(dict.fromkeys(request_texts, ValueError(str(e))))
+
+        return translations
+
+##-------------------start-of-send_request_async()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    @backoff.on_exception(backoff.expo, (TooManyRequestsException, ConnectionException), max_time=lambda: Kaiseki.max_request_duration, on_backoff=lambda details: Kaiseki.log_retry(details))
+    async def send_request_async(texts:typing.List[str]) -> typing.List[str]:
+
+        """
+
+        Sends a single request to DeepL.
+
+        Parameters:
+        texts (list - str) : the texts to translate, within DeepL's limits.
+
+        Returns:
+        translations (list - str) : the translated texts, in the same order.
+
+        """
+
+        return await DeepLService.translate_texts_async(texts, source_lang= "JA", target_lang="EN-US")
+
+##-------------------start-of-log_retry()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def log_retry(details) -> None:
+
+        """
+
+        Logs the retry message.
+
+        Parameters:
+        details (dict) : the details of the retry.
+
+        """
+
+        ## a 429 means too many requests are in flight, so back the concurrency off as well
+        if(isinstance(details.get('exception'), TooManyRequestsException)):
+            Kaiseki._concurrency_limiter.record_rate_limit()
+
+        Logger.log_barrier()
+        Logger.log_action(f"Retrying request after {round(details['wait'], 2)} seconds after {details['tries']} tries due to {details['exception']}.")
+        Logger.log_barrier()
+
+##-------------------start-of-reassemble_lines()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def reassemble_lines(line_plans:typing.List[dict], translations:typing.Dict[str, str | ValueError]) -> None:
+
+        """
+
+        Puts each line of a group back together in order from the translations of its texts.
+
+        Parameters:
+        line_plans (list - dict) : the lines, as plan_requests() prepared them.
+        translations (dict - str, str | ValueError) : each text's translation, or the error its request failed with.
+
+        """
+
+        def look_up_translation(text:str) -> str:
+
+            if(text == ""):
+                raise ValueError("Text must not be empty.")
+
+            translation = translations[text]
+
+            if(isinstance(translation, ValueError)):
+                raise translation
+
+            return translation
+
+        for line_plan in line_plans:
+
+            i = line_plan["index"]
+            line_type = line_plan["line_type"]
+
+            Kaiseki.current_sentence = line_plan["sentence"]
             
-            Logger.log_action("Initial Sentence : " + Kaiseki.current_sentence)
+            Logger.log_debug("Initial Sentence : %s", Kaiseki.current_sentence)
 
             ## Kaiseki is an in-place translation, so it'll build the translated text into Kaiseki.translated_text as it goes.
-            if(any(char in Kaiseki.current_sentence for char in ["▼", "△", "◇"])):
+            if(line_type == LineClassifier.POV_CHANGE):
                 Kaiseki.translated_text.append(Kaiseki.current_sentence + '\n')
-                Logger.log_action("Sentence : " + Kaiseki.current_sentence + ", Sentence is a pov change... leaving intact.")
+                Logger.log_debug("Sentence : %s, Sentence is a pov change... leaving intact.", Kaiseki.current_sentence)
 
-            elif("part" in Kaiseki.current_sentence.lower() or all(char in ["１","２","３","４","５","６","７","８","９", " "] for char in Kaiseki.current_sentence) and not all(char in [" "] for char in Kaiseki.current_sentence) and Kaiseki.current_sentence != '"..."' and Kaiseki.current_sentence != "..."):
+            elif(line_type == LineClassifier.PART_MARKER):
                 Kaiseki.translated_text.append(Kaiseki.current_sentence + '\n') 
-                Logger.log_action("Sentence : " + Kaiseki.current_sentence + ", Sentence is part marker... leaving intact.")
+                Logger.log_debug("Sentence : %s, Sentence is part marker... leaving intact.", Kaiseki.current_sentence)
 
-            elif bool(re.match(r'^[\W_\s\n-]+$', Kaiseki.current_sentence)) and not any(char in Kaiseki.current_sentence for char in ["」", "「", "«", "»"]):
-                Logger.log_action("Sentence : " + Kaiseki.current_sentence + ", Sentence is punctuation... skipping.")
-                Kaiseki.translated_text.append(Kaiseki.current_sentence + "\n")
+            elif(line_type == LineClassifier.EMPTY):
+                Logger.log_debug("Sentence is empty... skipping translation.\n")
+                Kaiseki.translated_text.append(Kaiseki.current_sentence + "\n") 
 
-            elif(bool(re.match(r'^[A-Za-z0-9\s\.,\'\?!]+\n*$', Kaiseki.current_sentence))):
-                Logger.log_action("Sentence : " + Kaiseki.current_sentence + ", Sentence is english... skipping translation.")
+            elif(line_type == LineClassifier.PUNCTUATION):
+                Logger.log_debug("Sentence : %s, Sentence is punctuation... skipping.", Kaiseki.current_sentence)
                 Kaiseki.translated_text.append(Kaiseki.current_sentence + "\n")
 
-            elif(len(Kaiseki.current_sentence) == 0 or Kaiseki.current_sentence.isspace() == True):
-                Logger.log_action("Sentence is empty... skipping translation.\n")
-                Kaiseki.translated_text.append(Kaiseki.current_sentence + "\n") 
+            elif(line_type == LineClassifier.LATIN):
+                Logger.log_debug("Sentence : %s, Sentence is english... skipping translation.", Kaiseki.current_sentence)
+                Kaiseki.translated_text.append(Kaiseki.current_sentence + "\n")
 
             else:
-        
-                Kaiseki.separate_sentence()
 
-                Kaiseki.translate_sentence()
+                Kaiseki.sentence_parts = list(line_plan["sentence_parts"])
+                Kaiseki.sentence_punctuation = list(line_plan["sentence_punctuation"])
+                Kaiseki.special_punctuation = list(line_plan["special_punctuation"])
+
+                if(Kaiseki.is_whole_sentence_mode):
+                    Kaiseki.realign_sentence(line_plan["whole_text"], look_up_translation)
+
+                else:
+                    Kaiseki.translate_sentence(look_up_translation)
+
+                Kaiseki.translated_text.append(Kaiseki.translated_sentence)
+                Kaiseki.translated_sentence = ""
 
                 ## this is for adding a period if it's missing 
                 if(len(Kaiseki.translated_text[i]) > 0 and Kaiseki.translated_text[i] != "" and Kaiseki.translated_text[i][-2] not in string.punctuation and Kaiseki.sentence_punctuation[-1] == None): 
@@ -247,17 +780,15 @@ class Kaiseki:
                 if(Kaiseki.special_punctuation[4] == True): 
                     Kaiseki.translated_text[i] =  "(" + Kaiseki.translated_text[i] + ")"
 
-                Logger.log_action("Translated and Reassembled Sentence : " + Kaiseki.translated_text[i])
+                Logger.log_debug("Translated and Reassembled Sentence : %s", Kaiseki.translated_text[i])
 
                 Kaiseki.translated_text[i] += "\n"
 
                 Kaiseki.je_check_text.append(str(i+1) + ": " + Kaiseki.current_sentence +  "\n   " +  Kaiseki.translated_text[i] + "\n")
             
-            i+=1
-            
-            Toolkit.clear_console()
+            Kaiseki._progress.advance()
             
-            Logger.log_action(str(i) + "/" + str(len(Kaiseki.text_to_translate)) + " completed.", output=True)
+            Logger.log_action(str(i+1) + "/" + str(len(Kaiseki.text_to_translate)) + " completed.")
             Logger.log_barrier()
 
 ##-------------------start-of-separate_sentence()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -398,9 +929,9 @@ class Kaiseki:
             Kaiseki.sentence_parts.append(buildString)
             Kaiseki.sentence_punctuation.append(None)
 
-        Logger.log_action("Fragmented Sentence Parts " + str(Kaiseki.sentence_parts))
-        Logger.log_action("Sentence Punctuation " + str(Kaiseki.sentence_punctuation))
-        Logger.log_action("Does Sentence Have Special Punctuation : " + str(Kaiseki.special_punctuation))
+        Logger.log_debug("Fragmented Sentence Parts %s", Kaiseki.sentence_parts)
+        Logger.log_debug("Sentence Punctuation %s", Kaiseki.sentence_punctuation)
+        Logger.log_debug("Does Sentence Have Special Punctuation : %s", Kaiseki.special_punctuation)
 
         ## strip the sentence parts
         Kaiseki.sentence_parts = [part.strip() for part in Kaiseki.sentence_parts] 
@@ -408,12 +939,15 @@ class Kaiseki:
 ##-------------------start-of-translate_sentence()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    def translate_sentence() -> None:
+    def translate_sentence(translate_part:typing.Callable[[str], str]) -> None:
 
         """
 
         This function translates each part of a sentence.
 
+        Parameters:
+        translate_part (callable) : translates a single part or quote, raising ValueError if it can't.
+
         """
 
         i = 0
@@ -452,7 +986,7 @@ class Kaiseki:
                 single_quote_active = True
                 
             try:
-                results = DeepLService.translate(Kaiseki.sentence_parts[i], source_lang= "JA", target_lang="EN-US")
+                results = translate_part(Kaiseki.sentence_parts[i])
 
                 translated_part = results.rstrip(''.join(c for c in string.punctuation if c not in "'\""))
                 translated_part = translated_part.rstrip() 
@@ -464,7 +998,7 @@ class Kaiseki:
 
                 ## translates the quote and re-adds it back to the sentence part
                 if(single_quote_active == True): 
-                    quote = DeepLService.translate(quote, source_lang= "JA", target_lang="EN-US")
+                    quote = translate_part(quote)
                     
                     quote = quote.rstrip(''.join(c for c in string.punctuation if c not in "'\""))
                     quote = quote.rstrip() 
@@ -505,8 +1039,69 @@ class Kaiseki:
 
             i+=1
 
-        Kaiseki.translated_text.append(Kaiseki.translated_sentence)
-        Kaiseki.translated_sentence = ""
+##-------------------start-of-realign_sentence()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def realign_sentence(whole_text:str, translate_text:typing.Callable[[str], str]) -> None:
+
+        """
+
+        Translates a sentence whole and puts its punctuation back the way translate_sentence() would have.
+        The translation's sentences are lined up with the original's parts by where their punctuation falls, if there are as many of one as the other each gets its part's punctuation (and tilde), otherwise the translation is kept as one part ending in the original's last punctuation.
+
+        Parameters:
+        whole_text (str) : the sentence, as sent to DeepL.
+        translate_text (callable) : translates the sentence, raising ValueError if it can't.
+
+        """
+
+        try:
+            translation = translate_text(whole_text)
+
+        except ValueError as e:
+
+            if(str(e) != "Text must not be empty."):
+                Kaiseki.translated_sentence += "ERROR"
+
+                Logger.log_action("Error is : " + str(e))
+                Kaiseki.error_text.append("Error is : " + str(e))
+
+            return
+
+        ## if punctuation appears first and before any text, add the punctuation and remove it form the list.
+        if(len(Kaiseki.sentence_punctuation) > len(Kaiseki.sentence_parts)): 
+            Kaiseki.translated_sentence += Kaiseki.sentence_punctuation[0]
+            Kaiseki.sentence_punctuation.pop(0)
+
+        segments = [segment.strip() for segment in Kaiseki.sentence_end_pattern.findall(translation) if segment.strip() != ""]
+
+        has_tilde = ["~" in part for part in Kaiseki.sentence_parts]
+        punctuation = Kaiseki.sentence_punctuation
+
+        if(len(segments) != len(Kaiseki.sentence_parts)):
+
+            Logger.log_debug("Translation has %s sentences but the original has %s parts, keeping it whole : %s", len(segments), len(Kaiseki.sentence_parts), translation)
+
+            segments = [translation]
+            has_tilde = [any(has_tilde)]
+            punctuation = [Kaiseki.sentence_punctuation[-1] if len(Kaiseki.sentence_punctuation) > 0 else None]
+
+        translated_parts = []
+
+        for segment, is_tilde_active, part_punctuation in zip(segments, has_tilde, punctuation):
+
+            translated_part = segment.rstrip(''.join(c for c in string.punctuation if c not in "'\"")).rstrip()
+
+            ## here we re-add the tilde, (note not always accurate but mostly is)
+            if(is_tilde_active):
+                translated_part += "~"
+
+            if(part_punctuation != None):
+                translated_part += part_punctuation
+
+            translated_parts.append(translated_part)
+
+        Kaiseki.translated_sentence += " ".join(translated_parts)
 
 ##-------------------start-of-assemble_results()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
     
@@ -525,6 +1120,13 @@ class Kaiseki:
         
         Kaiseki.translation_print_result += "Time Elapsed : " + Toolkit.get_elapsed_time(time_start, time_end)
 
+        Kaiseki.translation_print_result += "\nNumber of DeepL requests : " + str(Kaiseki.num_requests) + " (" + str(Kaiseki.num_sent_characters) + " characters sent, " + ("whole sentences" if Kaiseki.is_whole_sentence_mode else "sentence parts") + ")"
+
+        num_fragments = Kaiseki.num_cached_fragments + Kaiseki.num_translated_fragments
+
+        Kaiseki.translation_print_result += "\nNumber of fragments served from the fragment cache : " + str(Kaiseki.num_cached_fragments) + " of " + str(num_fragments) + " (" + str(round(Kaiseki.num_cached_fragments / num_fragments * 100, 1) if num_fragments > 0 else 0.0) + "% hit rate, " + str(Kaiseki.num_cached_characters) + " characters of quota saved)"
+        Kaiseki.translation_print_result += "\nNumber of fragments evicted from the fragment cache this session : " + str(FragmentCache.num_evicted)
+
         Kaiseki.translation_print_result += "\n\nDebug text have been written to : " + FileEnsurer.debug_log_path
         Kaiseki.translation_print_result += "\nJ->E text have been written to : " + FileEnsurer.je_check_path
         Kaiseki.translation_print_result += "\nTranslated text has been written to : " + FileEnsurer.translated_text_path
@@ -554,6 +1156,10 @@ class Kaiseki:
         with open(FileEnsurer.translated_text_path, 'w', encoding='utf-8') as file:
             file.writelines(Kaiseki.translated_text)
 
+        ## a run over several files also gets each file's own output, next to the combined output above
+        for file_name, translated_lines, je_check_lines in Kaiseki.file_results:
+            FileEnsurer.write_file_results(file_name, [('translated_text', translated_lines), ('je_check_text', je_check_lines)])
+
         ## Instructions to create a copy of the output for archival
         FileEnsurer.standard_create_directory(FileEnsurer.archive_dir)
 
@@ -568,5 +1174,9 @@ class Kaiseki:
                                  ('kaiseki_error_log', Kaiseki.error_text),
                                  ('debug_log', FileEnsurer.standard_read_file(Logger.log_file_path))]
 
+        for file_name, translated_lines, je_check_lines in Kaiseki.file_results:
+            list_of_result_tuples.append((os.path.splitext(file_name)[0] + '_kaiseki_translated_text', translated_lines))
+            list_of_result_tuples.append((os.path.splitext(file_name)[0] + '_kaiseki_je_check_text', je_check_lines))
+
         FileEnsurer.archive_results(list_of_result_tuples, 
                                     module='kaiseki', timestamp=timestamp)
@@ -8,19 +8,26 @@ import asyncio
 import os
 
 ## third party modules
-from kairyou import KatakanaUtil
-
-import tiktoken
 import backoff
 
 ## custom modules
+from modules.common.translation_job import JobScoped
 from handlers.json_handler import JsonHandler
 
 from modules.common.file_ensurer import FileEnsurer
 from modules.common.logger import Logger
 from modules.common.toolkit import Toolkit
-from modules.common.exceptions import AuthenticationError, MaxBatchDurationExceededException, AuthenticationError, InternalServerError, RateLimitError, APIError, APIConnectionError, APITimeoutError
+from modules.common.exceptions import AuthenticationError, MaxBatchDurationExceededException, StreamAbortedException, AuthenticationError, InternalServerError, RateLimitError, APIError, APIConnectionError, APITimeoutError
 from modules.common.decorators import permission_error_decorator
+from modules.common.response_cache import ResponseCache
+from modules.common.checkpoint_journal import CheckpointJournal
+from modules.common.ordered_output_writer import OrderedOutputWriter
+from modules.common.adaptive_concurrency_limiter import AdaptiveConcurrencyLimiter
+from modules.common.progress_renderer import ProgressRenderer
+from modules.common.line_aligner import LineAligner
+from modules.common.line_classifier import LineClassifier
+from modules.common.token_accountant import TokenAccountant
+from modules.common.api_key_validations import ApiKeyValidations
 
 from custom_classes.messages import SystemTranslationMessage, ModelTranslationMessage
 
@@ -28,7 +35,7 @@ from translation_services.openai_service import OpenAIService
 
 ##-------------------start-of-Kijiku--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-class Kijiku:
+class Kijiku(metaclass=JobScoped):
 
     """
     
@@ -38,6 +45,30 @@ class Kijiku:
     
     text_to_translate:typing.List[str] = []
 
+    ## for a run over several files, (file name, lines) of each file, empty for a single text
+    input_files:typing.List[typing.Tuple[str, typing.List[str]]] = []
+
+    ## (file name, index in translation_batches of the file's first message) of each file in the run
+    file_batch_boundaries:typing.List[typing.Tuple[str, int]] = []
+
+    ## (translated text length, je check text length) before each batch was redistributed, in batch order
+    batch_output_offsets:typing.List[typing.Tuple[int, int]] = []
+
+    ## (file name, translated lines, je check lines) of each file in the run, filled in once the run is done
+    file_results:typing.List[typing.Tuple[str, typing.List[str], typing.List[str]]] = []
+
+    ## the LineClassifier type of each line in text_to_translate
+    line_types:typing.List[str] = []
+
+    ## (line, whether the line is in the prompt) of each line of each batch, in batch order, lines left out of the prompt are repeats of a line sent earlier in the run
+    batch_layouts:typing.List[typing.List[typing.Tuple[str, bool]]] = []
+
+    ## every line put in a prompt so far, for line_deduplication_mode 2
+    sent_lines:typing.Set[str] = set()
+
+    ## the translation of each line sent, filled in as the batches are redistributed so the repeats can reuse it
+    line_translations:typing.Dict[str, str] = {}
+
     translated_text:typing.List[str] = []
 
     je_check_text:typing.List[str] = []
@@ -50,8 +81,25 @@ class Kijiku:
 
     num_occurred_malformed_batches = 0
 
-    ## semaphore to limit the number of concurrent batches
-    _semaphore = asyncio.Semaphore(30)
+    num_cached_batches = 0
+
+    num_restored_batches = 0
+
+    num_repaired_batches = 0
+    num_rerequested_lines = 0
+
+    num_aborted_streams = 0
+
+    num_deduplicated_lines = 0
+    num_deduplicated_tokens = 0
+
+    ## whether to skip the batches already in the checkpoint journal from an interrupted run
+    is_resuming = False
+
+    ## limits the number of concurrent batches, adapting to rate limits and latency with num_concurrent_batches as the ceiling
+    _concurrency_limiter = AdaptiveConcurrencyLimiter(30)
+
+    _progress = ProgressRenderer("Kijiku", 0, unit="batches")
 
     ##--------------------------------------------------------------------------------------------------------------------------
 
@@ -68,6 +116,15 @@ class Kijiku:
     num_of_malform_retries = 0
     max_batch_duration = 0
     num_concurrent_batches = 0
+    batch_packing_mode = 0
+    prompt_token_budget = 0
+    line_deduplication_mode = 0
+
+    ## the english translation of a batch is rarely longer in tokens than the japanese, so the output is expected to be at most this many times the size of the prompt
+    expected_output_token_ratio = 1.0
+
+    ## summary of the batch sizes, shown alongside the cost estimate
+    batch_size_distribution = ""
 
 ##-------------------start-of-get_max_batch_duration()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
     
@@ -102,6 +159,10 @@ class Kijiku:
 
         retry_msg = f"Retrying translation after {details['wait']} seconds after {details['tries']} tries {details['target']} due to {details['exception']}."
 
+        ## a 429 means too many requests are in flight, so back the concurrency off as well
+        if(isinstance(details.get('exception'), RateLimitError)):
+            Kijiku._concurrency_limiter.record_rate_limit()
+
         Logger.log_barrier()
         Logger.log_action(retry_msg)
         Logger.log_barrier()
@@ -214,17 +275,20 @@ class Kijiku:
 
             OpenAIService.set_api_key(api_key)
 
-            is_valid, e = await OpenAIService.test_api_key_validity()
+            ## a key that worked recently isn't tested again, saving a round trip every run
+            if(not ApiKeyValidations.is_validated("openai", api_key)):
 
-            ## if not valid, raise the exception that caused the test to fail
-            if(not is_valid and e is not None):
-                raise e
+                is_valid, e = await OpenAIService.test_api_key_validity()
+
+                ## if not valid, raise the exception that caused the test to fail
+                if(not is_valid and e is not None):
+                    raise e
+
+                ApiKeyValidations.record_validation("openai", api_key)
         
             Logger.log_action("Used saved API key in " + FileEnsurer.openai_api_key_path, output=True)
             Logger.log_barrier()
 
-            time.sleep(2)
-
         ## else try to get API key manually
         except:
 
@@ -242,6 +306,8 @@ class Kijiku:
                 if(not is_valid and e is not None):
                     raise e
 
+                ApiKeyValidations.record_validation("openai", api_key)
+
                 FileEnsurer.standard_overwrite_file(FileEnsurer.openai_api_key_path, base64.b64encode(api_key.encode('utf-8')).decode('utf-8'), omit=True)
                 
             ## if invalid key exit
@@ -281,11 +347,32 @@ class Kijiku:
         Logger.clear_batch()
 
         Kijiku.text_to_translate = []
+        Kijiku.line_types = []
+        Kijiku.batch_layouts = []
+        Kijiku.sent_lines = set()
+        Kijiku.line_translations = {}
+        Kijiku.input_files = []
+        Kijiku.file_batch_boundaries = []
+        Kijiku.batch_output_offsets = []
+        Kijiku.file_results = []
         Kijiku.translated_text = []
         Kijiku.je_check_text = []
         Kijiku.error_text = []
         Kijiku.translation_batches = []
         Kijiku.num_occurred_malformed_batches = 0
+        Kijiku.num_cached_batches = 0
+        Kijiku.num_restored_batches = 0
+        Kijiku.num_repaired_batches = 0
+        Kijiku.num_rerequested_lines = 0
+        Kijiku.num_aborted_streams = 0
+        Kijiku.num_deduplicated_lines = 0
+        Kijiku.num_deduplicated_tokens = 0
+        Kijiku.batch_size_distribution = ""
+
+        OpenAIService.num_streamed_requests = 0
+        OpenAIService.total_time_to_first_token = 0.0
+        OpenAIService.total_streamed_tokens = 0
+        OpenAIService.total_streaming_time = 0.0
         Kijiku.translation_print_result = ""
 
 ##-------------------start-of-check-settings()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -337,15 +424,7 @@ class Kijiku:
         for key,value in JsonHandler.current_kijiku_rules["open ai settings"].items():
             Logger.log_action(key + " : " + str(value))
 
-        Kijiku.model = JsonHandler.current_kijiku_rules["open ai settings"]["model"]
-        Kijiku.translation_instructions = JsonHandler.current_kijiku_rules["open ai settings"]["system_message"]
-        Kijiku.message_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["message_mode"])
-        Kijiku.prompt_size = int(JsonHandler.current_kijiku_rules["open ai settings"]["num_lines"])
-        Kijiku.sentence_fragmenter_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["sentence_fragmenter_mode"])
-        Kijiku.je_check_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["je_check_mode"])
-        Kijiku.num_of_malform_retries = int(JsonHandler.current_kijiku_rules["open ai settings"]["num_malformed_batch_retries"])
-        Kijiku.max_batch_duration = float(JsonHandler.current_kijiku_rules["open ai settings"]["batch_retry_timeout"])
-        Kijiku.num_concurrent_batches = int(JsonHandler.current_kijiku_rules["open ai settings"]["num_concurrent_batches"])
+        Kijiku.load_translation_settings()
 
         OpenAIService.model = Kijiku.model
         OpenAIService.temperature = float(JsonHandler.current_kijiku_rules["open ai settings"]["temp"])
@@ -358,11 +437,20 @@ class Kijiku:
         OpenAIService.frequency_penalty = float(JsonHandler.current_kijiku_rules["open ai settings"]["frequency_penalty"])
         OpenAIService.max_tokens = JsonHandler.current_kijiku_rules["open ai settings"]["max_tokens"]
 
+        rate_limits = JsonHandler.current_kijiku_rules.get("rate limit settings", {}).get(Kijiku.model, {})
+
+        OpenAIService.set_rate_limits(rate_limits.get("requests_per_minute"), rate_limits.get("tokens_per_minute"))
+
+        if(OpenAIService.rate_limiter is not None):
+            Logger.log_action(f"Pacing requests to {rate_limits.get('requests_per_minute')} requests per minute and {rate_limits.get('tokens_per_minute')} tokens per minute.")
+
         decorator_to_use = backoff.on_exception(backoff.expo, max_time=lambda: Kijiku.get_max_batch_duration(), exception=(AuthenticationError, InternalServerError, RateLimitError, APIError, APIConnectionError, APITimeoutError), on_backoff=lambda details: Kijiku.log_retry(details), on_giveup=lambda details: Kijiku.log_failure(details), raise_on_giveup=False)
 
         OpenAIService.set_decorator(decorator_to_use)
 
-        Kijiku._semaphore = asyncio.Semaphore(Kijiku.num_concurrent_batches)
+        Kijiku._concurrency_limiter = AdaptiveConcurrencyLimiter(Kijiku.num_concurrent_batches)
+
+        Logger.log_action(f"Concurrency limit starting at {Kijiku._concurrency_limiter.limit} (ceiling {Kijiku._concurrency_limiter.max_limit}).")
 
         Toolkit.clear_console()
 
@@ -386,30 +474,65 @@ class Kijiku:
         async_requests = []
         length = len(Kijiku.translation_batches)
 
+        ## batches an interrupted run already finished, taken straight from the checkpoint journal
+        num_restored_batches = 0
+        journaled_batches = CheckpointJournal.load() if Kijiku.is_resuming else {}
+
+        CheckpointJournal.start(is_resuming=Kijiku.is_resuming)
+
+        ## finished batches are written to the output files in order as soon as every batch before them is done
+        OrderedOutputWriter.start(format_batch=Kijiku.format_batch, window_size=Kijiku.num_concurrent_batches * 4)
+
         for i in range(0, length, 2):
+
+            if(i in journaled_batches and journaled_batches[i][0] == CheckpointJournal.generate_prompt_hash(Kijiku.translation_batches[i], Kijiku.translation_batches[i+1])):
+                num_restored_batches += 1
+                await OrderedOutputWriter.submit(i // 2, Kijiku.translation_batches[i+1], journaled_batches[i][1])
+                continue
+
             async_requests.append(Kijiku.handle_translation(i, length, Kijiku.translation_batches[i], Kijiku.translation_batches[i+1]))
 
+        Kijiku.num_restored_batches = num_restored_batches
+
+        if(Kijiku.is_resuming):
+            Logger.log_action(f"Resuming translation, {num_restored_batches} of {length//2} batches were restored from the checkpoint journal.", output=not is_webgui)
+
+        ## the per batch messages only go to the log, the console just shows the bar
+        Kijiku._progress = ProgressRenderer("Kijiku", len(async_requests), unit="batches", get_status=Kijiku._concurrency_limiter.format_limit)
+
         ## Use asyncio.gather to run tasks concurrently/asynchronously and wait for all of them to complete
-        results = await asyncio.gather(*async_requests)
+        ## redistribution happens as the batches come in, see format_batch()
+        async_tasks = [asyncio.create_task(async_request) for async_request in async_requests]
 
-        Logger.log_barrier()
-        Logger.log_action("Translation Complete!", output=not is_webgui)
+        try:
+            await asyncio.gather(*async_tasks)
 
-        Logger.log_barrier()
-        Logger.log_action("Starting Redistribution...", output=not is_webgui)
+        ## if anything stops the run (i.e. a batch running out of retries or a webgui clear), the batches still going are cancelled and waited on
+        ## this has to happen before the writer is closed, otherwise they would be left waiting on its window or handing it batches it never writes
+        finally:
+
+            for async_task in async_tasks:
+                async_task.cancel()
+
+            await asyncio.gather(*async_tasks, return_exceptions=True)
+
+            Kijiku._progress.finish()
+
+            await OrderedOutputWriter.close()
+            CheckpointJournal.close()
 
         Logger.log_barrier()
+        Logger.log_action("Translation Complete!", output=not is_webgui)
 
-        ## Sort results based on the index to maintain order
-        sorted_results = sorted(results, key=lambda x: x[0])
+        Logger.log_barrier()
 
-        ## Redistribute the sorted results
-        for index, translated_prompt, translated_message in sorted_results:
-            Kijiku.redistribute(translated_prompt, translated_message)
+        ## has to happen before fix_je() below, as the offsets are into the unpaired je check text
+        if(len(Kijiku.input_files) > 0):
+            Kijiku.file_results = Kijiku.split_results_by_file()
 
         ## try to pair the text for j-e checking if the mode is 2
         if(Kijiku.je_check_mode == 2):
-            Kijiku.je_check_text = Kijiku.fix_je()
+            Kijiku.je_check_text = Kijiku.fix_je(Kijiku.je_check_text)
 
         Toolkit.clear_console()
 
@@ -419,10 +542,34 @@ class Kijiku:
         ## assemble error text based of the error list
         Kijiku.error_text = Logger.errors
 
+##-------------------start-of-load_translation_settings()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def load_translation_settings() -> None:
+
+        """
+
+        Loads the settings that decide how the text is batched from the current kijiku rules.
+
+        """
+
+        Kijiku.model = JsonHandler.current_kijiku_rules["open ai settings"]["model"]
+        Kijiku.translation_instructions = JsonHandler.current_kijiku_rules["open ai settings"]["system_message"]
+        Kijiku.message_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["message_mode"])
+        Kijiku.prompt_size = int(JsonHandler.current_kijiku_rules["open ai settings"]["num_lines"])
+        Kijiku.sentence_fragmenter_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["sentence_fragmenter_mode"])
+        Kijiku.je_check_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["je_check_mode"])
+        Kijiku.num_of_malform_retries = int(JsonHandler.current_kijiku_rules["open ai settings"]["num_malformed_batch_retries"])
+        Kijiku.max_batch_duration = float(JsonHandler.current_kijiku_rules["open ai settings"]["batch_retry_timeout"])
+        Kijiku.num_concurrent_batches = int(JsonHandler.current_kijiku_rules["open ai settings"]["num_concurrent_batches"])
+        Kijiku.batch_packing_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["batch_packing_mode"])
+        Kijiku.prompt_token_budget = int(JsonHandler.current_kijiku_rules["open ai settings"]["num_tokens_per_batch"])
+        Kijiku.line_deduplication_mode = int(JsonHandler.current_kijiku_rules["open ai settings"]["line_deduplication_mode"])
+
 ##-------------------start-of-generate_prompt()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    def generate_prompt(index:int) -> tuple[typing.List[str],int]:
+    def generate_prompt(index:int) -> tuple[typing.List[str],typing.List[typing.Tuple[str, bool]],int]:
 
         """
 
@@ -433,47 +580,82 @@ class Kijiku:
 
         Returns:
         prompt (list - string) : A list of Japanese lines that will be assembled into messages.
+        layout (list - tuple - str, bool) : Every line the batch covers, and whether it is in the prompt or a repeat of a line sent earlier.
         index (int) : An updated int representing where we currently are in the text file.
 
         """
 
         prompt = []
+        layout = []
+        num_prompt_tokens = 0
+
+        def add_line(sentence:str, num_sentence_tokens:int) -> int:
+
+            ## in line_deduplication_mode 2 a line sent earlier in the run is left out of the prompt and doesn't take up room in the batch, format_batch() fills it back in
+            if(Kijiku.line_deduplication_mode == 2 and sentence in Kijiku.sent_lines):
+                layout.append((sentence, False))
+                Kijiku.num_deduplicated_lines += 1
+                Kijiku.num_deduplicated_tokens += Kijiku.count_tokens(sentence + '\n')
+                Logger.log_debug("Sentence : %s, Sentence was already sent... reusing its translation.", sentence)
+                return 0
 
-        non_word_pattern = re.compile(r'^[\W_\s\n-]+$')
-        alphanumeric_pattern = re.compile(r'^[A-Za-z0-9\s\.,\'\?!]+\n*$')
+            Kijiku.sent_lines.add(sentence)
+            prompt.append(sentence + '\n')
+            layout.append((sentence, True))
+
+            return num_sentence_tokens
 
         while(index < len(Kijiku.text_to_translate)):
 
             sentence = Kijiku.text_to_translate[index]
-            is_part_in_sentence = "part" in sentence.lower()
+            line_type = Kijiku.line_types[index]
+
+            ## mode 1 fills the batch by line count, mode 2 by tokens, a batch always gets at least one line so an oversized line can't stall the loop
+            if(Kijiku.batch_packing_mode == 2):
+                num_sentence_tokens = Kijiku.count_tokens(sentence + '\n')
+                has_room = len(prompt) == 0 or num_prompt_tokens + num_sentence_tokens <= Kijiku.prompt_token_budget
 
-            if(len(prompt) < Kijiku.prompt_size):
+            else:
+                num_sentence_tokens = 0
+                has_room = len(prompt) < Kijiku.prompt_size
 
-                if(any(char in sentence for char in ["▼", "△", "◇"])):
-                    prompt.append(sentence + '\n')
-                    Logger.log_action("Sentence : " + sentence + ", Sentence is a pov change... leaving intact.")
+            if(has_room):
+
+                if(line_type == LineClassifier.POV_CHANGE):
+                    num_prompt_tokens += add_line(sentence, num_sentence_tokens)
+                    Logger.log_debug("Sentence : %s, Sentence is a pov change... leaving intact.", sentence)
                     index += 1
 
-                elif(is_part_in_sentence or all(char in ["１","２","３","４","５","６","７","８","９", " "] for char in sentence) and not all(char in [" "] for char in sentence)):
-                    prompt.append(sentence + '\n') 
-                    Logger.log_action("Sentence : " + sentence + ", Sentence is part marker... leaving intact.")
+                elif(line_type == LineClassifier.PART_MARKER):
+                    num_prompt_tokens += add_line(sentence, num_sentence_tokens)
+                    Logger.log_debug("Sentence : %s, Sentence is part marker... leaving intact.", sentence)
                     index += 1
 
-                elif(non_word_pattern.match(sentence) or KatakanaUtil.is_punctuation(sentence)):
-                    Logger.log_action("Sentence : " + sentence + ", Sentence is punctuation... skipping.")
+                elif(line_type in [LineClassifier.EMPTY, LineClassifier.PUNCTUATION, LineClassifier.QUOTED_PUNCTUATION]):
+                    Logger.log_debug("Sentence : %s, Sentence is punctuation... skipping.", sentence)
                     index += 1
                     
-                elif(alphanumeric_pattern.match(sentence) and not is_part_in_sentence):
-                    Logger.log_action("Sentence is empty... skipping translation.")
+                elif(line_type == LineClassifier.LATIN):
+                    Logger.log_debug("Sentence is empty... skipping translation.")
                     index += 1
                 else:
-                    prompt.append(sentence + "\n")
+                    num_prompt_tokens += add_line(sentence, num_sentence_tokens)
             else:
-                return prompt, index
+                return prompt, layout, index
 
             index += 1
 
-        return prompt, index
+        ## only the end of a file can leave a batch of nothing but repeats, which still needs a line to send
+        if(len(prompt) == 0 and len(layout) > 0):
+            sentence = layout[0][0]
+
+            prompt.append(sentence + '\n')
+            layout[0] = (sentence, True)
+
+            Kijiku.num_deduplicated_lines -= 1
+            Kijiku.num_deduplicated_tokens -= Kijiku.count_tokens(sentence + '\n')
+
+        return prompt, layout, index
     
 ##-------------------start-of-build_translation_batches()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -486,26 +668,47 @@ class Kijiku:
         
         """
 
-        i = 0
+        if(Kijiku.batch_packing_mode == 2):
+            Kijiku.prompt_token_budget = Kijiku.get_prompt_token_budget()
 
-        while i < len(Kijiku.text_to_translate):
-            prompt, i = Kijiku.generate_prompt(i)
+        ## every file gets its own batches so no batch spans two files, but they all go through the same run
+        input_files = Kijiku.input_files if len(Kijiku.input_files) > 0 else [("", Kijiku.text_to_translate)]
 
-            prompt = ''.join(prompt)
+        all_lines = []
 
-            ## message mode one structures the first message as a system message and the second message as a model message
-            if(Kijiku.message_mode == 1):
-                system_msg = SystemTranslationMessage(role="system", content=Kijiku.translation_instructions)
+        for file_name, lines in input_files:
 
-            ## while message mode two structures the first message as a model message and the second message as a model message too, typically used for non-gpt-4 models if at all
-            else:
-                system_msg = ModelTranslationMessage(role="user", content=Kijiku.translation_instructions)
+            Kijiku.text_to_translate = Kijiku.split_long_lines(lines) if Kijiku.batch_packing_mode == 2 else lines
+            Kijiku.line_types = LineClassifier.classify_lines(Kijiku.text_to_translate)
+            Kijiku.file_batch_boundaries.append((file_name, len(Kijiku.translation_batches)))
+
+            all_lines.extend(Kijiku.text_to_translate)
+
+            i = 0
+
+            while i < len(Kijiku.text_to_translate):
+                prompt, layout, i = Kijiku.generate_prompt(i)
+
+                prompt = ''.join(prompt)
+
+                Kijiku.batch_layouts.append(layout)
 
-            Kijiku.translation_batches.append(system_msg)
+                ## message mode one structures the first message as a system message and the second message as a model message
+                if(Kijiku.message_mode == 1):
+                    system_msg = SystemTranslationMessage(role="system", content=Kijiku.translation_instructions)
 
-            model_msg = ModelTranslationMessage(role="user", content=prompt)
+                ## while message mode two structures the first message as a model message and the second message as a model message too, typically used for non-gpt-4 models if at all
+                else:
+                    system_msg = ModelTranslationMessage(role="user", content=Kijiku.translation_instructions)
+
+                Kijiku.translation_batches.append(system_msg)
+
+                model_msg = ModelTranslationMessage(role="user", content=prompt)
 
-            Kijiku.translation_batches.append(model_msg)
+                Kijiku.translation_batches.append(model_msg)
+
+        ## the cost estimate goes off the whole run's text
+        Kijiku.text_to_translate = all_lines
 
         Logger.log_barrier()
         Logger.log_action("Built Messages : ")
@@ -519,12 +722,184 @@ class Kijiku:
 
             if(i % 2 == 0):
 
-                Logger.log_action(str(message))
+                Logger.log_debug("%s", message)
         
             else:
 
-                Logger.log_action(str(message))
-                Logger.log_barrier()
+                Logger.log_debug("%s", message)
+                Logger.log_debug("-------------------------")
+
+        Kijiku.batch_size_distribution = Kijiku.get_batch_size_distribution()
+
+        Logger.log_action(Kijiku.batch_size_distribution)
+
+        if(Kijiku.line_deduplication_mode == 2):
+            Logger.log_action(Kijiku.get_deduplication_summary())
+        Logger.log_barrier()
+
+##-------------------start-of-count_tokens()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_tokens(text:str) -> int:
+
+        """
+
+        Counts the tokens in a piece of text for the current model.
+
+        Parameters:
+        text (str) : the text to count.
+
+        Returns:
+        num_tokens (int) : the number of tokens in the text.
+
+        """
+
+        return TokenAccountant.count_tokens(text, Kijiku.model)
+
+##-------------------start-of-get_prompt_token_budget()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_prompt_token_budget() -> int:
+
+        """
+
+        Works out how many tokens of Japanese text can go into a batch.
+        This is num_tokens_per_batch, lowered if needed so the system message, the batch and the expected translation all fit within the model's context length and output limit.
+
+        Returns:
+        prompt_token_budget (int) : the number of tokens of Japanese text allowed in a batch.
+
+        """
+
+        context_length, max_output_tokens = FileEnsurer.model_token_limits[Kijiku.model]
+
+        ## max_tokens caps the output if it is set
+        if(isinstance(OpenAIService.max_tokens, int)):
+            max_output_tokens = min(max_output_tokens, OpenAIService.max_tokens)
+
+        ## each message costs a few tokens for its role and separators, and the reply is primed with a few more
+        num_instruction_tokens = Kijiku.count_tokens(Kijiku.translation_instructions) + 10
+
+        available_tokens = context_length - num_instruction_tokens
+
+        largest_fitting_prompt = min(available_tokens / (1 + Kijiku.expected_output_token_ratio), 
+                                     max_output_tokens / Kijiku.expected_output_token_ratio)
+
+        prompt_token_budget = max(1, min(Kijiku.prompt_token_budget, int(largest_fitting_prompt)))
+
+        if(prompt_token_budget < Kijiku.prompt_token_budget):
+            Logger.log_action(f"num_tokens_per_batch lowered from {Kijiku.prompt_token_budget} to {prompt_token_budget} so batches fit within {Kijiku.model}'s limits.", output=True)
+
+        return prompt_token_budget
+
+##-------------------start-of-split_long_lines()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def split_long_lines(lines:typing.List[str]) -> typing.List[str]:
+
+        """
+
+        Splits any line that would not fit in a batch on its own.
+        Lines are split after their sentence endings (keeping closing brackets with their sentence), and only a single sentence that is still too long is cut by length.
+
+        Parameters:
+        lines (list - str) : the lines to split.
+
+        Returns:
+        split_lines (list - str) : the lines, with the long ones split into several.
+
+        """
+
+        split_lines = []
+
+        sentence_pattern = re.compile(r'[^。！？!?]*[。！？!?]+[」』）)]*|[^。！？!?]+$')
+
+        for line in lines:
+
+            if(Kijiku.count_tokens(line + '\n') <= Kijiku.prompt_token_budget):
+                split_lines.append(line)
+                continue
+
+            pieces = []
+            current_piece = ""
+
+            for sentence in sentence_pattern.findall(line):
+
+                if(current_piece and Kijiku.count_tokens(current_piece + sentence + '\n') > Kijiku.prompt_token_budget):
+                    pieces.append(current_piece)
+                    current_piece = ""
+
+                ## a single sentence longer than a batch, nothing to do but cut it
+                while(Kijiku.count_tokens(sentence + '\n') > Kijiku.prompt_token_budget):
+                    num_chars = max(1, len(sentence) * Kijiku.prompt_token_budget // Kijiku.count_tokens(sentence + '\n'))
+
+                    while(num_chars > 1 and Kijiku.count_tokens(sentence[:num_chars] + '\n') > Kijiku.prompt_token_budget):
+                        num_chars -= 1
+
+                    pieces.append(sentence[:num_chars])
+                    sentence = sentence[num_chars:]
+
+                current_piece += sentence
+
+            if(current_piece):
+                pieces.append(current_piece)
+
+            Logger.log_debug("Sentence : %s, Sentence is too long for a single batch... split into %d lines.", line, len(pieces))
+
+            split_lines.extend(pieces)
+
+        return split_lines
+
+##-------------------start-of-get_batch_size_distribution()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_batch_size_distribution() -> str:
+
+        """
+
+        Summarizes how many lines and tokens went into each batch.
+
+        Returns:
+        batch_size_distribution (str) : the summary of the batch sizes.
+
+        """
+
+        prompts = [str(message["content"]) for message in Kijiku.translation_batches[1::2]]
+
+        if(len(prompts) == 0):
+            return "Number of batches : 0"
+
+        lines_per_batch = sorted(len([line for line in prompt.split('\n') if line.strip()]) for prompt in prompts)
+        tokens_per_batch = sorted(Kijiku.count_tokens(prompt) for prompt in prompts)
+
+        def describe(sizes:typing.List[int]) -> str:
+            percentile = lambda p: sizes[min(len(sizes) - 1, int(len(sizes) * p))]
+            return f"min {sizes[0]}, median {percentile(0.5)}, 90th percentile {percentile(0.9)}, max {sizes[-1]}"
+
+        batch_size_distribution = "Number of batches : " + str(len(prompts))
+        batch_size_distribution += "\nLines per batch : " + describe(lines_per_batch)
+        batch_size_distribution += "\nTokens per batch : " + describe(tokens_per_batch)
+
+        return batch_size_distribution
+
+##-------------------start-of-get_deduplication_summary()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_deduplication_summary() -> str:
+
+        """
+
+        Summarizes how much line_deduplication_mode 2 left out of the batches.
+
+        Returns:
+        deduplication_summary (str) : the number of repeated lines left out and the tokens that saves.
+
+        """
+
+        ## a repeat saves its own tokens and the translation that would have come back for it
+        num_saved_tokens = round(Kijiku.num_deduplicated_tokens * (1 + Kijiku.expected_output_token_ratio))
+
+        return "Repeated lines reusing an earlier translation : " + str(Kijiku.num_deduplicated_lines) + " (about " + str(num_saved_tokens) + " tokens saved)"
 
 ##-------------------start-of-estimate_cost()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -602,7 +977,6 @@ class Kijiku:
                 return Kijiku.estimate_cost(model, price_case=6)
             
         else:
-            encoding = tiktoken.encoding_for_model(model)
 
             cost_per_thousand_input_tokens = 0
             cost_per_thousand_output_tokens = 0
@@ -647,13 +1021,16 @@ class Kijiku:
                 cost_per_thousand_input_tokens = 0.0005
                 cost_per_thousand_output_tokens = 0.0015
 
-            ## break down the text into a string than into tokens
-            text = ''.join(Kijiku.text_to_translate)
+            ## once the batches are built, every request's system message and message overhead is counted too
+            if(len(Kijiku.translation_batches) > 0):
+                num_tokens, num_output_tokens = TokenAccountant.count_batches_tokens(Kijiku.translation_batches, model)
 
-            num_tokens = len(encoding.encode(text))
+            else:
+                num_tokens = TokenAccountant.count_lines_tokens(Kijiku.text_to_translate, model)
+                num_output_tokens = num_tokens
 
             min_cost_for_input = round((float(num_tokens) / 1000.00) * cost_per_thousand_input_tokens, 5)
-            min_cost_for_output = round((float(num_tokens) / 1000.00) * cost_per_thousand_output_tokens, 5)
+            min_cost_for_output = round((float(num_output_tokens) / 1000.00) * cost_per_thousand_output_tokens, 5)
 
             min_cost = round(min_cost_for_input + min_cost_for_output, 5)
 
@@ -679,6 +1056,13 @@ class Kijiku:
         Logger.log_action("Estimated minimum cost : " + str(min_cost) + " USD", output=True, omit_timestamp=True)
         Logger.log_barrier()
 
+        Logger.log_action(Kijiku.batch_size_distribution, output=True, omit_timestamp=True)
+
+        if(Kijiku.line_deduplication_mode == 2):
+            Logger.log_action(Kijiku.get_deduplication_summary(), output=True, omit_timestamp=True)
+
+        Logger.log_barrier()
+
         if(not omit_prompt):
             if(input("\nContinue? (1 for yes or 2 for no) : ") == "1"):
                 Logger.log_action("User confirmed translation.")
@@ -713,31 +1097,78 @@ class Kijiku:
         if(FileEnsurer.do_interrupt == True):
             raise Exception("Interrupted by user.")
 
+        message_number = (index // 2) + 1
+
+        ## keeps the reorder buffer bounded, a batch far ahead of the output waits for the earlier ones to finish
+        await OrderedOutputWriter.wait_for_window(index // 2)
+
+        ## no need to bother the api if this exact request has already been answered
+        cache_key = Kijiku.generate_cache_key(translation_instructions, translation_prompt)
+        cached_message = ResponseCache.get(cache_key)
+
+        if(cached_message is not None):
+            Kijiku.num_cached_batches += 1
+            Logger.log_action(f"Batch {message_number} of {length//2} was found in the response cache, skipping translation.")
+            await CheckpointJournal.record(index, CheckpointJournal.generate_prompt_hash(translation_instructions, translation_prompt), cached_message)
+            await OrderedOutputWriter.submit(index // 2, translation_prompt, cached_message)
+            Kijiku._progress.advance()
+            return index, translation_prompt, cached_message
+
         ## Basically limits the number of concurrent batches
-        async with Kijiku._semaphore:
+        async with Kijiku._concurrency_limiter:
             num_tries = 0
 
+            ## only clean translations get cached, untranslated, malformed or repaired batches should be retried on the next run
+            is_cacheable = False
+
+            ## batches that time out are left out of the journal so a resumed run tries them again
+            is_translated = True
+
             while True:
             
-                message_number = (index // 2) + 1
-                Logger.log_action(f"Trying translation for batch {message_number} of {length//2}...", output=True)
+                Logger.log_action(f"Trying translation for batch {message_number} of {length//2} (concurrency limit {Kijiku._concurrency_limiter.limit})...")
 
 
                 try:
-                    translated_message = await OpenAIService.translate_message(translation_instructions, translation_prompt)
+
+                    ## a gpt 4 response that clearly has too many lines is cut off early, as long as it can still be retried
+                    is_line_count_checked = "gpt-4" in Kijiku.model and num_tries < Kijiku.num_of_malform_retries
+
+                    ## the latency is only the successful request itself, waits on the rate limiter, backoff sleeps and rate limited attempts would read as congestion
+                    translated_message, request_latency, num_tokens = await OpenAIService.translate_message(translation_instructions, translation_prompt, is_line_count_checked)
+
+                    await Kijiku._concurrency_limiter.record_success(request_latency, num_tokens)
+
+                ## the response was cut off partway, so there is nothing worth keeping from it
+                except StreamAbortedException as e:
+                    Kijiku.num_aborted_streams += 1
+
+                    if(num_tries >= Kijiku.num_of_malform_retries):
+                        translated_message = translation_prompt["content"]
+                        is_translated = False
+                        Logger.log_error(f"Batch {message_number} of {length//2} was aborted ({e.message}) and exceeded the maximum number of retries, returning the untranslated text...", output=True)
+                        break
+
+                    num_tries += 1
+                    Kijiku.num_occurred_malformed_batches += 1
+                    Logger.log_error(f"Batch {message_number} of {length//2} was aborted ({e.message}), retrying...", output=True)
+                    continue
 
                 ## will only occur if the max_batch_duration is exceeded, so we just return the untranslated text
                 except MaxBatchDurationExceededException:
                     translated_message = translation_prompt["content"]
+                    is_translated = False
                     Logger.log_error(f"Batch {message_number} of {length//2} was not translated due to exceeding the max request duration, returning the untranslated text...", output=True)
                     break
 
                 ## do not even bother if not a gpt 4 model, because gpt-3 seems unable to format properly
                 if("gpt-4" not in Kijiku.model):
+                    is_cacheable = True
                     break
 
                 if(await Kijiku.check_if_translation_is_good(translated_message, translation_prompt)):
-                    Logger.log_action(f"Translation for batch {message_number} of {length//2} successful!", output=True)
+                    Logger.log_action(f"Translation for batch {message_number} of {length//2} successful!")
+                    is_cacheable = True
                     break
 
                 if(num_tries >= Kijiku.num_of_malform_retries):
@@ -746,10 +1177,156 @@ class Kijiku:
 
                 else:
                     num_tries += 1
-                    Logger.log_error(f"Batch {message_number} of {length//2} was malformed, retrying...", output=True)
                     Kijiku.num_occurred_malformed_batches += 1
 
-            return index, translation_prompt, translated_message
+                    ## usually only a few lines are off, so try to keep the rest and only re-request those before resending the whole batch
+                    repaired_message = await Kijiku.repair_malformed_batch(translation_instructions, translation_prompt, translated_message, message_number, length)
+
+                    ## a repaired batch is pieced together from several responses, so it is held to the same check as a whole one, and never cached as if the api had answered it that way
+                    if(repaired_message is not None and await Kijiku.check_if_translation_is_good(repaired_message, translation_prompt)):
+                        translated_message = repaired_message
+                        Kijiku.num_repaired_batches += 1
+                        Logger.log_action(f"Batch {message_number} of {length//2} was malformed, but was repaired, Translation successful!", output=True)
+                        break
+
+                    Logger.log_error(f"Batch {message_number} of {length//2} was malformed, retrying...", output=True)
+
+            if(is_cacheable):
+                ResponseCache.put(cache_key, Kijiku.model, translated_message)
+
+            if(is_translated):
+                await CheckpointJournal.record(index, CheckpointJournal.generate_prompt_hash(translation_instructions, translation_prompt), translated_message)
+
+        await OrderedOutputWriter.submit(index // 2, translation_prompt, translated_message)
+
+        Kijiku._progress.advance()
+
+        return index, translation_prompt, translated_message
+
+##-------------------start-of-repair_malformed_batch()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def repair_malformed_batch(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage, translated_message:str, message_number:int, length:int) -> str | None:
+
+        """
+
+        Tries to repair a malformed batch by keeping the lines that line up with the source and re-requesting only the ones that don't.
+
+        Parameters:
+        translation_instructions (object - SystemTranslationMessage | ModelTranslationMessage) : The system message also known as the instructions.
+        translation_prompt (object - ModelTranslationMessage) : The user message also known as the prompt.
+        translated_message (str) : the malformed translated message.
+        message_number (int) : the batch's number, for the log.
+        length (int) : the length of the original list, for the log.
+
+        Returns:
+        repaired_message (str | None) : the repaired translated message, or None if most of the batch is off and it is better to resend all of it.
+
+        """
+
+        source_lines = [line for line in translation_prompt["content"].split('\n') if line.strip()]
+        translated_lines = [line for line in translated_message.split('\n') if line.strip()]
+
+        aligned_lines = LineAligner.align(source_lines, translated_lines)
+        unaligned_spans = LineAligner.get_unaligned_spans(aligned_lines)
+
+        num_unaligned_lines = sum(end - start for start, end in unaligned_spans)
+
+        if(num_unaligned_lines * 2 > len(source_lines)):
+            Logger.log_action(f"Batch {message_number} of {length//2} has {num_unaligned_lines} of {len(source_lines)} lines that could not be aligned, resending the whole batch instead of repairing it.")
+            return None
+
+        Logger.log_action(f"Batch {message_number} of {length//2} was malformed, re-requesting {num_unaligned_lines} of {len(source_lines)} lines...", output=True)
+
+        try:
+            span_translations = await asyncio.gather(*[Kijiku.translate_span(translation_instructions, source_lines[start:end]) for start, end in unaligned_spans])
+
+        except (MaxBatchDurationExceededException, StreamAbortedException):
+            return None
+
+        for (start, end), span_translation in zip(unaligned_spans, span_translations):
+
+            if(span_translation is None):
+                return None
+
+            aligned_lines[start:end] = span_translation
+
+        return '\n'.join(typing.cast(typing.List[str], aligned_lines))
+
+##-------------------start-of-translate_span()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def translate_span(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, source_lines:typing.List[str]) -> typing.List[str] | None:
+
+        """
+
+        Translates a run of source lines on their own, splitting the run in half and trying again whenever the line count comes back wrong.
+
+        Parameters:
+        translation_instructions (object - SystemTranslationMessage | ModelTranslationMessage) : The system message also known as the instructions.
+        source_lines (list - str) : the lines to translate.
+
+        Returns:
+        translated_lines (list - str | None) : exactly one translated line per source line, or None if nothing came back.
+
+        """
+
+        span_prompt = ModelTranslationMessage(role="user", content=''.join(line + '\n' for line in source_lines))
+
+        Kijiku.num_rerequested_lines += len(source_lines)
+
+        translated_message, _, _ = await OpenAIService.translate_message(translation_instructions, span_prompt)
+
+        translated_lines = [line for line in (translated_message or "").split('\n') if line.strip()]
+
+        if(len(translated_lines) == len(source_lines)):
+            return translated_lines
+
+        ## a single line can't be split any further, whatever came back is its translation
+        if(len(source_lines) == 1):
+            return [" ".join(line.strip() for line in translated_lines)] if translated_lines else None
+
+        middle = len(source_lines) // 2
+
+        first_half = await Kijiku.translate_span(translation_instructions, source_lines[:middle])
+        second_half = await Kijiku.translate_span(translation_instructions, source_lines[middle:])
+
+        if(first_half is None or second_half is None):
+            return None
+
+        return first_half + second_half
+
+##-------------------start-of-generate_cache_key()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def generate_cache_key(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage) -> str:
+
+        """
+
+        Generates the response cache key for a batch, covering everything that can change what the API returns.
+
+        Parameters:
+        translation_instructions (object - SystemTranslationMessage | ModelTranslationMessage) : The system message also known as the instructions.
+        translation_prompt (object - ModelTranslationMessage) : The user message also known as the prompt.
+
+        Returns:
+        cache_key (str) : the cache key for the batch.
+
+        """
+
+        request_components = {
+            "model": OpenAIService.model,
+            "messages": [dict(translation_instructions), dict(translation_prompt)],
+            "temperature": OpenAIService.temperature,
+            "top_p": OpenAIService.top_p,
+            "n": OpenAIService.n,
+            "stop": OpenAIService.stop,
+            "presence_penalty": OpenAIService.presence_penalty,
+            "frequency_penalty": OpenAIService.frequency_penalty,
+            "max_tokens": OpenAIService.max_tokens
+        }
+
+        return ResponseCache.generate_key(request_components)
     
 ##-------------------start-of-check_if_translation_is_good()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -808,6 +1385,9 @@ class Kijiku:
         ## mode 1 is the default mode, uses regex and other nonsense to split sentences
         if(Kijiku.sentence_fragmenter_mode == 1): 
 
+            ## earlier batches may already be on disk, so only this batch's sentences get patched
+            first_new_line = len(Kijiku.translated_text)
+
             sentences = re.findall(r"(.*?(?:(?:\"|\'|-|~|!|\?|%|\(|\)|\.\.\.|\.|---|\[|\])))(?:\s|$)", translated_message)
 
             patched_sentences = []
@@ -828,7 +1408,7 @@ class Kijiku:
 
                 Kijiku.translated_text.append(sentence + '\n')
 
-            for i in range(len(Kijiku.translated_text)):
+            for i in range(first_new_line, len(Kijiku.translated_text)):
                 if Kijiku.translated_text[i] in patched_sentences:
                     index = patched_sentences.index(Kijiku.translated_text[i])
                     Kijiku.translated_text[i] = patched_sentences[index]
@@ -838,11 +1418,178 @@ class Kijiku:
         elif(Kijiku.sentence_fragmenter_mode == 2 or Kijiku.sentence_fragmenter_mode == 3): 
             
             Kijiku.translated_text.append(translated_message + '\n\n')
+
+##-------------------start-of-format_batch()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def format_batch(translation_prompt:dict, translated_message:str) -> typing.Tuple[typing.List[str], typing.List[str]]:
+
+        """
+
+        Redistributes a single batch and returns the lines it added, for OrderedOutputWriter to append to the output files.
+        Must be called in batch order.
+
+        Parameters:
+        translation_prompt (dict) : the user message also known as the prompt.
+        translated_message (string) : the translated message.
+
+        Returns:
+        translated_lines (list - str) : the lines the batch added to the translated text.
+        je_check_lines (list - str) : the lines the batch added to the je check text, already paired if the je check mode is 2.
+
+        """
+
+        ## a batch gets its offsets recorded below, so the number recorded so far is its position in the run
+        if(Kijiku.line_deduplication_mode == 2):
+            translation_prompt, translated_message = Kijiku.expand_batch(Kijiku.batch_layouts[len(Kijiku.batch_output_offsets)], translation_prompt, translated_message)
+
+        num_translated_lines = len(Kijiku.translated_text)
+        num_je_check_lines = len(Kijiku.je_check_text)
+
+        Kijiku.batch_output_offsets.append((num_translated_lines, num_je_check_lines))
+
+        Kijiku.redistribute(translation_prompt, translated_message)
+
+        translated_lines = Kijiku.translated_text[num_translated_lines:]
+        je_check_lines = Kijiku.je_check_text[num_je_check_lines:]
+
+        ## fix_je() pairs each prompt with its own translation, so a single batch can be fixed on its own
+        if(Kijiku.je_check_mode == 2):
+            je_check_lines = Kijiku.fix_je(je_check_lines)
+
+        return translated_lines, je_check_lines
         
+##-------------------start-of-expand_batch()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def expand_batch(layout:typing.List[typing.Tuple[str, bool]], translation_prompt:dict, translated_message:str) -> typing.Tuple[dict, str]:
+
+        """
+
+        Puts the repeated lines line_deduplication_mode 2 left out of a batch back in, along with the translation of their first occurrence, so the output and the je check text cover every line.
+        Must be called in batch order, as a repeat's translation can come from an earlier batch.
+
+        Parameters:
+        layout (list - tuple - str, bool) : the batch's lines, and whether each is in the prompt.
+        translation_prompt (dict) : the user message also known as the prompt.
+        translated_message (string) : the translated message.
+
+        Returns:
+        translation_prompt (dict) : the prompt with the repeated lines put back.
+        translated_message (string) : the translated message with the repeated lines' translations put back.
+
+        """
+
+        prompt_lines = [sentence for sentence, is_in_prompt in layout if is_in_prompt and sentence.strip()]
+        translated_lines = [line for line in translated_message.split('\n') if line.strip()]
+
+        ## same as fix_je(), a translation that kept the line count pairs up line for line, otherwise only the lines the aligner trusts are kept
+        if(len(prompt_lines) == len(translated_lines)):
+            aligned_lines:typing.List[typing.Optional[str]] = list(translated_lines)
+
+        else:
+            aligned_lines = LineAligner.align(prompt_lines, translated_lines)
+
+        ## which translated line each prompt line ends at, so the repeats after it can be put in after that line
+        anchors:typing.List[typing.Optional[int]] = []
+        anchor = -1
+
+        for aligned_line in aligned_lines:
+
+            if(aligned_line is not None and aligned_line in translated_lines[anchor + 1:]):
+                anchor = translated_lines.index(aligned_line, anchor + 1)
+                anchors.append(anchor)
+
+            else:
+                anchors.append(None)
+
+        ## an unaligned line's translation is somewhere before the next aligned line's, so its repeats go in right before that
+        next_anchor = len(translated_lines) - 1
+
+        for i in reversed(range(len(anchors))):
+
+            if(anchors[i] is None):
+                anchors[i] = next_anchor
+
+            else:
+                next_anchor = anchors[i] - 1 # type: ignore | set on the line above
+
+        for prompt_line, aligned_line in zip(prompt_lines, aligned_lines):
+            if(aligned_line is not None and prompt_line not in Kijiku.line_translations):
+                Kijiku.line_translations[prompt_line] = aligned_line
+
+        if(all(is_in_prompt for _, is_in_prompt in layout)):
+            return translation_prompt, translated_message
+
+        ## the repeats to put in after each translated line, -1 being before the first
+        repeats_after:typing.Dict[int, typing.List[str]] = {}
+        anchor = -1
+        num_prompt_lines_seen = 0
+
+        for sentence, is_in_prompt in layout:
+
+            if(is_in_prompt):
+
+                if(sentence.strip()):
+                    anchor = anchors[num_prompt_lines_seen]
+                    num_prompt_lines_seen += 1
+
+                continue
+
+            if(sentence not in Kijiku.line_translations):
+                Logger.log_error(f"No translation to reuse for the repeated line \"{sentence}\", as its first occurrence was malformed, leaving it untranslated...")
+
+            repeats_after.setdefault(anchor, []).append(Kijiku.line_translations.get(sentence, sentence))
+
+        expanded_lines = repeats_after.get(-1, [])
+
+        for i, translated_line in enumerate(translated_lines):
+            expanded_lines.append(translated_line)
+            expanded_lines.extend(repeats_after.get(i, []))
+
+        expanded_prompt = ModelTranslationMessage(role="user", content=''.join(sentence + '\n' for sentence, _ in layout))
+
+        return expanded_prompt, '\n'.join(expanded_lines)
+
+##-------------------start-of-split_results_by_file()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def split_results_by_file() -> typing.List[typing.Tuple[str, typing.List[str], typing.List[str]]]:
+
+        """
+
+        Splits the run's translated text and je check text back up into the files they came from.
+        Must be called after every batch has been redistributed, and before the je check text is paired by fix_je().
+
+        Returns:
+        file_results (list - tuple - str, list - str, list - str) : the file name, translated lines and je check lines of each file.
+
+        """
+
+        file_results = []
+
+        ## the end of the run stands in for the start of the file after the last one
+        offsets = Kijiku.batch_output_offsets + [(len(Kijiku.translated_text), len(Kijiku.je_check_text))]
+        boundaries = Kijiku.file_batch_boundaries + [("", len(Kijiku.translation_batches))]
+
+        for (file_name, first_message_index), (_, next_first_message_index) in zip(boundaries, boundaries[1:]):
+
+            translated_start, je_check_start = offsets[first_message_index // 2]
+            translated_end, je_check_end = offsets[next_first_message_index // 2]
+
+            je_check_lines = Kijiku.je_check_text[je_check_start:je_check_end]
+
+            if(Kijiku.je_check_mode == 2):
+                je_check_lines = Kijiku.fix_je(je_check_lines)
+
+            file_results.append((file_name, Kijiku.translated_text[translated_start:translated_end], je_check_lines))
+
+        return file_results
+
 ##-------------------start-of-fix_je()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    def fix_je() -> typing.List[str]:
+    def fix_je(je_check_text:typing.List[str]) -> typing.List[str]:
 
         """
 
@@ -850,6 +1597,9 @@ class Kijiku:
 
         Note that fix_je() is not always accurate, and may use standard j-e formatting instead of the corrected formatting.
 
+        Parameters:
+        je_check_text (list - str) : the J->E text, alternating between the prompts and their translations.
+
         Returns:
         final_list (list - str) : the 'fixed' J->E text.
 
@@ -858,9 +1608,9 @@ class Kijiku:
         i = 1
         final_list = []
 
-        while i < len(Kijiku.je_check_text):
-            jap = Kijiku.je_check_text[i-1].split('\n')
-            eng = Kijiku.je_check_text[i].split('\n')
+        while i < len(je_check_text):
+            jap = je_check_text[i-1].split('\n')
+            eng = je_check_text[i].split('\n')
 
             jap = [line for line in jap if line.strip()]  ## Remove blank lines
             eng = [line for line in eng if line.strip()]  ## Remove blank lines    
@@ -879,8 +1629,8 @@ class Kijiku:
 
             else:
 
-                final_list.append(Kijiku.je_check_text[i-1] + '\n\n')
-                final_list.append(Kijiku.je_check_text[i] + '\n\n')
+                final_list.append(je_check_text[i-1] + '\n\n')
+                final_list.append(je_check_text[i] + '\n\n')
 
                 final_list.append("--------------------------------------------------\n")
 
@@ -905,10 +1655,29 @@ class Kijiku:
 
         Kijiku.translation_print_result += "Time Elapsed : " + Toolkit.get_elapsed_time(time_start, time_end)
         Kijiku.translation_print_result += "\nNumber of malformed batches : " + str(Kijiku.num_occurred_malformed_batches)
+        Kijiku.translation_print_result += "\nNumber of batches served from the response cache : " + str(Kijiku.num_cached_batches)
+        Kijiku.translation_print_result += "\nNumber of batches restored from the checkpoint journal : " + str(Kijiku.num_restored_batches)
+        Kijiku.translation_print_result += "\nNumber of malformed batches repaired : " + str(Kijiku.num_repaired_batches) + " (" + str(Kijiku.num_rerequested_lines) + " lines re-requested)"
+        if(Kijiku.line_deduplication_mode == 2):
+            Kijiku.translation_print_result += "\n" + Kijiku.get_deduplication_summary()
+
+        Kijiku.translation_print_result += "\nFinal concurrency limit : " + str(Kijiku._concurrency_limiter.limit) + " of " + str(Kijiku._concurrency_limiter.max_limit)
+
+        Kijiku.translation_print_result += "\nNumber of responses aborted while streaming : " + str(Kijiku.num_aborted_streams)
+
+        if(OpenAIService.num_streamed_requests > 0):
+            Kijiku.translation_print_result += "\nAverage time to first token : " + str(round(OpenAIService.total_time_to_first_token / OpenAIService.num_streamed_requests, 2)) + " seconds"
+            Kijiku.translation_print_result += "\nAverage generation speed : " + str(round(OpenAIService.total_streamed_tokens / max(OpenAIService.total_streaming_time, 0.001), 1)) + " tokens per second"
+
+        if(OpenAIService.rate_limiter is not None):
+            Kijiku.translation_print_result += "\nTime spent waiting on the rate limits : " + str(round(OpenAIService.rate_limiter.total_wait_time, 2)) + " seconds"
 
         Kijiku.translation_print_result += "\n\nDebug text have been written to : " + FileEnsurer.debug_log_path
         Kijiku.translation_print_result += "\nJ->E text have been written to : " + FileEnsurer.je_check_path
         Kijiku.translation_print_result += "\nTranslated text has been written to : " + FileEnsurer.translated_text_path
+
+        if(len(Kijiku.input_files) > 0):
+            Kijiku.translation_print_result += "\nEach file's own results have been written to : " + os.path.join(FileEnsurer.output_dir, "<file name>")
         Kijiku.translation_print_result += "\nErrors have been written to : " + FileEnsurer.error_log_path + "\n"
 
 ##-------------------start-of-write_kijiku_results()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -935,6 +1704,10 @@ class Kijiku:
         with open(FileEnsurer.translated_text_path, 'w', encoding='utf-8') as file:
             file.writelines(Kijiku.translated_text)
 
+        ## a run over several files also gets each file's own output, next to the combined output above
+        for file_name, translated_lines, je_check_lines in Kijiku.file_results:
+            FileEnsurer.write_file_results(file_name, [('translated_text', translated_lines), ('je_check_text', je_check_lines)])
+
         ## Instructions to create a copy of the output for archival
         FileEnsurer.standard_create_directory(FileEnsurer.archive_dir)
 
@@ -949,5 +1722,12 @@ class Kijiku:
                                  ('kijiku_error_log', Kijiku.error_text),
                                  ('debug_log', FileEnsurer.standard_read_file(Logger.log_file_path))]
 
+        for file_name, translated_lines, je_check_lines in Kijiku.file_results:
+            list_of_result_tuples.append((os.path.splitext(file_name)[0] + '_kijiku_translated_text', translated_lines))
+            list_of_result_tuples.append((os.path.splitext(file_name)[0] + '_kijiku_je_check_text', je_check_lines))
+
         FileEnsurer.archive_results(list_of_result_tuples, 
                                     module='kijiku', timestamp=timestamp)
+
+        ## results are safely on disk, so there is nothing left to resume
+        CheckpointJournal.discard()
@@ -0,0 +1,219 @@
+## built-in libraries
+import asyncio
+import time
+import typing
+
+## custom modules
+from modules.common.logger import Logger
+
+##-------------------start-of-AdaptiveConcurrencyLimiter--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class AdaptiveConcurrencyLimiter:
+
+    """
+
+    AdaptiveConcurrencyLimiter is a drop-in replacement for an asyncio.Semaphore whose limit moves with how the API is coping (AIMD).
+    It starts low and doubles the limit every time a full limit's worth of requests succeed (slow start), then grows by one per limit's worth once it has been cut back before.
+    A rate limit error, or a request taking much longer for its size than the fastest requests seen so far, halves the limit. The configured limit is never exceeded.
+    Latency is compared per unit of request size (tokens for Kijiku, characters for Kaiseki), so a big batch after a run of small ones doesn't read as congestion.
+
+    """
+
+    ## a request this many times slower than the baseline counts as congestion
+    latency_tolerance = 2.0
+
+    ## how strongly a new latency sample moves the smoothed latency
+    latency_smoothing = 0.2
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self, max_limit:int, initial_limit:int = 4, size_unit:str = "token") -> None:
+
+        """
+
+        Parameters:
+        max_limit (int) : the most requests that may ever be in flight at once, i.e. num_concurrent_batches.
+        initial_limit (int) : the limit to start slow start from.
+        size_unit (str) : what a request's size is counted in, for the log.
+
+        """
+
+        self.max_limit = max(1, max_limit)
+        self.limit = max(1, min(initial_limit, self.max_limit))
+
+        ## slow start doubles the limit until it reaches this, after that the limit only grows by one at a time
+        self.slow_start_threshold = self.max_limit
+
+        self.num_in_flight = 0
+        self.num_successes_since_change = 0
+
+        self.size_unit = size_unit
+
+        ## seconds per unit of request size
+        self.smoothed_latency:typing.Optional[float] = None
+        self.baseline_latency:typing.Optional[float] = None
+
+        ## seconds per request, only used to space out decreases
+        self.request_latency:typing.Optional[float] = None
+
+        self.last_decrease_time = 0.0
+
+        self._condition = asyncio.Condition()
+
+##-------------------start-of-format_limit()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def format_limit(self) -> str:
+
+        """
+
+        Returns:
+        limit_status (str) : the current limit and the ceiling, i.e. "limit 8/16", for progress output.
+
+        """
+
+        return f"limit {self.limit}/{self.max_limit}"
+
+##-------------------start-of-__aenter__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    async def __aenter__(self) -> "AdaptiveConcurrencyLimiter":
+
+        """
+
+        Waits for a free slot under the current limit.
+
+        """
+
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.num_in_flight < self.limit)
+            self.num_in_flight += 1
+
+        return self
+
+##-------------------start-of-__aexit__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    async def __aexit__(self, *args) -> None:
+
+        """
+
+        Frees the slot.
+
+        """
+
+        async with self._condition:
+            self.num_in_flight -= 1
+            self._condition.notify_all()
+
+##-------------------start-of-record_success()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    async def record_success(self, latency:float, request_size:int) -> None:
+
+        """
+
+        Records a successful request, growing the limit if requests are succeeding at a stable latency.
+
+        Parameters:
+        latency (float) : how long the request took in seconds.
+        request_size (int) : how big the request was, in size_unit (i.e. its prompt and completion tokens).
+
+        """
+
+        unit_latency = latency / max(1, request_size)
+
+        if(self.smoothed_latency is None or self.request_latency is None):
+            self.smoothed_latency = unit_latency
+            self.request_latency = latency
+
+        else:
+            self.smoothed_latency += self.latency_smoothing * (unit_latency - self.smoothed_latency)
+            self.request_latency += self.latency_smoothing * (latency - self.request_latency)
+
+        ## the baseline is the best the api has done, it only creeps up so a permanently slower api doesn't read as congestion forever
+        if(self.baseline_latency is None or self.smoothed_latency < self.baseline_latency):
+            self.baseline_latency = self.smoothed_latency
+
+        else:
+            self.baseline_latency *= 1.01
+
+        if(self.smoothed_latency > self.baseline_latency * self.latency_tolerance):
+            self.decrease(f"latency rose to {round(self.smoothed_latency * 1000, 2)}ms per {self.size_unit} from a baseline of {round(self.baseline_latency * 1000, 2)}ms")
+            return
+
+        self.num_successes_since_change += 1
+
+        if(self.num_successes_since_change < self.limit or self.limit >= self.max_limit):
+            return
+
+        if(self.limit < self.slow_start_threshold):
+            new_limit = min(self.limit * 2, self.slow_start_threshold, self.max_limit)
+
+        else:
+            new_limit = min(self.limit + 1, self.max_limit)
+
+        self.set_limit(new_limit, "requests are succeeding")
+
+        ## a higher limit can let waiting requests start
+        async with self._condition:
+            self._condition.notify_all()
+
+##-------------------start-of-record_rate_limit()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def record_rate_limit(self) -> None:
+
+        """
+
+        Records a rate limit error, halving the limit.
+        Synchronous so it can be called from the backoff decorator's on_backoff handler.
+
+        """
+
+        self.decrease("rate limited")
+
+##-------------------start-of-decrease()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def decrease(self, reason:str) -> None:
+
+        """
+
+        Halves the limit. Only done once per typical request latency, as a burst of errors from one round of requests is a single signal.
+
+        Parameters:
+        reason (str) : why the limit is being cut, for the log.
+
+        """
+
+        cooldown = max(1.0, self.request_latency or 0.0)
+
+        if(time.time() - self.last_decrease_time < cooldown):
+            return
+
+        self.last_decrease_time = time.time()
+
+        self.slow_start_threshold = max(1, self.limit // 2)
+
+        ## the latency that caused the cut shouldn't immediately cause another
+        self.smoothed_latency = self.baseline_latency
+
+        self.set_limit(self.slow_start_threshold, reason)
+
+##-------------------start-of-set_limit()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def set_limit(self, new_limit:int, reason:str) -> None:
+
+        """
+
+        Changes the limit. Requests already in flight are left alone, a lower limit just stops new ones from starting.
+
+        Parameters:
+        new_limit (int) : the new limit.
+        reason (str) : why the limit changed, for the log.
+
+        """
+
+        self.num_successes_since_change = 0
+
+        if(new_limit == self.limit):
+            return
+
+        Logger.log_action(f"Concurrency limit {self.limit} -> {new_limit} ({reason}).", output=True)
+
+        self.limit = new_limit
@@ -0,0 +1,123 @@
+## built-in libraries
+import hashlib
+import json
+import os
+import threading
+import time
+
+## custom modules
+from modules.common.file_ensurer import FileEnsurer
+
+##-------------------start-of-ApiKeyValidations--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class ApiKeyValidations:
+
+    """
+
+    ApiKeyValidations remembers when each API key was last confirmed to work, so Kijiku and Kaiseki don't spend a request testing a saved key every run.
+    Keys are stored as hashes, never as the keys themselves, and a validation expires after validation_ttl seconds so a revoked key is noticed again eventually.
+    Shared between all translation jobs, as a key's validity doesn't depend on the job.
+
+    """
+
+    ## a day
+    validation_ttl = 86400
+
+    ## the webgui validates keys from worker threads
+    _lock = threading.Lock()
+
+##-------------------start-of-get_key_hash()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_key_hash(service:str, api_key:str) -> str:
+
+        """
+
+        Parameters:
+        service (str) : the service the key is for, i.e. "openai" or "deepl".
+        api_key (str) : the key.
+
+        Returns:
+        key_hash (str) : the hash the key's validation is stored under.
+
+        """
+
+        return hashlib.sha256((service + ":" + api_key).encode('utf-8')).hexdigest()
+
+##-------------------start-of-load_validations()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def load_validations() -> dict:
+
+        """
+
+        Returns:
+        validations (dict) : key hash -> when the key was last confirmed to work, empty if there are none or the file is unreadable.
+
+        """
+
+        if(not os.path.exists(FileEnsurer.api_key_validations_path)):
+            return {}
+
+        try:
+
+            with open(FileEnsurer.api_key_validations_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+
+        except (OSError, ValueError):
+            return {}
+
+##-------------------start-of-is_validated()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def is_validated(service:str, api_key:str) -> bool:
+
+        """
+
+        Parameters:
+        service (str) : the service the key is for, i.e. "openai" or "deepl".
+        api_key (str) : the key.
+
+        Returns:
+        is_validated (bool) : whether the key was confirmed to work within the last validation_ttl seconds.
+
+        """
+
+        with ApiKeyValidations._lock:
+            validated_at = ApiKeyValidations.load_validations().get(ApiKeyValidations.get_key_hash(service, api_key), 0)
+
+        return time.time() - validated_at < ApiKeyValidations.validation_ttl
+
+##-------------------start-of-record_validation()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def record_validation(service:str, api_key:str) -> None:
+
+        """
+
+        Records that a key was just confirmed to work, dropping any expired validations along the way.
+
+        Parameters:
+        service (str) : the service the key is for, i.e. "openai" or "deepl".
+        api_key (str) : the key.
+
+        """
+
+        with ApiKeyValidations._lock:
+
+            now = time.time()
+
+            validations = {key_hash: validated_at for key_hash, validated_at in ApiKeyValidations.load_validations().items() if now - validated_at < ApiKeyValidations.validation_ttl}
+
+            validations[ApiKeyValidations.get_key_hash(service, api_key)] = now
+
+            try:
+
+                os.makedirs(FileEnsurer.secrets_dir, exist_ok=True)
+
+                with open(FileEnsurer.api_key_validations_path, 'w', encoding='utf-8') as file:
+                    json.dump(validations, file)
+
+            ## not being able to remember the validation only means testing the key again next time
+            except OSError:
+                pass
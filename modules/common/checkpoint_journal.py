@@ -0,0 +1,196 @@
+## built-in libraries
+import os
+import json
+import hashlib
+import typing
+import asyncio
+import threading
+
+## custom modules
+from modules.common.translation_job import JobScoped
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.logger import Logger
+
+from custom_classes.messages import SystemTranslationMessage, ModelTranslationMessage
+
+##-------------------start-of-CheckpointJournal--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class CheckpointJournal(metaclass=JobScoped):
+
+    """
+
+    CheckpointJournal is an append-only journal of the Kijiku batches that have finished translating.
+    Every batch is written to disk and fsynced the moment it completes, so a crash, Ctrl-C or webgui clear never loses work that was already paid for. The write and fsync happen on a worker thread so they never block the event loop.
+    A resumed run reads the journal back and only sends the batches that are missing from it.
+
+    """
+
+    _journal_file:typing.Optional[typing.TextIO] = None
+
+    ## batches finish together, so their worker threads take turns appending, and close() waits for the one writing
+    _write_lock:typing.Optional[threading.Lock] = None
+
+##-------------------start-of-generate_prompt_hash()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def generate_prompt_hash(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage) -> str:
+
+        """
+
+        Generates the hash used to check that a journaled batch is the same batch as the one being rebuilt.
+
+        Parameters:
+        translation_instructions (object - SystemTranslationMessage | ModelTranslationMessage) : The system message also known as the instructions.
+        translation_prompt (object - ModelTranslationMessage) : The user message also known as the prompt.
+
+        Returns:
+        prompt_hash (str) : the sha256 hex digest of the batch's messages.
+
+        """
+
+        serialized_messages = json.dumps([dict(translation_instructions), dict(translation_prompt)], sort_keys=True, ensure_ascii=False)
+
+        return hashlib.sha256(serialized_messages.encode('utf-8')).hexdigest()
+
+##-------------------start-of-load()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def load() -> typing.Dict[int, typing.Tuple[str, str]]:
+
+        """
+
+        Reads the journal left by a previous run.
+        A line that was only partially written when the previous run died is skipped, and if a batch was journaled more than once the last entry wins.
+
+        Returns:
+        journaled_batches (dict - int, tuple - str, str) : the batch index mapped to the prompt hash and the translated message.
+
+        """
+
+        journaled_batches = {}
+
+        if(not os.path.exists(FileEnsurer.kijiku_journal_path)):
+            return journaled_batches
+
+        with open(FileEnsurer.kijiku_journal_path, 'r', encoding='utf-8') as file:
+
+            for line in file:
+
+                try:
+                    entry = json.loads(line)
+                    journaled_batches[int(entry["index"])] = (entry["prompt_hash"], entry["translated_message"])
+
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    Logger.log_action("Skipping incomplete journal entry : " + line.strip())
+
+        return journaled_batches
+
+##-------------------start-of-start()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def start(is_resuming:bool) -> None:
+
+        """
+
+        Opens the journal for writing.
+
+        Parameters:
+        is_resuming (bool) : whether to keep the existing entries (resuming) or start a fresh journal.
+
+        """
+
+        CheckpointJournal.close()
+
+        FileEnsurer.standard_create_directory(FileEnsurer.output_dir)
+
+        CheckpointJournal._journal_file = open(FileEnsurer.kijiku_journal_path, 'a' if is_resuming else 'w', encoding='utf-8')
+        CheckpointJournal._write_lock = threading.Lock()
+
+##-------------------start-of-record()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def record(index:int, prompt_hash:str, translated_message:str) -> None:
+
+        """
+
+        Appends a finished batch to the journal and forces it to disk, returning once it is there.
+
+        Parameters:
+        index (int) : the index of the batch in Kijiku.translation_batches.
+        prompt_hash (str) : the hash of the batch's messages, see generate_prompt_hash().
+        translated_message (str) : the translated message.
+
+        """
+
+        if(CheckpointJournal._journal_file is None or CheckpointJournal._write_lock is None):
+            return
+
+        entry = json.dumps({"index": index, "prompt_hash": prompt_hash, "translated_message": translated_message}, ensure_ascii=False)
+
+        await asyncio.to_thread(CheckpointJournal._append_entry, CheckpointJournal._journal_file, CheckpointJournal._write_lock, entry)
+
+##-------------------start-of-_append_entry()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _append_entry(journal_file:typing.TextIO, write_lock:threading.Lock, entry:str) -> None:
+
+        """
+
+        Writes an entry to the journal and fsyncs it, run on a worker thread.
+
+        Parameters:
+        journal_file (object - TextIO) : the open journal.
+        write_lock (object - threading.Lock) : the journal's lock.
+        entry (str) : the serialized entry.
+
+        """
+
+        with write_lock:
+
+            ## the run was stopped while this entry waited its turn
+            if(journal_file.closed):
+                return
+
+            journal_file.write(entry + "\n")
+            journal_file.flush()
+
+            os.fsync(journal_file.fileno())
+
+##-------------------start-of-close()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def close() -> None:
+
+        """
+
+        Closes the journal, if it is open.
+
+        """
+
+        if(CheckpointJournal._journal_file is not None):
+
+            if(CheckpointJournal._write_lock is not None):
+                with CheckpointJournal._write_lock:
+                    CheckpointJournal._journal_file.close()
+
+            else:
+                CheckpointJournal._journal_file.close()
+
+            CheckpointJournal._journal_file = None
+            CheckpointJournal._write_lock = None
+
+##-------------------start-of-discard()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def discard() -> None:
+
+        """
+
+        Closes and deletes the journal, done once a run's results have been written out and there is nothing left to resume.
+
+        """
+
+        CheckpointJournal.close()
+
+        if(os.path.exists(FileEnsurer.kijiku_journal_path)):
+            os.remove(FileEnsurer.kijiku_journal_path)
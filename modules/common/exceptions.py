@@ -2,7 +2,7 @@
 
 ## for importing, other scripts will use from common.exceptions instead of from the third-party libraries themselves
 from openai import AuthenticationError, InternalServerError, RateLimitError, APIError, APIConnectionError, APITimeoutError
-from deepl.exceptions import AuthorizationException, QuotaExceededException
+from deepl.exceptions import AuthorizationException, QuotaExceededException, TooManyRequestsException, ConnectionException
 
 ##-------------------start-of-MaxBatchDurationExceededException--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -16,6 +16,29 @@ class MaxBatchDurationExceededException(Exception):
 
     pass
 
+##-------------------start-of-StreamAbortedException--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class StreamAbortedException(Exception):
+
+    """
+
+    StreamAbortedException is an exception that is raised when a streamed translation is cut off early because it is clearly malformed or running away.
+
+    """
+
+    def __init__(self, reason:str) -> None:
+
+        """
+
+        Parameters:
+        reason (string) : Why the stream was aborted.
+
+        """
+
+        self.message = f"Stream aborted, {reason}."
+
+        super().__init__(self.message)
+
 ##-------------------start-of-InvalidAPIKeyException--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
 class InvalidAPIKeyException(Exception):
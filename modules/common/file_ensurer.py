@@ -5,10 +5,11 @@ import json
 import typing
 
 ## custom modules
+from modules.common.translation_job import JobScoped
 from modules.common.decorators import permission_error_decorator
 from modules.common.logger import Logger
 
-class FileEnsurer():
+class FileEnsurer(metaclass=JobScoped):
 
     """
     
@@ -23,6 +24,9 @@ class FileEnsurer():
     output_dir = os.path.join(script_dir, "output")
     archive_dir = os.path.join(output_dir, "archive")
 
+    ## kairyou's results by a hash of their inputs, so preprocessing and indexing the same text again can be skipped, see StageCache
+    stage_cache_dir = os.path.join(script_dir, "stage_cache")
+
     ## main dirs (config is just under userprofile on windows, and under home on linux); secrets are under appdata on windows, and under .config on linux
     if(os.name == 'nt'):  ## Windows
         config_dir = os.path.join(os.environ['USERPROFILE'],"KudasaiConfig")
@@ -51,15 +55,35 @@ class FileEnsurer():
     kairyou_log_path = os.path.join(output_dir, "preprocessing_results.txt")  ## path for kairyou log (the results of preprocessing)
     error_log_path = os.path.join(output_dir, "error_log.txt") ## path for the error log (errors generated by the preprocessing and translation modules)
     debug_log_path = Logger.log_file_path ## path for the debug log (debug info generated by the preprocessing and translation modules)
+
+    kijiku_journal_path = os.path.join(output_dir, "kijiku_journal.jsonl") ## path for the kijiku checkpoint journal (batches that have finished translating, used to resume interrupted runs)
  
     ## kijiku rules
     external_kijiku_rules_path = os.path.join(script_dir,'kijiku_rules.json')
     config_kijiku_rules_path = os.path.join(config_dir,'kijiku_rules.json')
 
+    ## kijiku response cache
+    kijiku_response_cache_path = os.path.join(config_dir, "kijiku_response_cache.db")
+
+    ## kaiseki fragment cache
+    kaiseki_fragment_cache_path = os.path.join(config_dir, "kaiseki_fragment_cache.db")
+
+    ## kairyou indexer's knowledge base index, the names found in each knowledge base file
+    knowledge_base_index_path = os.path.join(config_dir, "knowledge_base_index.db")
+
+    ## tokenizer encodings, can be pre-seeded with <encoding name>.tiktoken files for machines without internet access
+    tiktoken_cache_dir = os.path.join(config_dir, "tiktoken_cache")
+
     ## api keys
     deepl_api_key_path = os.path.join(secrets_dir, "deepl_api_key.txt")
     openai_api_key_path = os.path.join(secrets_dir,'openai_api_key.txt')
 
+    ## when each api key was last confirmed to work, by hash, so startup doesn't test them every run
+    api_key_validations_path = os.path.join(secrets_dir, "api_key_validations.json")
+
+    ## the last successful update check
+    update_check_cache_path = os.path.join(config_dir, "update_check.json")
+
     ## favicon
     favicon_path = os.path.join(gui_lib, "Kudasai_Logo.png")
 
@@ -84,7 +108,13 @@ class FileEnsurer():
         "je_check_mode":2,
         "num_malformed_batch_retries":1,
         "batch_retry_timeout":300,
-        "num_concurrent_batches":30
+        "num_concurrent_batches":30,
+        "batch_packing_mode":1,
+        "num_tokens_per_batch":1000,
+        "line_deduplication_mode":1
+    },
+    "rate limit settings":
+    {
     }
     }
 
@@ -105,6 +135,24 @@ class FileEnsurer():
         "gpt-4-0125-preview"
     ]
 
+    ## (context length, max output tokens) for each allowed model, used to keep token-packed batches within the model's limits
+    model_token_limits = {
+        "gpt-3.5-turbo": (16385, 4096),
+        "gpt-4": (8192, 8192),
+        "gpt-4-turbo-preview": (128000, 4096),
+        "gpt-3.5-turbo-0301": (4096, 4096),
+        "gpt-4-0314": (8192, 8192),
+        "gpt-4-32k-0314": (32768, 32768),
+        "gpt-3.5-turbo-0613": (4096, 4096),
+        "gpt-3.5-turbo-0125": (16385, 4096),
+        "gpt-3.5-turbo-16k-0613": (16385, 16385),
+        "gpt-3.5-turbo-1106": (16385, 4096),
+        "gpt-4-0613": (8192, 8192),
+        "gpt-4-32k-0613": (32768, 32768),
+        "gpt-4-1106-preview": (128000, 4096),
+        "gpt-4-0125-preview": (128000, 4096)
+    }
+
     invalid_kijiku_rules_placeholder = {
     "open ai settings": 
     {
@@ -125,16 +173,47 @@ class FileEnsurer():
         "je_check_mode":2,
         "num_malformed_batch_retries":1,
         "batch_retry_timeout":300,
-        "num_concurrent_batches":30
+        "num_concurrent_batches":30,
+        "batch_packing_mode":1,
+        "num_tokens_per_batch":1000,
+        "line_deduplication_mode":1
+    },
+    "rate limit settings":
+    {
     }
     }
 
     ## rules
     blank_rules_path = os.path.join(jsons_dir, "blank_replacements.json")
 
+    ## per job, so a webgui tab's clear button only stops its own translation
     do_interrupt = False
+
     need_to_run_kairyou = True
 
+##-------------------start-of-redirect_run_outputs()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def redirect_run_outputs(directory_path:str) -> None:
+
+        """
+
+        Points the current translation job's output files and checkpoint journal at another directory, so jobs running at the same time don't write over each other.
+        Only has an effect inside a TranslationJob.
+
+        Parameters:
+        directory_path (str) : path to the directory to write the job's outputs to.
+
+        """
+
+        FileEnsurer.standard_create_directory(FileEnsurer.output_dir)
+        FileEnsurer.standard_create_directory(directory_path)
+
+        FileEnsurer.translated_text_path = os.path.join(directory_path, "translated_text.txt")
+        FileEnsurer.je_check_path = os.path.join(directory_path, "je_check_text.txt")
+        FileEnsurer.error_log_path = os.path.join(directory_path, "error_log.txt")
+        FileEnsurer.kijiku_journal_path = os.path.join(directory_path, "kijiku_journal.jsonl")
+
 ##-------------------start-of-setup_needed_files()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -359,6 +438,32 @@ class FileEnsurer():
             with open(result_file_path, "w", encoding="utf-8") as file:
                 file.writelines(content)
 
+##-------------------start-of-write_file_results()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    @permission_error_decorator()
+    def write_file_results(input_file_name:str, list_of_result_tuples:typing.List[typing.Tuple[str,typing.Union[str, typing.List[str]]]]) -> None:
+
+        """
+
+        Writes the results for one file of a run over several files, to a directory in the output folder named after the file.
+
+        Parameters:
+        input_file_name (str) : name of the input file the results are for.
+        list_of_result_tuples (list - tuple - str, str | list - str) : list of tuples containing the filename and content of the results to be written.
+
+        """
+
+        file_output_dir = os.path.join(FileEnsurer.output_dir, os.path.splitext(input_file_name)[0])
+
+        FileEnsurer.standard_create_directory(FileEnsurer.output_dir)
+        FileEnsurer.standard_create_directory(file_output_dir)
+
+        for (filename, content) in list_of_result_tuples:
+
+            with open(os.path.join(file_output_dir, f'{filename}.txt'), "w", encoding="utf-8") as file:
+                file.writelines(content)
+
 ##-------------------start-of-standard_read_json()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
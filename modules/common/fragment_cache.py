@@ -0,0 +1,127 @@
+## built-in libraries
+import time
+import typing
+
+## custom modules
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.sqlite_cache import SQLiteCache
+
+##-------------------start-of-FragmentCache--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class FragmentCache(SQLiteCache):
+
+    """
+
+    FragmentCache is a persistent cache of the sentence fragments Kaiseki has had DeepL translate, keyed by the fragment and its source and target language.
+    Light novels repeat short fragments (「はい」, 「え？」, 「……なるほど」) constantly, so every repeat served from here is a fragment DeepL doesn't have to translate or count against the quota.
+    Fragments are looked up and stored a request's worth at a time, so the cache costs a couple of queries per request rather than per fragment. Everything else is shared with the response cache, see SQLiteCache.
+
+    """
+
+    ## fragments are short, 32 MB holds a few hundred thousand of them
+    max_size_bytes = 32 * 1024 * 1024
+
+    cache_name = "Fragment cache"
+    entry_name = "fragments"
+
+    table_name = "fragments"
+
+    table_columns = "source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, fragment TEXT NOT NULL, translation TEXT NOT NULL, size INTEGER NOT NULL, last_accessed REAL NOT NULL"
+    key_columns = ("source_lang", "target_lang", "fragment")
+
+##-------------------start-of-get_database_path()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def get_database_path(cls) -> str:
+
+        """
+
+        Returns:
+        database_path (str) : the path to the fragment cache's database.
+
+        """
+
+        return FileEnsurer.kaiseki_fragment_cache_path
+
+##-------------------start-of-get_many()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_many(fragments:typing.List[str], source_lang:str, target_lang:str) -> typing.Dict[str, str]:
+
+        """
+
+        Fetches the cached translations of fragments, marking them as recently used.
+
+        Parameters:
+        fragments (list - str) : the fragments to look up, without duplicates.
+        source_lang (str) : the language the fragments are in.
+        target_lang (str) : the language they were translated to.
+
+        Returns:
+        translations (dict - str, str) : the translation of each fragment that was cached, empty if the cache is disabled.
+
+        """
+
+        if(not FragmentCache.is_enabled or len(fragments) == 0):
+            return {}
+
+        translations = {}
+
+        with FragmentCache._lock:
+
+            connection = FragmentCache.get_connection()
+
+            ## sqlite caps the number of parameters in a query, so the lookup is split up
+            for start in range(0, len(fragments), 500):
+
+                fragment_chunk = fragments[start:start + 500]
+
+                placeholders = ",".join("?" * len(fragment_chunk))
+
+                translations.update(connection.execute(f"SELECT fragment, translation FROM fragments WHERE source_lang = ? AND target_lang = ? AND fragment IN ({placeholders})", (source_lang, target_lang, *fragment_chunk)).fetchall())
+
+            if(len(translations) > 0):
+                connection.executemany("UPDATE fragments SET last_accessed = ? WHERE source_lang = ? AND target_lang = ? AND fragment = ?", [(time.time(), source_lang, target_lang, fragment) for fragment in translations])
+                connection.commit()
+
+            FragmentCache.num_hits += len(translations)
+            FragmentCache.num_misses += len(fragments) - len(translations)
+
+        return translations
+
+##-------------------start-of-put_many()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def put_many(translations:typing.Dict[str, str], source_lang:str, target_lang:str) -> None:
+
+        """
+
+        Stores translated fragments, then evicts the least recently used fragments if the cache is over its size cap.
+
+        Parameters:
+        translations (dict - str, str) : the translation of each fragment.
+        source_lang (str) : the language the fragments are in.
+        target_lang (str) : the language they were translated to.
+
+        """
+
+        if(not FragmentCache.is_enabled or len(translations) == 0):
+            return
+
+        timestamp = time.time()
+
+        with FragmentCache._lock:
+
+            connection = FragmentCache.get_connection()
+
+            for fragment, translation in translations.items():
+
+                size = len(fragment.encode('utf-8')) + len(translation.encode('utf-8'))
+
+                ## a fragment already cached keeps its entry, so the size is only counted for new ones
+                if(connection.execute("INSERT OR IGNORE INTO fragments (source_lang, target_lang, fragment, translation, size, last_accessed) VALUES (?, ?, ?, ?, ?, ?)", (source_lang, target_lang, fragment, translation, size, timestamp)).rowcount > 0):
+                    FragmentCache._total_size += size
+
+            connection.commit()
+
+            FragmentCache.evict_least_recently_used()
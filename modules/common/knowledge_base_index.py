@@ -0,0 +1,368 @@
+## built-in libraries
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+## custom modules
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.logger import Logger
+from modules.common.toolkit import Toolkit
+
+if(typing.TYPE_CHECKING):
+    from kairyou.types import NameAndOccurrence
+
+##-------------------start-of-KnowledgeBaseIndex--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class KnowledgeBaseIndex:
+
+    """
+
+    KnowledgeBaseIndex keeps the names the Kairyou Indexer finds in each knowledge base file, so a knowledge base only has to be run through the NER model once rather than on every index.
+    Files are indexed by a hash of their contents, with each path's modification time and size remembered so unchanged files aren't even read again, so adding a chapter to a knowledge base directory only costs that chapter.
+    index() then runs the Indexer on the text alone and leaves out the names the knowledge base already has, which flags the same names as giving the Indexer the whole knowledge base.
+    Like the response cache it is an SQLite database under KudasaiConfig, shared between runs and webgui sessions.
+
+    """
+
+    ## the least recently used files are dropped past this, a file's names are small so this is a lot of series
+    max_files = 20000
+
+    _connection:typing.Optional[sqlite3.Connection] = None
+
+    ## the webgui indexes from worker threads, so all access goes through this lock
+    _lock = threading.Lock()
+
+##-------------------start-of-get_connection()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_connection() -> sqlite3.Connection:
+
+        """
+
+        Returns the connection to the index database, creating the database and its tables if needed.
+        If the NER model or Kairyou changed since the files were indexed, the indexed names are thrown out, as the new model may find different ones.
+
+        Returns:
+        connection (object - sqlite3.Connection) : the connection to the index database.
+
+        """
+
+        if(KnowledgeBaseIndex._connection is None):
+
+            FileEnsurer.standard_create_directory(FileEnsurer.config_dir)
+
+            connection = sqlite3.connect(FileEnsurer.knowledge_base_index_path, check_same_thread=False)
+
+            connection.execute("CREATE TABLE IF NOT EXISTS files (content_hash TEXT PRIMARY KEY, names TEXT NOT NULL, last_used REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS paths (path TEXT PRIMARY KEY, modified_time INTEGER NOT NULL, size INTEGER NOT NULL, content_hash TEXT NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+            model_version = KnowledgeBaseIndex.get_model_version()
+
+            indexed_model_version = connection.execute("SELECT value FROM metadata WHERE key = 'model_version'").fetchone()
+
+            if(indexed_model_version is None or indexed_model_version[0] != model_version):
+
+                if(indexed_model_version is not None):
+                    Logger.log_action("The NER model changed since the knowledge base index was built, indexing knowledge bases again.")
+
+                connection.execute("DELETE FROM files")
+                connection.execute("DELETE FROM paths")
+                connection.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('model_version', ?)", (model_version,))
+
+            connection.commit()
+
+            KnowledgeBaseIndex._connection = connection
+
+        return KnowledgeBaseIndex._connection
+
+##-------------------start-of-get_model_version()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_model_version() -> str:
+
+        """
+
+        Returns:
+        model_version (str) : the Kairyou version and the name and version of the NER model the Indexer uses.
+
+        """
+
+        import importlib.metadata
+
+        from kairyou import Indexer
+
+        try:
+            kairyou_version = importlib.metadata.version("kairyou")
+
+        except importlib.metadata.PackageNotFoundError:
+            kairyou_version = "unknown"
+
+        model_meta = getattr(Indexer.ner, "meta", {})
+
+        return kairyou_version + "/" + str(model_meta.get("name", "unknown")) + "-" + str(model_meta.get("version", "unknown"))
+
+##-------------------start-of-get_sources()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_sources(knowledge_base:typing.Union[str, typing.List[str]]) -> typing.List[typing.Tuple[typing.Optional[str], typing.Optional[str]]]:
+
+        """
+
+        Splits a knowledge base up into its files, the same way the Indexer reads it.
+
+        Parameters:
+        knowledge_base (str | list - str) : text, a path to a txt file, a path to a directory of txt files, or a list of paths to txt files.
+
+        Returns:
+        sources (list - tuple - str | None, str | None) : (path, None) for each file, or (None, text) if the knowledge base is text.
+
+        """
+
+        if(isinstance(knowledge_base, list)):
+            return [(os.path.abspath(path), None) for path in knowledge_base]
+
+        if(os.path.isdir(knowledge_base)):
+            return [(os.path.abspath(os.path.join(knowledge_base, file_name)), None) for file_name in sorted(os.listdir(knowledge_base)) if file_name.endswith(".txt")]
+
+        if(os.path.exists(knowledge_base)):
+            return [(os.path.abspath(knowledge_base), None)]
+
+        return [(None, knowledge_base)]
+
+##-------------------start-of-find_names()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def find_names(text:str) -> typing.List[str]:
+
+        """
+
+        Runs text through the Indexer's NER model, line by line as the Indexer does.
+
+        Parameters:
+        text (str) : the text.
+
+        Returns:
+        names (list - str) : every distinct name (PERSON entity) in the text.
+
+        """
+
+        from kairyou import Indexer
+
+        names = set()
+
+        for sentence in Indexer.ner.pipe(text.split("\n")):
+            for entity in sentence.ents:
+                if(entity.label_ == "PERSON"):
+                    names.add(entity.text)
+
+        return sorted(names)
+
+##-------------------start-of-get_names()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_names(knowledge_base:typing.Union[str, typing.List[str]]) -> typing.Tuple[typing.Set[str], int, int]:
+
+        """
+
+        Gets every name in a knowledge base, only running the files that aren't in the index yet through the NER model.
+
+        Parameters:
+        knowledge_base (str | list - str) : text, a path to a txt file, a path to a directory of txt files, or a list of paths to txt files.
+
+        Returns:
+        names (set - str) : every name in the knowledge base.
+        num_files (int) : how many files (or texts) the knowledge base is made of.
+        num_indexed_files (int) : how many of them had to be run through the NER model.
+
+        """
+
+        sources = KnowledgeBaseIndex.get_sources(knowledge_base)
+
+        names = set()
+        num_indexed_files = 0
+
+        with KnowledgeBaseIndex._lock:
+
+            connection = KnowledgeBaseIndex.get_connection()
+
+            for path, text in sources:
+
+                content_hash = None
+
+                if(path is not None):
+
+                    file_stat = os.stat(path)
+
+                    ## a file that wasn't touched since it was last seen isn't read at all
+                    known_path = connection.execute("SELECT content_hash FROM paths WHERE path = ? AND modified_time = ? AND size = ?", (path, file_stat.st_mtime_ns, file_stat.st_size)).fetchone()
+
+                    if(known_path is not None):
+                        content_hash = known_path[0]
+
+                    else:
+
+                        with open(path, 'rb') as file:
+                            content = file.read()
+
+                        content_hash = hashlib.sha256(content).hexdigest()
+
+                        connection.execute("INSERT OR REPLACE INTO paths (path, modified_time, size, content_hash) VALUES (?, ?, ?, ?)", (path, file_stat.st_mtime_ns, file_stat.st_size, content_hash))
+
+                        text = content.decode('utf-8')
+
+                else:
+                    content_hash = hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+
+                indexed_names = connection.execute("SELECT names FROM files WHERE content_hash = ?", (content_hash,)).fetchone()
+
+                ## a path whose modification time changed can still have the same contents, i.e. a copy or the webgui's upload of a file
+                if(indexed_names is not None):
+                    file_names = json.loads(indexed_names[0])
+
+                else:
+
+                    if(text is None):
+                        with open(str(path), 'r', encoding='utf-8') as file:
+                            text = file.read()
+
+                    file_names = KnowledgeBaseIndex.find_names(text)
+                    num_indexed_files += 1
+
+                    Logger.log_action("Indexed knowledge base file " + (path or "(text)") + ", " + str(len(file_names)) + " names found.")
+
+                connection.execute("INSERT OR REPLACE INTO files (content_hash, names, last_used) VALUES (?, ?, ?)", (content_hash, json.dumps(file_names, ensure_ascii=False), time.time()))
+
+                names.update(file_names)
+
+            connection.commit()
+
+            KnowledgeBaseIndex.evict_least_recently_used()
+
+        return names, len(sources), num_indexed_files
+
+##-------------------start-of-evict_least_recently_used()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def evict_least_recently_used() -> None:
+
+        """
+
+        Drops the least recently used files past max_files, along with the paths of files that no longer exist or no longer have an entry.
+        Expects the caller to hold KnowledgeBaseIndex._lock.
+
+        """
+
+        connection = KnowledgeBaseIndex.get_connection()
+
+        connection.execute("DELETE FROM files WHERE content_hash IN (SELECT content_hash FROM files ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (KnowledgeBaseIndex.max_files,))
+
+        missing_paths = [(path,) for path, in connection.execute("SELECT path FROM paths") if not os.path.exists(path)]
+
+        connection.executemany("DELETE FROM paths WHERE path = ?", missing_paths)
+        connection.execute("DELETE FROM paths WHERE content_hash NOT IN (SELECT content_hash FROM files)")
+
+        connection.commit()
+
+##-------------------start-of-index()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def index(text_to_index:str, knowledge_base:typing.Union[str, typing.List[str]], replacement_json:typing.Union[str, dict]) -> typing.Tuple[typing.List["NameAndOccurrence"], str]:
+
+        """
+
+        Does what Indexer.index() does, flagging the names in the text that aren't in the knowledge base or replacement json, but with the knowledge base's names taken from the index.
+
+        Parameters:
+        text_to_index (str) : the text to index.
+        knowledge_base (str | list - str) : text, a path to a txt file, a path to a directory of txt files, or a list of paths to txt files.
+        replacement_json (str | dict) : the replacement json, or a path to it.
+
+        Returns:
+        new_names (list - NameAndOccurrence) : the flagged names and which occurrence of each was flagged.
+        indexing_log (str) : the log of the indexing, in the Indexer's format.
+
+        """
+
+        from kairyou import Indexer
+        from kairyou.types import NameAndOccurrence
+
+        time_start = time.time()
+
+        knowledge_base_names, num_files, num_indexed_files = KnowledgeBaseIndex.get_names(knowledge_base)
+
+        ## the Indexer keeps its knowledge base and log between calls, so they're cleared, then it's given an empty knowledge base so it only goes through the text and the replacement json
+        Indexer.knowledge_base = []
+        Indexer.indexing_log = ""
+
+        new_names, _ = Indexer.index(text_to_index, "", replacement_json)
+
+        ## the knowledge base's names go through the same filtering the Indexer would have given them
+        knowledge_base_entries = [NameAndOccurrence(name, 1) for name in knowledge_base_names if name not in Indexer.blacklisted_names]
+
+        knowledge_base_entries, _, _ = Indexer.perform_further_elimination(knowledge_base_entries, [], [])
+
+        if(replacement_json):
+            knowledge_base_entries, _, _ = Indexer.trim_honorifics(knowledge_base_entries, [], [])
+
+        known_names = set(entry.name for entry in knowledge_base_entries)
+
+        ## a name is flagged if no known name is part of it, so checking the knowledge base's names after the replacement json's gives the same result as checking both at once
+        new_names = [name for name in new_names if not Indexer.is_name_in_other_sources(name.name, known_names)]
+
+        time_end = time.time()
+
+        indexing_log = "".join(f"Name: {name.name} Occurrence: {name.occurrence} was flagged as a unique 'name'\n" for name in new_names)
+
+        indexing_log += "\nIgnored Strings: " + str(Indexer.blacklisted_names)
+        indexing_log += "\nTotal Unique 'Names'  : " + str(len(new_names))
+        indexing_log += "\nKnowledge Base Files : " + str(num_files) + " (" + str(num_indexed_files) + " newly indexed, " + str(num_files - num_indexed_files) + " from the knowledge base index)"
+        indexing_log += "\nTime Elapsed : " + Toolkit.get_elapsed_time(time_start, time_end)
+
+        return new_names, indexing_log
+
+##-------------------start-of-purge()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def purge() -> None:
+
+        """
+
+        Deletes the index, so knowledge bases are run through the NER model again.
+        The database file is removed rather than emptied, as opening it would load the NER model just to check its version.
+
+        """
+
+        with KnowledgeBaseIndex._lock:
+
+            if(KnowledgeBaseIndex._connection is not None):
+                KnowledgeBaseIndex._connection.close()
+                KnowledgeBaseIndex._connection = None
+
+            if(not os.path.exists(FileEnsurer.knowledge_base_index_path)):
+                return
+
+            os.remove(FileEnsurer.knowledge_base_index_path)
+
+        Logger.log_action("Knowledge base index at " + FileEnsurer.knowledge_base_index_path + " was purged.")
+
+##-------------------start-of-close()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def close() -> None:
+
+        """
+
+        Closes the connection to the index database, if one is open.
+
+        """
+
+        with KnowledgeBaseIndex._lock:
+
+            if(KnowledgeBaseIndex._connection is not None):
+                KnowledgeBaseIndex._connection.close()
+                KnowledgeBaseIndex._connection = None
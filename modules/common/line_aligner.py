@@ -0,0 +1,283 @@
+## built-in libraries
+import math
+import typing
+import re
+
+##-------------------start-of-LineAligner--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class LineAligner:
+
+    """
+
+    LineAligner lines up a malformed translation with the lines it was translated from, in the style of Gale-Church sentence alignment.
+    A translated line's length is roughly proportional to its source line's, and it usually has as many sentences, so a dynamic program finds the cheapest way to pair the lines up, allowing for lines that were dropped, added, merged or split.
+    Source lines that end up cleanly paired one to one, with clean one to one pairs either side of them, can be kept, the rest are what needs to be translated again.
+    A line that was dropped, added, merged or split usually throws off the lines around it too, and a wrongly kept line is far worse than a line re-requested for nothing.
+
+    """
+
+    ## variance of a translated line's length around the expected length, per source character (Gale-Church use 6.8)
+    length_variance = 6.8
+
+    ## -log(prior probability) of each kind of pairing, (source lines, translated lines) : cost
+    bead_costs = {
+        (1, 1): -math.log(0.89),
+        (1, 0): -math.log(0.005),
+        (0, 1): -math.log(0.005),
+        (2, 1): -math.log(0.0445),
+        (1, 2): -math.log(0.0445)
+    }
+
+    ## extra cost for pairing a line of dialogue with a line that isn't, or vice versa
+    dialogue_mismatch_cost = 2.0
+
+    ## extra cost per sentence the source and translated lines of a pairing differ by
+    sentence_mismatch_cost = 1.0
+
+    ## one to one pairs costing more than this are not trusted, about two standard deviations off the expected length
+    max_trusted_cost = 2.0
+
+    ## how much cheaper pairing a line one to one has to be than the cheapest alignment that doesn't, -log of how much more likely
+    min_trusted_margin = 4.0
+
+    ## how many lines either side of a one to one pair have to be cleanly paired as well for it to be trusted
+    trusted_neighbourhood = 1
+
+    japanese_quote_marks = ("「", "『", "（", "(")
+    english_quote_marks = ("\"", "“", "'", "‘", "(")
+
+    ## a run of sentence ending punctuation, in english only where it ends a word so the ellipsis in "...I see." doesn't count
+    japanese_sentence_end_pattern = re.compile(r"[。！？!?]+")
+    english_sentence_end_pattern = re.compile(r"[.!?]+(?=[\s\"”'’)]|$)")
+
+##-------------------start-of-get_length_cost()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_length_cost(source_length:int, translated_length:int, length_ratio:float) -> float:
+
+        """
+
+        Scores how plausible it is that text of one length was translated into text of another.
+
+        Parameters:
+        source_length (int) : the number of characters in the source text.
+        translated_length (int) : the number of characters in the translated text.
+        length_ratio (float) : the expected translated characters per source character.
+
+        Returns:
+        cost (float) : the negative log likelihood of the lengths, lower is more plausible.
+
+        """
+
+        delta = (translated_length - source_length * length_ratio) / math.sqrt(max(source_length, 1) * length_ratio * LineAligner.length_variance)
+
+        return delta * delta / 2
+
+##-------------------start-of-is_dialogue_mismatch()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def is_dialogue_mismatch(source_line:str, translated_line:str) -> bool:
+
+        """
+
+        Checks if one line is dialogue and the other is not.
+
+        Parameters:
+        source_line (str) : the source line.
+        translated_line (str) : the translated line.
+
+        Returns:
+        is_mismatch (bool) : whether exactly one of the lines is dialogue.
+
+        """
+
+        is_source_dialogue = source_line.strip().startswith(LineAligner.japanese_quote_marks)
+        is_translated_dialogue = translated_line.strip().startswith(LineAligner.english_quote_marks)
+
+        return is_source_dialogue != is_translated_dialogue
+
+##-------------------start-of-count_sentences()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_sentences(line:str, is_source:bool) -> int:
+
+        """
+
+        Counts the sentences in a line by its sentence ending punctuation.
+
+        Parameters:
+        line (str) : the line.
+        is_source (bool) : whether the line is a japanese source line or a translated one.
+
+        Returns:
+        num_sentences (int) : the number of sentences that end in the line.
+
+        """
+
+        pattern = LineAligner.japanese_sentence_end_pattern if is_source else LineAligner.english_sentence_end_pattern
+
+        return len(pattern.findall(line))
+
+##-------------------start-of-align()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def align(source_lines:typing.List[str], translated_lines:typing.List[str]) -> typing.List[typing.Optional[str]]:
+
+        """
+
+        Aligns the translated lines to the source lines.
+
+        Parameters:
+        source_lines (list - str) : the source lines, blank lines removed.
+        translated_lines (list - str) : the translated lines, blank lines removed.
+
+        Returns:
+        aligned_lines (list - str | None) : the translation for each source line, or None where no translated line could be trusted to belong to it.
+
+        """
+
+        num_source = len(source_lines)
+        num_translated = len(translated_lines)
+
+        aligned_lines:typing.List[typing.Optional[str]] = [None] * num_source
+
+        if(num_source == 0 or num_translated == 0):
+            return aligned_lines
+
+        source_lengths = [len(line.strip()) for line in source_lines]
+        translated_lengths = [len(line.strip()) for line in translated_lines]
+
+        source_sentence_counts = [LineAligner.count_sentences(line, True) for line in source_lines]
+        translated_sentence_counts = [LineAligner.count_sentences(line, False) for line in translated_lines]
+
+        ## calibrated on the batch itself, so it works for any language pair and translation style
+        length_ratio = max(sum(translated_lengths), 1) / max(sum(source_lengths), 1)
+
+        infinity = float("inf")
+
+        ## the cost of pairing the source lines from i with the translated lines from j, in the given numbers
+        def get_bead_cost(i:int, j:int, bead:typing.Tuple[int, int]) -> float:
+
+            cost = LineAligner.bead_costs[bead] + LineAligner.get_length_cost(sum(source_lengths[i:i + bead[0]]), sum(translated_lengths[j:j + bead[1]]), length_ratio)
+
+            if(bead == (1, 1) and LineAligner.is_dialogue_mismatch(source_lines[i], translated_lines[j])):
+                cost += LineAligner.dialogue_mismatch_cost
+
+            ## a merged line has the sentences of both lines, and half of a split one usually doesn't end one
+            if(bead[0] > 0 and bead[1] > 0):
+                cost += LineAligner.sentence_mismatch_cost * abs(sum(source_sentence_counts[i:i + bead[0]]) - sum(translated_sentence_counts[j:j + bead[1]]))
+
+            return cost
+
+        ## costs[i][j] is the cheapest alignment of the first i source lines with the first j translated lines
+        costs = [[infinity] * (num_translated + 1) for _ in range(num_source + 1)]
+
+        ## remaining_costs[i][j] is the cheapest alignment of the source lines from i on with the translated lines from j on
+        remaining_costs = [[infinity] * (num_translated + 1) for _ in range(num_source + 1)]
+
+        costs[0][0] = 0.0
+        remaining_costs[num_source][num_translated] = 0.0
+
+        for i in range(num_source + 1):
+            for j in range(num_translated + 1):
+
+                if(costs[i][j] == infinity):
+                    continue
+
+                for bead in LineAligner.bead_costs:
+
+                    if(i + bead[0] <= num_source and j + bead[1] <= num_translated):
+                        costs[i + bead[0]][j + bead[1]] = min(costs[i + bead[0]][j + bead[1]], costs[i][j] + get_bead_cost(i, j, bead))
+
+        for i in range(num_source, -1, -1):
+            for j in range(num_translated, -1, -1):
+
+                for bead in LineAligner.bead_costs:
+
+                    if(i + bead[0] <= num_source and j + bead[1] <= num_translated and remaining_costs[i + bead[0]][j + bead[1]] != infinity):
+                        remaining_costs[i][j] = min(remaining_costs[i][j], get_bead_cost(i, j, bead) + remaining_costs[i + bead[0]][j + bead[1]])
+
+        ## for each source line, the cheapest whole alignment pairing it one to one, which translated line that is, and the cheapest whole alignment that doesn't
+        best_pairings:typing.List[typing.Tuple[float, typing.Optional[int]]] = [(infinity, None)] * num_source
+        best_other_costs = [infinity] * num_source
+
+        for i in range(num_source + 1):
+            for j in range(num_translated + 1):
+
+                if(costs[i][j] == infinity):
+                    continue
+
+                for bead in LineAligner.bead_costs:
+
+                    if(bead[0] == 0 or i + bead[0] > num_source or j + bead[1] > num_translated):
+                        continue
+
+                    total_cost = costs[i][j] + get_bead_cost(i, j, bead) + remaining_costs[i + bead[0]][j + bead[1]]
+
+                    for source_index in range(i, i + bead[0]):
+
+                        if(bead == (1, 1) and total_cost < best_pairings[source_index][0]):
+                            best_other_costs[source_index] = min(best_other_costs[source_index], best_pairings[source_index][0])
+                            best_pairings[source_index] = (total_cost, j)
+
+                        else:
+                            best_other_costs[source_index] = min(best_other_costs[source_index], total_cost)
+
+        ## a source line is cleanly paired if the cheapest alignment pairs it one to one, the pair's lengths fit, and every alignment that doesn't pair it that way is clearly worse
+        ## where a line was dropped or added among lines of similar length, the alignment could put it in several places at about the same cost, so the lines around it are never clean
+        is_clean = [False] * num_source
+
+        for i, (pairing_cost, j) in enumerate(best_pairings):
+
+            ## the forward and backward costs are summed in a different order, so the cheapest alignment's cost can be off by rounding
+            if(j is None or pairing_cost > costs[num_source][num_translated] + 1e-9 or best_other_costs[i] - pairing_cost < LineAligner.min_trusted_margin):
+                continue
+
+            ## a line of dialogue paired with one that isn't, or with a different number of sentences, is never trusted, however well the lengths fit
+            ## a line merged with a short one or a line added next to it can fit the lengths fine, but the sentences rarely add up
+            if(LineAligner.is_dialogue_mismatch(source_lines[i], translated_lines[j]) or source_sentence_counts[i] != translated_sentence_counts[j]):
+                continue
+
+            is_clean[i] = LineAligner.get_length_cost(source_lengths[i], translated_lengths[j], length_ratio) <= LineAligner.max_trusted_cost
+
+        ## only the clean pairs with nothing but clean pairs around them are kept
+        for i, (_, j) in enumerate(best_pairings):
+
+            neighbourhood = is_clean[max(0, i - LineAligner.trusted_neighbourhood):i + LineAligner.trusted_neighbourhood + 1]
+
+            if(j is not None and all(neighbourhood)):
+                aligned_lines[i] = translated_lines[j]
+
+        return aligned_lines
+
+##-------------------start-of-get_unaligned_spans()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_unaligned_spans(aligned_lines:typing.List[typing.Optional[str]]) -> typing.List[typing.Tuple[int, int]]:
+
+        """
+
+        Finds the runs of source lines that have no trusted translation.
+
+        Parameters:
+        aligned_lines (list - str | None) : the output of align().
+
+        Returns:
+        unaligned_spans (list - tuple - int, int) : the (start, end) index of each run, end exclusive.
+
+        """
+
+        unaligned_spans = []
+
+        start = None
+
+        for index, line in enumerate(aligned_lines + ["end"]):
+
+            if(line is None and start is None):
+                start = index
+
+            elif(line is not None and start is not None):
+                unaligned_spans.append((start, index))
+                start = None
+
+        return unaligned_spans
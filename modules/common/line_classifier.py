@@ -0,0 +1,104 @@
+## built-in libraries
+import functools
+import re
+import typing
+
+## third-party libraries
+from kairyou import KatakanaUtil
+
+##-------------------start-of-LineClassifier--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class LineClassifier:
+
+    """
+
+    LineClassifier sorts the lines of a text into the kinds Kijiku and Kaiseki treat differently (pov changes, part markers, punctuation, etc.), so both use the same rules.
+    Patterns and character sets are built once, and results are cached per line, as novels repeat a lot of short lines ("「……」", scene breaks, etc.).
+
+    """
+
+    ## line types, in the order they are checked
+    POV_CHANGE = "pov change"
+    PART_MARKER = "part marker"
+    EMPTY = "empty"
+
+    ## punctuation only, with nothing Kaiseki needs DeepL for
+    PUNCTUATION = "punctuation"
+
+    ## punctuation only, but with Japanese quotes or marks (「」, ー, 々, etc.) that Kaiseki still sends to DeepL
+    QUOTED_PUNCTUATION = "quoted punctuation"
+
+    LATIN = "latin"
+    TRANSLATABLE = "translatable"
+
+    pov_change_chars = frozenset(["▼", "△", "◇"])
+
+    part_number_chars = frozenset(["１","２","３","４","５","６","７","８","９", " "])
+
+    quote_chars = frozenset(["」", "「", "«", "»"])
+
+    punctuation_chars = frozenset(KatakanaUtil.PUNCTUATION_CHARSET)
+
+    non_word_pattern = re.compile(r'^[\W_\s\n-]+$')
+    latin_pattern = re.compile(r'^[A-Za-z0-9\s\.,\'\?!]+\n*$')
+
+##-------------------start-of-classify()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def classify(line:str) -> str:
+
+        """
+
+        Classifies a single line.
+
+        Parameters:
+        line (str) : the line to classify.
+
+        Returns:
+        line_type (str) : one of the line types above.
+
+        """
+
+        line_chars = set(line)
+
+        if(not line_chars.isdisjoint(LineClassifier.pov_change_chars)):
+            return LineClassifier.POV_CHANGE
+
+        if("part" in line.lower() or (line_chars <= LineClassifier.part_number_chars and line_chars != {" "} and len(line_chars) > 0)):
+            return LineClassifier.PART_MARKER
+
+        if(len(line) == 0 or line.isspace()):
+            return LineClassifier.EMPTY
+
+        is_non_word = LineClassifier.non_word_pattern.match(line) is not None
+
+        if(is_non_word and line_chars.isdisjoint(LineClassifier.quote_chars)):
+            return LineClassifier.PUNCTUATION
+
+        if(is_non_word or line_chars <= LineClassifier.punctuation_chars):
+            return LineClassifier.QUOTED_PUNCTUATION
+
+        if(LineClassifier.latin_pattern.match(line)):
+            return LineClassifier.LATIN
+
+        return LineClassifier.TRANSLATABLE
+
+##-------------------start-of-classify_lines()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def classify_lines(lines:typing.List[str]) -> typing.List[str]:
+
+        """
+
+        Classifies every line of a text in one pass.
+
+        Parameters:
+        lines (list - str) : the lines to classify.
+
+        Returns:
+        line_types (list - str) : the type of each line.
+
+        """
+
+        return [LineClassifier.classify(line) for line in lines]
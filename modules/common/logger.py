@@ -1,132 +1,417 @@
+## built-in libraries
+import atexit
+import queue
+import threading
+import time
+import typing
+
 ## custom modules
+from modules.common.translation_job import JobScoped
 from modules.common.toolkit import Toolkit
+from modules.common.progress_renderer import ProgressRenderer
 from modules.common.decorators import permission_error_decorator
 
-class Logger:
+class Logger(metaclass=JobScoped):
 
     """
-    
+
     The logger class is used to log actions taken by Kudasai.
+    Lines are kept in a list rather than one growing string, and are written to the log file by a background thread in chunks, so logging stays cheap no matter how long a run is.
+    Messages below the current level are dropped before they are formatted, so debug logging in the hot path costs next to nothing when it is off.
 
     """
 
+    ## log levels
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+
+    ## messages below this level are dropped, set to DEBUG with the --debug flag
+    level = INFO
+
     log_file_path = ""
 
-    current_batch = ""
+    ## the lines of the current batch, entries[0] is line number first_entry_index of everything logged
+    entries:typing.List[str] = []
+    first_entry_index = 0
+
+    ## lines of the batch before this one have been handed to the flusher
+    num_flushed = 0
+
+    ## when lines were last handed to the flusher
+    last_flush_time = 0.0
 
     errors = []
-    
+
+    ## lines are handed to the flusher once this many are waiting, or once they have waited this many seconds
+    flush_threshold = 1000
+    flush_interval = 1.0
+
+    ## once the batch is this long, its oldest lines that are already in the log file are dropped from memory
+    max_entries = 200000
+
+    ## the background flusher, shared by every job
+    _flush_queue:queue.SimpleQueue = queue.SimpleQueue()
+    _flusher:threading.Thread | None = None
+    _flusher_lock = threading.Lock()
+
+    ## the timestamp of the current second, so it is only formatted once a second
+    _timestamp_second = -1
+    _timestamp = ""
+
+    _job_shared_attributes = ("DEBUG", "INFO", "WARNING", "ERROR", "level", "flush_threshold", "flush_interval", "max_entries",
+                              "_flush_queue", "_flusher", "_flusher_lock", "_timestamp_second", "_timestamp")
+
 ##--------------------start-of-log_action()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    def log_action(action:str, output:bool=False, omit_timestamp:bool=False) -> None:
+    def log_action(action:str, *args:typing.Any, output:bool=False, omit_timestamp:bool=False, level:int=INFO) -> None:
 
         """
-        
+
         Logs an action.
 
         Parameters:
-        action (str) : the action being logged.
+        action (str) : the action being logged, formatted with args (% style) only if it is logged.
+        args (any) : values for the action's placeholders.
         output (bool | optional | defaults to false) : whether or not to output the action to the console.
         omit_timestamp (bool | optional | defaults to false) : whether or not to omit the timestamp from the action.
- 
+        level (int | optional | defaults to INFO) : the level of the action.
+
         """
 
-        timestamp = Toolkit.get_timestamp() 
+        if(level < Logger.level):
+            return
+
+        if(args):
+            action = action % args
 
-        log_line = timestamp + action + "\n"
+        ## the timestamp is only formatted again once the second changes, which is also when lines that have waited too long are checked for
+        current_second = int(time.time())
+        is_new_second = current_second != Logger._timestamp_second
 
-        Logger.current_batch += log_line
+        if(is_new_second):
+            Logger._timestamp = Toolkit.get_timestamp()
+            Logger._timestamp_second = current_second
 
-        if(omit_timestamp):
-            log_line = action
+        log_line = Logger._timestamp + str(action) + "\n"
+
+        entries = Logger.entries
+        entries.append(log_line)
 
         if(output):
-            print(log_line)
+
+            ## a progress bar drawn in place would otherwise end up in front of the output
+            ProgressRenderer.clear_line()
+
+            print(action if omit_timestamp else log_line)
+
+        if(is_new_second or len(entries) % Logger.flush_threshold == 0):
+            Logger.flush_if_due()
+
+##--------------------start-of-log_debug()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def log_debug(action:str, *args:typing.Any) -> None:
+
+        """
+
+        Logs a debug action, meant for the per line details that are only wanted when looking into a problem.
+
+        Parameters:
+        action (str) : the action being logged, formatted with args (% style) only if it is logged.
+        args (any) : values for the action's placeholders.
+
+        """
+
+        if(Logger.DEBUG < Logger.level):
+            return
+
+        Logger.log_action(action, *args, level=Logger.DEBUG)
 
 ##--------------------start-of-log_error()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-    
+
     @staticmethod
     def log_error(action:str, output:bool=False, omit_timestamp:bool=False) -> None:
 
         """
-        
+
         Logs an error.
 
         Parameters:
         action (str) : the action being logged.
         output (bool | optional | defaults to false) : whether or not to output the action to the console.
         omit_timestamp (bool | optional | defaults to false) : whether or not to omit the timestamp from the action.
- 
-        """
-
-        timestamp = Toolkit.get_timestamp() 
 
-        log_line = timestamp + action + "\n"
-
-        Logger.current_batch += log_line
+        """
 
-        if(omit_timestamp):
-            log_line = action
+        Logger.log_action(action, output=output, omit_timestamp=omit_timestamp, level=Logger.ERROR)
 
-        if(output):
-            print(log_line)
-
-        Logger.errors.append(log_line)
+        Logger.errors.append(action if omit_timestamp else Logger.entries[-1])
 
 ##--------------------start-of-log_barrier()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
     def log_barrier() -> None:
-            
+
         """
-        
+
         Logs a barrier.
 
         """
-    
+
         Logger.log_action("-------------------------")
 
+##--------------------start-of-get_batch()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_batch() -> str:
+
+        """
+
+        Returns:
+        batch (str) : the lines of the current batch still in memory, joined.
+
+        """
+
+        return "".join(Logger.entries)
+
+##--------------------start-of-read_entries()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def read_entries(cursor:int, entries:typing.List[str] | None = None, first_entry_index:int | None = None) -> typing.Tuple[typing.List[str], int]:
+
+        """
+
+        Reads the lines logged since a previous read, so a reader (i.e. the webgui) only ever gets what is new.
+        Lines that were dropped from memory before they were read are skipped.
+
+        Parameters:
+        cursor (int) : the cursor returned by the previous read, 0 to read from the start.
+        entries (list - str | None | optional) : the lines to read from, i.e. a running job's, defaults to the current batch.
+        first_entry_index (int | None | optional) : the line number of entries[0], defaults to the current batch's.
+
+        Returns:
+        new_entries (list - str) : the lines logged since the cursor.
+        cursor (int) : the cursor to pass to the next read.
+
+        """
+
+        if(entries is None):
+            entries = Logger.entries
+
+        if(first_entry_index is None):
+            first_entry_index = Logger.first_entry_index
+
+        ## a cursor from somewhere else (i.e. another job's log) starts over
+        if(cursor > first_entry_index + len(entries)):
+            cursor = 0
+
+        start = max(cursor - first_entry_index, 0)
+
+        new_entries = entries[start:]
+
+        return new_entries, first_entry_index + start + len(new_entries)
+
+##--------------------start-of-flush_if_due()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def flush_if_due() -> None:
+
+        """
+
+        Hands the lines waiting to be written to the flusher if there are enough of them or they have waited long enough, and drops old lines from memory if the batch is too long.
+
+        """
+
+        num_waiting = Logger.first_entry_index + len(Logger.entries) - Logger.num_flushed
+
+        if(num_waiting >= Logger.flush_threshold or (num_waiting > 0 and time.time() - Logger.last_flush_time >= Logger.flush_interval)):
+            Logger.hand_to_flusher()
+
+        if(len(Logger.entries) > Logger.max_entries):
+
+            ## only lines already handed to the flusher can go
+            num_to_drop = min(len(Logger.entries) - Logger.max_entries // 2, Logger.num_flushed - Logger.first_entry_index)
+
+            if(num_to_drop > 0):
+                del Logger.entries[:num_to_drop]
+                Logger.first_entry_index += num_to_drop
+
+##--------------------start-of-hand_to_flusher()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def hand_to_flusher() -> None:
+
+        """
+
+        Hands every line not yet written to the flusher, which appends them to the log file.
+
+        """
+
+        Logger.last_flush_time = time.time()
+
+        start = Logger.num_flushed - Logger.first_entry_index
+
+        if(start >= len(Logger.entries) or Logger.log_file_path == ""):
+            return
+
+        Logger.start_flusher()
+
+        Logger._flush_queue.put((Logger.log_file_path, "".join(Logger.entries[start:])))
+
+        Logger.num_flushed = Logger.first_entry_index + len(Logger.entries)
+
+##--------------------start-of-start_flusher()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def start_flusher() -> None:
+
+        """
+
+        Starts the background flusher if it isn't running yet.
+
+        """
+
+        if(Logger._flusher is not None):
+            return
+
+        with Logger._flusher_lock:
+
+            if(Logger._flusher is None):
+
+                Logger._flusher = threading.Thread(target=Logger.run_flusher, name="LoggerFlusher", daemon=True)
+                Logger._flusher.start()
+
+                ## whatever was handed over but not written yet still gets written on exit
+                atexit.register(Logger.wait_for_flusher)
+
+##--------------------start-of-run_flusher()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def run_flusher() -> None:
+
+        """
+
+        The background flusher, writes the chunks it is handed in order.
+        A chunk is either (path, text) to append, (path, None) to clear the file, or an event to set once everything before it is written.
+
+        """
+
+        while True:
+
+            item = Logger._flush_queue.get()
+
+            if(isinstance(item, threading.Event)):
+                item.set()
+                continue
+
+            file_path, text = item
+
+            Logger.write_chunk(file_path, text)
+
+##--------------------start-of-write_chunk()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    @permission_error_decorator()
+    def write_chunk(file_path:str, text:str | None) -> None:
+
+        """
+
+        Writes a chunk to a log file.
+
+        Parameters:
+        file_path (str) : the log file.
+        text (str | None) : the text to append, None to clear the file.
+
+        """
+
+        try:
+
+            if(text is None):
+
+                with open(file_path, 'w+', encoding="utf-8") as file:
+                    file.truncate(0)
+
+            else:
+
+                with open(file_path, 'a+', encoding="utf-8") as file:
+                    file.write(text)
+
+        ## a log file that can't be written (i.e. its folder was removed) shouldn't take the flusher down with it
+        except (FileNotFoundError, IsADirectoryError):
+            pass
+
+##--------------------start-of-wait_for_flusher()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def wait_for_flusher() -> None:
+
+        """
+
+        Waits until everything handed to the flusher so far has been written.
+
+        """
+
+        if(Logger._flusher is None or not Logger._flusher.is_alive()):
+            return
+
+        is_written = threading.Event()
+
+        Logger._flush_queue.put(is_written)
+
+        is_written.wait()
+
 ##--------------------start-of-clear_batch()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
     def clear_batch() -> None:
 
         """
-        
-        Clears the current batch.
+
+        Clears the current batch, lines not pushed yet are still written to the log file.
 
         """
 
-        Logger.current_batch = ""
+        Logger.hand_to_flusher()
+
+        ## line numbers carry on from the last batch, so a reader's cursor never points into the new one by mistake
+        Logger.first_entry_index += len(Logger.entries)
+        Logger.num_flushed = Logger.first_entry_index
+
+        Logger.entries = []
         Logger.errors = []
 
-##--------------------start-of-push_batch()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##--------------------start-of-push_batch()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    @permission_error_decorator()
     def push_batch() -> None:
 
         """
-        
-        Pushes all stored actions to the log file.
+
+        Pushes all stored actions to the log file, returning once they are written.
 
         """
 
-        with open(Logger.log_file_path, 'a+', encoding="utf-8") as file:
-            file.write(Logger.current_batch)
-            
+        Logger.hand_to_flusher()
+        Logger.wait_for_flusher()
+
 ##--------------------start-of-clear_log_file()------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    @permission_error_decorator()
     def clear_log_file() -> None:
 
         """
-        
-        Clears the log file.
-        
+
+        Clears the log file, the current batch is written to it again on the next push.
+
         """
 
-        with open(Logger.log_file_path, 'w+', encoding="utf-8") as file:
-            file.truncate(0)
+        Logger.start_flusher()
+
+        Logger._flush_queue.put((Logger.log_file_path, None))
+
+        Logger.wait_for_flusher()
+
+        Logger.num_flushed = Logger.first_entry_index
@@ -0,0 +1,179 @@
+## built-in libraries
+import re
+import typing
+
+if(typing.TYPE_CHECKING):
+    from kairyou.types import NameAndOccurrence
+
+##-------------------start-of-NameMarker--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class NameMarker:
+
+    """
+
+    NameMarker wraps the occurrences of names the indexer flagged in >>>name<<< markers.
+    Every name is found in a single pass over the text with one combined pattern, counting each name's occurrences as it goes, and the text is rebuilt once at the end, rather than rescanning and rebuilding the whole text for every name.
+    Occurrences are counted the way a pattern of the name on its own would count them in the unmarked text, so a name running into another doesn't throw off either one's count.
+
+    """
+
+    marker_start = ">>>"
+    marker_end = "<<<"
+
+##-------------------start-of-mark()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def mark(text:str, unique_names:typing.List["NameAndOccurrence"]) -> str:
+
+        """
+
+        Marks the flagged occurrences of each name in the text.
+
+        Parameters:
+        text (str) : the text to mark.
+        unique_names (list - NameAndOccurrence) : the names and which occurrence of each to mark, a name can be in the list more than once.
+
+        Returns:
+        marked_text (str) : the text with the flagged occurrences marked.
+
+        """
+
+        ## the occurrences to mark, by name
+        flagged_occurrences:typing.Dict[str, typing.Set[int]] = {}
+
+        for name_tuple in unique_names:
+            if(name_tuple.name):
+                flagged_occurrences.setdefault(name_tuple.name, set()).add(name_tuple.occurrence)
+
+        if(len(flagged_occurrences) == 0):
+            return text
+
+        ## longest first, so where several names start at the same place the pattern matches the longest
+        names = sorted(flagged_occurrences, key=len, reverse=True)
+
+        pattern = re.compile("|".join(re.escape(name) for name in names))
+
+        ## every name that also starts wherever a name matches, being the names it starts with
+        names_matched_with = NameMarker.get_names_matched_with(names)
+
+        ## the places inside a name where another name could start, which the pattern steps over as it only finds matches that don't overlap
+        inner_offsets = NameMarker.get_inner_offsets(names)
+
+        num_occurrences = dict.fromkeys(names, 0)
+        occurrence_ends = dict.fromkeys(names, 0)
+
+        ## (start, end, name) of each occurrence to mark
+        spans:typing.List[typing.Tuple[int, int, str]] = []
+
+        def count_occurrences(start:int, matched_name:str) -> None:
+
+            for name in names_matched_with[matched_name]:
+
+                ## same as a pattern of the name on its own, an occurrence overlapping the last one isn't counted
+                if(start < occurrence_ends[name]):
+                    continue
+
+                num_occurrences[name] += 1
+                occurrence_ends[name] = start + len(name)
+
+                if(num_occurrences[name] in flagged_occurrences[name]):
+                    spans.append((start, start + len(name), name))
+
+        for match in pattern.finditer(text):
+
+            count_occurrences(match.start(), match.group())
+
+            for offset in inner_offsets[match.group()]:
+
+                inner_match = pattern.match(text, match.start() + offset)
+
+                if(inner_match is not None):
+                    count_occurrences(inner_match.start(), inner_match.group())
+
+        return NameMarker.rebuild_text(text, spans)
+
+##-------------------start-of-get_names_matched_with()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_names_matched_with(names:typing.List[str]) -> typing.Dict[str, typing.List[str]]:
+
+        """
+
+        Finds the names each name starts with, as wherever the name matches those match too.
+
+        Parameters:
+        names (list - str) : the names.
+
+        Returns:
+        names_matched_with (dict - str, list - str) : each name and the names it starts with, itself included.
+
+        """
+
+        name_set = set(names)
+
+        return {name: [name[:length] for length in range(len(name), 0, -1) if name[:length] in name_set] for name in names}
+
+##-------------------start-of-get_inner_offsets()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_inner_offsets(names:typing.List[str]) -> typing.Dict[str, typing.List[int]]:
+
+        """
+
+        Finds the offsets into each name where another name could start, either inside the name or running on past its end.
+
+        Parameters:
+        names (list - str) : the names.
+
+        Returns:
+        inner_offsets (dict - str, list - int) : each name and its offsets, empty for most names.
+
+        """
+
+        name_set = set(names)
+        name_prefixes = {name[:length] for name in names for length in range(1, len(name) + 1)}
+
+        inner_offsets = {}
+
+        for name in names:
+            inner_offsets[name] = [offset for offset in range(1, len(name)) if name[offset:] in name_prefixes or any(name[offset:end] in name_set for end in range(offset + 1, len(name)))]
+
+        return inner_offsets
+
+##-------------------start-of-rebuild_text()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def rebuild_text(text:str, spans:typing.List[typing.Tuple[int, int, str]]) -> str:
+
+        """
+
+        Builds the marked text in one go.
+
+        Parameters:
+        text (str) : the unmarked text.
+        spans (list - tuple - int, int, str) : the start, end and name of each occurrence to mark.
+
+        Returns:
+        marked_text (str) : the text with the occurrences marked.
+
+        """
+
+        ## where flagged occurrences overlap, the one that starts first, or the longest, is marked and the others are left alone
+        spans.sort(key=lambda span: (span[0], -span[1]))
+
+        parts = []
+        last_end = 0
+
+        for start, end, name in spans:
+
+            if(start < last_end):
+                continue
+
+            parts.append(text[last_end:start])
+            parts.append(NameMarker.marker_start + name + NameMarker.marker_end)
+
+            last_end = end
+
+        parts.append(text[last_end:])
+
+        return "".join(parts)
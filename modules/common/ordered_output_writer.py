@@ -0,0 +1,187 @@
+## built-in libraries
+import asyncio
+import typing
+
+## custom modules
+from modules.common.translation_job import JobScoped
+from modules.common.file_ensurer import FileEnsurer
+
+##-------------------start-of-OrderedOutputWriter--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class OrderedOutputWriter(metaclass=JobScoped):
+
+    """
+
+    OrderedOutputWriter streams translated batches to the output files while the rest of the run is still in flight.
+    Batches finish out of order, so finished batches are held in a reorder buffer keyed by their batch number, and every contiguous prefix is formatted and appended to translated_text.txt and je_check_text.txt as soon as it exists.
+    The buffer is bounded by only letting a batch start once it is within window_size batches of the next one to be written, and the file writes happen on a worker thread so they never block the event loop.
+
+    """
+
+    ## formats a batch into its (translated lines, je check lines), called once per batch in batch order
+    _format_batch:typing.Optional[typing.Callable[[typing.Any, str], typing.Tuple[typing.List[str], typing.List[str]]]] = None
+
+    ## finished batches waiting on an earlier batch, batch number -> (translation prompt, translated message)
+    _pending_batches:typing.Dict[int, typing.Tuple[typing.Any, str]] = {}
+
+    _next_batch_number = 0
+
+    window_size = 0
+
+    _window_condition:typing.Optional[asyncio.Condition] = None
+
+    _write_queue:typing.Optional[asyncio.Queue] = None
+    _writer_task:typing.Optional[asyncio.Task] = None
+
+##-------------------start-of-start()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def start(format_batch:typing.Callable[[typing.Any, str], typing.Tuple[typing.List[str], typing.List[str]]], window_size:int) -> None:
+
+        """
+
+        Truncates the output files and starts the background writer, must be called from within the running event loop.
+
+        Parameters:
+        format_batch (callable) : takes a batch's translation prompt and translated message, and returns the batch's translated lines and je check lines.
+        window_size (int) : how many batches past the next one to be written are allowed to be in flight or waiting in the buffer.
+
+        """
+
+        FileEnsurer.standard_create_directory(FileEnsurer.output_dir)
+
+        for path in [FileEnsurer.translated_text_path, FileEnsurer.je_check_path]:
+            with open(path, 'w', encoding='utf-8'):
+                pass
+
+        OrderedOutputWriter._format_batch = format_batch
+        OrderedOutputWriter._pending_batches = {}
+        OrderedOutputWriter._next_batch_number = 0
+        OrderedOutputWriter.window_size = max(1, window_size)
+
+        OrderedOutputWriter._window_condition = asyncio.Condition()
+
+        ## a full queue means the disk is behind, so submit() waits instead of piling up formatted text
+        OrderedOutputWriter._write_queue = asyncio.Queue(maxsize=OrderedOutputWriter.window_size)
+        OrderedOutputWriter._writer_task = asyncio.create_task(OrderedOutputWriter._write_loop())
+
+##-------------------start-of-wait_for_window()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def wait_for_window(batch_number:int) -> None:
+
+        """
+
+        Waits until a batch is close enough to the next batch to be written that it is allowed to start.
+
+        Parameters:
+        batch_number (int) : the batch's position in the run, starting at 0.
+
+        """
+
+        if(OrderedOutputWriter._window_condition is None):
+            return
+
+        async with OrderedOutputWriter._window_condition:
+            await OrderedOutputWriter._window_condition.wait_for(lambda: batch_number < OrderedOutputWriter._next_batch_number + OrderedOutputWriter.window_size)
+
+##-------------------start-of-submit()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def submit(batch_number:int, translation_prompt:typing.Any, translated_message:str) -> None:
+
+        """
+
+        Hands a finished batch to the writer, then writes out every batch that is now next in line.
+
+        Parameters:
+        batch_number (int) : the batch's position in the run, starting at 0.
+        translation_prompt (object - ModelTranslationMessage) : the user message also known as the prompt.
+        translated_message (str) : the translated message.
+
+        """
+
+        if(OrderedOutputWriter._write_queue is None or OrderedOutputWriter._window_condition is None or OrderedOutputWriter._format_batch is None):
+            return
+
+        ## the whole hand-off happens under the condition's lock, otherwise two batches finishing together could queue their prefixes out of order
+        async with OrderedOutputWriter._window_condition:
+
+            OrderedOutputWriter._pending_batches[batch_number] = (translation_prompt, translated_message)
+
+            if(OrderedOutputWriter._next_batch_number not in OrderedOutputWriter._pending_batches):
+                return
+
+            ## formatting has to happen here, in batch order, as the formatter builds up Kijiku's in-memory results as well
+            while(OrderedOutputWriter._next_batch_number in OrderedOutputWriter._pending_batches):
+                ready_prompt, ready_message = OrderedOutputWriter._pending_batches.pop(OrderedOutputWriter._next_batch_number)
+                await OrderedOutputWriter._write_queue.put(OrderedOutputWriter._format_batch(ready_prompt, ready_message))
+                OrderedOutputWriter._next_batch_number += 1
+
+            OrderedOutputWriter._window_condition.notify_all()
+
+##-------------------start-of-_write_loop()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def _write_loop() -> None:
+
+        """
+
+        Appends formatted batches to the output files in the order they were queued, until it is handed None.
+
+        """
+
+        assert OrderedOutputWriter._write_queue is not None
+
+        while True:
+
+            formatted_batch = await OrderedOutputWriter._write_queue.get()
+
+            if(formatted_batch is None):
+                break
+
+            await asyncio.to_thread(OrderedOutputWriter._append_to_output_files, *formatted_batch)
+
+##-------------------start-of-_append_to_output_files()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _append_to_output_files(translated_lines:typing.List[str], je_check_lines:typing.List[str]) -> None:
+
+        """
+
+        Appends a formatted batch to the output files, flushing so other tools can read it straight away.
+
+        Parameters:
+        translated_lines (list - str) : the batch's translated lines.
+        je_check_lines (list - str) : the batch's je check lines.
+
+        """
+
+        with open(FileEnsurer.translated_text_path, 'a', encoding='utf-8') as file:
+            file.writelines(translated_lines)
+
+        with open(FileEnsurer.je_check_path, 'a', encoding='utf-8') as file:
+            file.writelines(je_check_lines)
+
+##-------------------start-of-close()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def close() -> None:
+
+        """
+
+        Waits for every queued batch to be written, then stops the background writer.
+
+        """
+
+        if(OrderedOutputWriter._write_queue is not None and OrderedOutputWriter._writer_task is not None):
+
+            if(not OrderedOutputWriter._writer_task.done()):
+                await OrderedOutputWriter._write_queue.put(None)
+                await OrderedOutputWriter._writer_task
+
+        OrderedOutputWriter._format_batch = None
+        OrderedOutputWriter._pending_batches = {}
+        OrderedOutputWriter._window_condition = None
+        OrderedOutputWriter._write_queue = None
+        OrderedOutputWriter._writer_task = None
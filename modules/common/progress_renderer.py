@@ -0,0 +1,227 @@
+## built-in libraries
+import shutil
+import sys
+import time
+import typing
+
+##-------------------start-of-ProgressRenderer--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class ProgressRenderer:
+
+    """
+
+    ProgressRenderer shows how far a translation has got, how fast it is going and how long it has left.
+    In a terminal it is a single bar redrawn in place at most every redraw_interval seconds, otherwise (i.e. output piped to a file) a plain line is printed every plain_interval seconds.
+    Either way the cost of an update doesn't depend on the terminal, unlike clearing the console, which starts a new process every time.
+
+    """
+
+    ## nothing is drawn at all, for headless runs (i.e. the webgui or the --quiet flag)
+    is_quiet = False
+
+    redraw_interval = 0.1
+    plain_interval = 10.0
+
+    bar_width = 30
+
+    ## the renderer whose bar is currently on the console, so other output can clear it first
+    _drawn_renderer:"ProgressRenderer | None" = None
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self, label:str, total:int, unit:str="lines", get_status:typing.Optional[typing.Callable[[], str]]=None) -> None:
+
+        """
+
+        Constructor for ProgressRenderer class.
+
+        Parameters:
+        label (str) : what is in progress, shown at the start of the bar.
+        total (int) : how many units there are in total.
+        unit (str | optional) : what is being counted.
+        get_status (callable | optional) : returns anything else worth showing at the end of the line, i.e. the current concurrency limit, called on every draw.
+
+        """
+
+        self.label = label
+        self.total = max(total, 0)
+        self.unit = unit
+
+        self.get_status = get_status
+
+        self.num_done = 0
+
+        ## num_done as of the last draw
+        self.num_drawn = -1
+
+        self.start_time = time.perf_counter()
+        self.last_draw_time = 0.0
+
+        self.is_in_place = sys.stdout.isatty()
+
+##-------------------start-of-advance()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def advance(self, num_done:int=1) -> None:
+
+        """
+
+        Counts units as done, redrawing if it has been long enough since the last redraw.
+
+        Parameters:
+        self (object - ProgressRenderer) : The ProgressRenderer object.
+        num_done (int | optional) : how many units were done.
+
+        """
+
+        self.num_done += num_done
+
+        if(ProgressRenderer.is_quiet):
+            return
+
+        now = time.perf_counter()
+
+        if(now - self.last_draw_time < (ProgressRenderer.redraw_interval if self.is_in_place else ProgressRenderer.plain_interval) and self.num_done < self.total):
+            return
+
+        self.draw(now)
+
+##-------------------start-of-finish()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def finish(self) -> None:
+
+        """
+
+        Draws the final state and moves the console on to the next line.
+
+        Parameters:
+        self (object - ProgressRenderer) : The ProgressRenderer object.
+
+        """
+
+        if(ProgressRenderer.is_quiet):
+            return
+
+        ## the last advance() may have already drawn the final state
+        if(self.num_drawn != self.num_done or ProgressRenderer._drawn_renderer is not self and self.is_in_place):
+            self.draw(time.perf_counter())
+
+        if(self.is_in_place):
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+
+        if(ProgressRenderer._drawn_renderer is self):
+            ProgressRenderer._drawn_renderer = None
+
+##-------------------start-of-draw()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def draw(self, now:float) -> None:
+
+        """
+
+        Draws the progress, in place in a terminal or as a new line otherwise.
+
+        Parameters:
+        self (object - ProgressRenderer) : The ProgressRenderer object.
+        now (float) : the current perf_counter() time.
+
+        """
+
+        self.last_draw_time = now
+        self.num_drawn = self.num_done
+
+        progress_line = self.format_progress(now - self.start_time)
+
+        if(self.is_in_place):
+
+            ## never wider than the terminal, a wrapped line can't be redrawn in place
+            progress_line = progress_line[:shutil.get_terminal_size().columns - 1]
+
+            sys.stdout.write("\r" + progress_line + "\x1b[K")
+
+            ProgressRenderer._drawn_renderer = self
+
+        else:
+            sys.stdout.write(progress_line + "\n")
+
+        sys.stdout.flush()
+
+##-------------------start-of-format_progress()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def format_progress(self, elapsed_time:float) -> str:
+
+        """
+
+        Parameters:
+        self (object - ProgressRenderer) : The ProgressRenderer object.
+        elapsed_time (float) : seconds since the renderer was created.
+
+        Returns:
+        progress_line (str) : i.e. "Kaiseki [#######-------] 512/1024 lines (50.0%) | 85.3 lines/s | ETA 00:06 | limit 8/16".
+
+        """
+
+        fraction_done = self.num_done / self.total if self.total > 0 else 1.0
+
+        num_filled = int(ProgressRenderer.bar_width * min(fraction_done, 1.0))
+
+        bar = "#" * num_filled + "-" * (ProgressRenderer.bar_width - num_filled)
+
+        rate = self.num_done / elapsed_time if elapsed_time > 0 else 0.0
+
+        if(self.num_done >= self.total):
+            eta = "done in " + ProgressRenderer.format_duration(elapsed_time)
+
+        elif(rate > 0):
+            eta = "ETA " + ProgressRenderer.format_duration((self.total - self.num_done) / rate)
+
+        else:
+            eta = "ETA --:--"
+
+        progress_line = f"{self.label} [{bar}] {self.num_done}/{self.total} {self.unit} ({round(fraction_done * 100, 1)}%) | {round(rate, 1)} {self.unit}/s | {eta}"
+
+        if(self.get_status is not None):
+            progress_line += " | " + self.get_status()
+
+        return progress_line
+
+##-------------------start-of-format_duration()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def format_duration(seconds:float) -> str:
+
+        """
+
+        Parameters:
+        seconds (float) : a duration in seconds.
+
+        Returns:
+        duration (str) : the duration as mm:ss, or h:mm:ss if it is an hour or more.
+
+        """
+
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+
+        if(hours > 0):
+            return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+        return f"{minutes:02d}:{seconds:02d}"
+
+##-------------------start-of-clear_line()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def clear_line() -> None:
+
+        """
+
+        Clears a bar drawn in place, so whatever is printed next starts on a clean line. The bar comes back on its next redraw.
+
+        """
+
+        if(ProgressRenderer._drawn_renderer is None):
+            return
+
+        sys.stdout.write("\r\x1b[K")
+        sys.stdout.flush()
+
+        ProgressRenderer._drawn_renderer = None
@@ -0,0 +1,133 @@
+## built-in libraries
+import asyncio
+import time
+import typing
+
+##-------------------start-of-RateLimiter--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class RateLimiter:
+
+    """
+
+    RateLimiter paces requests to stay under a requests per minute and a tokens per minute limit at the same time (a dual token bucket).
+    Each bucket holds up to a minute's worth of its limit and refills continuously, a request has to take one request and its estimated tokens before it is sent.
+    Once the real token usage is known the estimate is reconciled, so over-estimates are handed back and under-estimates are paid off by the next requests.
+
+    """
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self, requests_per_minute:typing.Optional[int], tokens_per_minute:typing.Optional[int]) -> None:
+
+        """
+
+        Parameters:
+        requests_per_minute (int | None) : the requests per minute limit, None for no limit.
+        tokens_per_minute (int | None) : the tokens per minute limit, None for no limit.
+
+        """
+
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        ## buckets start full, as the api's limits do
+        self.available_requests = float(requests_per_minute or 0)
+        self.available_tokens = float(tokens_per_minute or 0)
+
+        self.last_refill_time = time.monotonic()
+
+        ## total time requests spent waiting on the buckets, for the run summary
+        self.total_wait_time = 0.0
+
+        ## requests take their turn in order, so a big batch can't be starved by a stream of small ones
+        self._lock = asyncio.Lock()
+
+##-------------------start-of-refill()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def refill(self) -> None:
+
+        """
+
+        Tops both buckets up for the time passed since the last refill.
+
+        """
+
+        now = time.monotonic()
+        elapsed = now - self.last_refill_time
+        self.last_refill_time = now
+
+        if(self.requests_per_minute is not None):
+            self.available_requests = min(float(self.requests_per_minute), self.available_requests + elapsed * self.requests_per_minute / 60)
+
+        if(self.tokens_per_minute is not None):
+            self.available_tokens = min(float(self.tokens_per_minute), self.available_tokens + elapsed * self.tokens_per_minute / 60)
+
+##-------------------start-of-acquire()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    async def acquire(self, estimated_tokens:int) -> None:
+
+        """
+
+        Waits until both buckets can cover a request, then charges it.
+
+        Parameters:
+        estimated_tokens (int) : the estimated prompt plus completion tokens of the request.
+
+        """
+
+        if(self.requests_per_minute is None and self.tokens_per_minute is None):
+            return
+
+        ## a request bigger than a whole minute's tokens could never fit, so it only waits for a full bucket
+        if(self.tokens_per_minute is not None):
+            estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+
+        async with self._lock:
+
+            wait_start = time.monotonic()
+
+            while True:
+
+                self.refill()
+
+                wait_time = 0.0
+
+                if(self.requests_per_minute is not None and self.available_requests < 1):
+                    wait_time = max(wait_time, (1 - self.available_requests) * 60 / self.requests_per_minute)
+
+                if(self.tokens_per_minute is not None and self.available_tokens < estimated_tokens):
+                    wait_time = max(wait_time, (estimated_tokens - self.available_tokens) * 60 / self.tokens_per_minute)
+
+                if(wait_time <= 0):
+                    break
+
+                await asyncio.sleep(wait_time)
+
+            self.total_wait_time += time.monotonic() - wait_start
+
+            self.available_requests -= 1
+            self.available_tokens -= estimated_tokens
+
+##-------------------start-of-reconcile()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def reconcile(self, estimated_tokens:int, actual_tokens:int) -> None:
+
+        """
+
+        Corrects the token bucket once a request's real usage is known.
+
+        Parameters:
+        estimated_tokens (int) : the tokens the request was charged in acquire().
+        actual_tokens (int) : the tokens the api reports the request used.
+
+        """
+
+        if(self.tokens_per_minute is None):
+            return
+
+        estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+
+        self.refill()
+
+        ## can go negative, which is a debt the next requests wait out
+        self.available_tokens = min(float(self.tokens_per_minute), self.available_tokens + estimated_tokens - actual_tokens)
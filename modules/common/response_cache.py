@@ -0,0 +1,162 @@
+## built-in libraries
+import sqlite3
+import hashlib
+import json
+import time
+import typing
+
+## custom modules
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.sqlite_cache import SQLiteCache
+
+##-------------------start-of-ResponseCache--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class ResponseCache(SQLiteCache):
+
+    """
+
+    ResponseCache is a persistent, content-addressed cache of Kijiku batch translations.
+    Each response is keyed by a hash of everything that can change what the API returns (model, messages, and sampling settings), so re-running the same text with the same settings never pays for a batch twice.
+    The connection, size cap and eviction are shared with the fragment cache, see SQLiteCache.
+
+    """
+
+    ## 256 MB by default, more than enough for several series worth of batches
+    max_size_bytes = 256 * 1024 * 1024
+
+    cache_name = "Response cache"
+    entry_name = "responses"
+
+    table_name = "responses"
+
+    table_columns = "key TEXT NOT NULL, model TEXT NOT NULL, response TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, last_accessed REAL NOT NULL"
+    key_columns = ("key",)
+
+##-------------------start-of-get_database_path()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def get_database_path(cls) -> str:
+
+        """
+
+        Returns:
+        database_path (str) : the path to the response cache's database.
+
+        """
+
+        return FileEnsurer.kijiku_response_cache_path
+
+##-------------------start-of-generate_key()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def generate_key(request_components:dict) -> str:
+
+        """
+
+        Generates the cache key for a request.
+
+        Parameters:
+        request_components (dict) : everything that can affect the response, i.e. the model, the messages, and the sampling settings.
+
+        Returns:
+        key (str) : the sha256 hex digest of the request components.
+
+        """
+
+        serialized_components = json.dumps(request_components, sort_keys=True, ensure_ascii=False)
+
+        return hashlib.sha256(serialized_components.encode('utf-8')).hexdigest()
+
+##-------------------start-of-get()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get(key:str) -> typing.Optional[str]:
+
+        """
+
+        Fetches a response from the cache, marking it as recently used.
+
+        Parameters:
+        key (str) : the cache key, see generate_key().
+
+        Returns:
+        response (str | None) : the cached response, or None if there is no such entry or the cache is disabled.
+
+        """
+
+        if(not ResponseCache.is_enabled):
+            return None
+
+        with ResponseCache._lock:
+
+            connection = ResponseCache.get_connection()
+
+            row = connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if(row is None):
+                ResponseCache.num_misses += 1
+                return None
+
+            connection.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+
+            ResponseCache.num_hits += 1
+
+            return row[0]
+
+##-------------------start-of-put()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def put(key:str, model:str, response:str) -> None:
+
+        """
+
+        Stores a response in the cache, then evicts the least recently used entries if the cache is over its size cap.
+
+        Parameters:
+        key (str) : the cache key, see generate_key().
+        model (str) : the model that generated the response.
+        response (str) : the response to store.
+
+        """
+
+        if(not ResponseCache.is_enabled):
+            return
+
+        size = len(response.encode('utf-8'))
+        timestamp = time.time()
+
+        with ResponseCache._lock:
+
+            connection = ResponseCache.get_connection()
+
+            ## a response replacing one already cached only adds the difference
+            replaced_row = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+
+            ResponseCache._total_size += size - (replaced_row[0] if replaced_row is not None else 0)
+
+            connection.execute("INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, size, timestamp, timestamp))
+            connection.commit()
+
+            ResponseCache.evict_least_recently_used()
+
+##-------------------start-of-get_extra_stats()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def get_extra_stats(cls, connection:sqlite3.Connection) -> str:
+
+        """
+
+        Adds how many responses are cached for each model to the summary.
+
+        Parameters:
+        connection (object - sqlite3.Connection) : the connection to the cache database.
+
+        Returns:
+        extra_stats (str) : a line per model.
+
+        """
+
+        per_model = connection.execute("SELECT model, COUNT(*) FROM responses GROUP BY model ORDER BY COUNT(*) DESC").fetchall()
+
+        return "".join("\n    " + model + " : " + str(count) for model, count in per_model)
@@ -0,0 +1,264 @@
+## built-in libraries
+import sqlite3
+import typing
+import threading
+
+## custom modules
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.logger import Logger
+
+##-------------------start-of-SQLiteCache--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class SQLiteCache:
+
+    """
+
+    SQLiteCache is what Kijiku's response cache and Kaiseki's fragment cache have in common: a table in an SQLite database under KudasaiConfig, capped in size, evicting the least recently used entries first.
+    Each cache only gives its table's columns and key, and its own lookups and stores. The connection, size tracking, eviction, stats, purging and locking live here.
+    Every entry's table must have a size column (the bytes it counts against the cap) and a last_accessed column.
+
+    """
+
+    max_size_bytes = 0
+
+    is_enabled = True
+
+    ## evicting frees a tenth of the cap at once, so a full cache doesn't evict on every put
+    eviction_target_ratio = 0.9
+
+    ## set by each cache, i.e. "Response cache" and "responses"
+    cache_name = ""
+    entry_name = ""
+
+    table_name = ""
+
+    ## the table's column definitions, and the columns making up its primary key
+    table_columns = ""
+    key_columns:typing.Tuple[str, ...] = ()
+
+    ## for the current session, each cache gets its own (see __init_subclass__())
+    num_hits = 0
+    num_misses = 0
+    num_evicted = 0
+
+    ## the size of every entry, worked out when the database is opened and after evicting, and kept up to date in between
+    _total_size = 0
+
+    _connection:typing.Optional[sqlite3.Connection] = None
+
+    ## the webgui calls into the caches from worker threads, so all access goes through the cache's lock
+    _lock = threading.Lock()
+
+##-------------------start-of-__init_subclass__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init_subclass__(cls, **kwargs) -> None:
+
+        """
+
+        Gives each cache its own connection, lock and counters.
+
+        """
+
+        super().__init_subclass__(**kwargs)
+
+        cls.num_hits = 0
+        cls.num_misses = 0
+        cls.num_evicted = 0
+
+        cls._total_size = 0
+        cls._connection = None
+        cls._lock = threading.Lock()
+
+##-------------------start-of-get_database_path()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def get_database_path(cls) -> str:
+
+        """
+
+        Returns:
+        database_path (str) : the path to the cache's database, set by each cache.
+
+        """
+
+        raise NotImplementedError
+
+##-------------------start-of-get_connection()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def get_connection(cls) -> sqlite3.Connection:
+
+        """
+
+        Returns the connection to the cache database, creating the database and its table if needed.
+
+        Returns:
+        connection (object - sqlite3.Connection) : the connection to the cache database.
+
+        """
+
+        if(cls._connection is None):
+
+            FileEnsurer.standard_create_directory(FileEnsurer.config_dir)
+
+            cls._connection = sqlite3.connect(cls.get_database_path(), check_same_thread=False)
+
+            cls._connection.execute(f"CREATE TABLE IF NOT EXISTS {cls.table_name} ({cls.table_columns}, PRIMARY KEY ({', '.join(cls.key_columns)}))")
+
+            cls._connection.execute(f"CREATE INDEX IF NOT EXISTS {cls.table_name}_last_accessed ON {cls.table_name} (last_accessed)")
+            cls._connection.commit()
+
+            cls.sync_total_size()
+
+        return cls._connection
+
+##-------------------start-of-sync_total_size()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def sync_total_size(cls) -> None:
+
+        """
+
+        Counts the size of every entry in the database, only done when it is opened and after evicting as it reads the whole table.
+        Expects the caller to hold the cache's lock, or to be opening the database.
+
+        """
+
+        cls._total_size = typing.cast(sqlite3.Connection, cls._connection).execute(f"SELECT COALESCE(SUM(size), 0) FROM {cls.table_name}").fetchone()[0]
+
+##-------------------start-of-evict_least_recently_used()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def evict_least_recently_used(cls) -> None:
+
+        """
+
+        Deletes the least recently used entries once the cache is over its size cap, until it is down to eviction_target_ratio of it.
+        Expects the caller to hold the cache's lock.
+
+        """
+
+        if(cls._total_size <= cls.max_size_bytes):
+            return
+
+        connection = cls.get_connection()
+
+        target_size = cls.max_size_bytes * cls.eviction_target_ratio
+
+        total_size = cls._total_size
+
+        keys_to_evict = []
+
+        for row in connection.execute(f"SELECT {', '.join(cls.key_columns)}, size FROM {cls.table_name} ORDER BY last_accessed ASC"):
+
+            if(total_size <= target_size):
+                break
+
+            keys_to_evict.append(row[:-1])
+            total_size -= row[-1]
+
+        connection.executemany(f"DELETE FROM {cls.table_name} WHERE " + " AND ".join(column + " = ?" for column in cls.key_columns), keys_to_evict)
+        connection.commit()
+
+        cls.sync_total_size()
+
+        cls.num_evicted += len(keys_to_evict)
+
+        Logger.log_action("Evicted " + str(len(keys_to_evict)) + " least recently used " + cls.entry_name + " from the " + cls.cache_name.lower() + ".")
+
+##-------------------start-of-get_stats()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def get_stats(cls) -> str:
+
+        """
+
+        Builds a human-readable summary of the cache.
+
+        Returns:
+        stats (str) : the summary of the cache.
+
+        """
+
+        with cls._lock:
+
+            connection = cls.get_connection()
+
+            num_entries = connection.execute(f"SELECT COUNT(*) FROM {cls.table_name}").fetchone()[0]
+
+            extra_stats = cls.get_extra_stats(connection)
+
+        num_lookups = cls.num_hits + cls.num_misses
+
+        stats = cls.cache_name + " location : " + cls.get_database_path()
+        stats += "\nCached " + cls.entry_name + " : " + str(num_entries)
+        stats += "\nCache size : " + str(round(cls._total_size / (1024 * 1024), 2)) + " MB of " + str(round(cls.max_size_bytes / (1024 * 1024), 2)) + " MB"
+        stats += "\nHits this session : " + str(cls.num_hits) + " (" + str(round(cls.num_hits / num_lookups * 100, 1) if num_lookups > 0 else 0.0) + "%)"
+        stats += "\nMisses this session : " + str(cls.num_misses)
+        stats += "\nEvicted this session : " + str(cls.num_evicted)
+
+        return stats + extra_stats
+
+##-------------------start-of-get_extra_stats()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def get_extra_stats(cls, connection:sqlite3.Connection) -> str:
+
+        """
+
+        Lets a cache add its own lines to the summary, called with the cache's lock held.
+
+        Parameters:
+        connection (object - sqlite3.Connection) : the connection to the cache database.
+
+        Returns:
+        extra_stats (str) : the lines to add, each starting with a newline.
+
+        """
+
+        return ""
+
+##-------------------start-of-purge()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def purge(cls) -> None:
+
+        """
+
+        Deletes every entry in the cache and shrinks the database file.
+
+        """
+
+        with cls._lock:
+
+            connection = cls.get_connection()
+
+            connection.execute(f"DELETE FROM {cls.table_name}")
+            connection.commit()
+
+            connection.execute("VACUUM")
+
+            cls._total_size = 0
+
+        cls.num_hits = 0
+        cls.num_misses = 0
+        cls.num_evicted = 0
+
+        Logger.log_action(cls.cache_name + " at " + cls.get_database_path() + " was purged.")
+
+##-------------------start-of-close()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def close(cls) -> None:
+
+        """
+
+        Closes the connection to the cache database, if one is open.
+
+        """
+
+        with cls._lock:
+
+            if(cls._connection is not None):
+                cls._connection.close()
+                cls._connection = None
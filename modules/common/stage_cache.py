@@ -0,0 +1,240 @@
+## built-in libraries
+import hashlib
+import json
+import os
+import typing
+
+## custom modules
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.logger import Logger
+
+##-------------------start-of-StageCache--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class StageCache:
+
+    """
+
+    StageCache remembers the results of Kairyou's preprocessing and indexing, keyed by a hash of everything that went into the stage (the text, the replacement json, the knowledge base and the Kairyou version).
+    Running a stage again on the same inputs, which is common when only the translation settings changed, restores its results from disk instead of redoing the work.
+    Each result is a json file in the stage_cache folder next to the output folder, and only the max_entries most recently used are kept.
+
+    """
+
+    max_entries = 32
+
+    is_enabled = True
+
+    ## bumped whenever what a stage stores changes, so older entries are never read as the new format
+    format_version = 1
+
+    _kairyou_version:typing.Optional[str] = None
+
+##-------------------start-of-get_kairyou_version()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_kairyou_version() -> str:
+
+        """
+
+        Returns:
+        kairyou_version (str) : the installed Kairyou version, part of every key as a new version may preprocess differently.
+
+        """
+
+        if(StageCache._kairyou_version is None):
+
+            ## only imported here as it is slow to import and startup never needs it
+            import importlib.metadata
+
+            try:
+                StageCache._kairyou_version = importlib.metadata.version("kairyou")
+
+            except importlib.metadata.PackageNotFoundError:
+                StageCache._kairyou_version = "unknown"
+
+        return StageCache._kairyou_version
+
+##-------------------start-of-fingerprint_source()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def fingerprint_source(source:typing.Union[str, typing.List[str]]) -> str:
+
+        """
+
+        Hashes a source that can be given as text, a path to a txt file, a path to a directory of txt files or a list of paths to txt files (i.e. the indexer's knowledge base), by its contents rather than its path.
+
+        Parameters:
+        source (str | list - str) : the text, file path, directory path or list of file paths.
+
+        Returns:
+        fingerprint (str) : the sha256 hex digest of the source's contents.
+
+        """
+
+        source_hash = hashlib.sha256()
+
+        if(isinstance(source, list)):
+
+            for file_path in source:
+
+                with open(file_path, 'rb') as file:
+                    source_hash.update(hashlib.sha256(file.read()).digest())
+
+        elif(os.path.isfile(source)):
+
+            with open(source, 'rb') as file:
+                source_hash.update(file.read())
+
+        elif(os.path.isdir(source)):
+
+            for file_name in sorted(os.listdir(source)):
+
+                file_path = os.path.join(source, file_name)
+
+                if(not os.path.isfile(file_path)):
+                    continue
+
+                source_hash.update(file_name.encode('utf-8'))
+
+                with open(file_path, 'rb') as file:
+                    source_hash.update(hashlib.sha256(file.read()).digest())
+
+        else:
+            source_hash.update(source.encode('utf-8'))
+
+        return source_hash.hexdigest()
+
+##-------------------start-of-get_entry_path()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_entry_path(stage:str, stage_inputs:typing.List[typing.Any]) -> str:
+
+        """
+
+        Parameters:
+        stage (str) : the stage, i.e. "preprocess" or "index".
+        stage_inputs (list - any) : everything that went into the stage, json serializable.
+
+        Returns:
+        entry_path (str) : the path the stage's results for these inputs are stored at.
+
+        """
+
+        serialized_inputs = json.dumps([StageCache.format_version, StageCache.get_kairyou_version(), stage, stage_inputs], sort_keys=True, ensure_ascii=False)
+
+        return os.path.join(FileEnsurer.stage_cache_dir, stage + "-" + hashlib.sha256(serialized_inputs.encode('utf-8')).hexdigest() + ".json")
+
+##-------------------start-of-get()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get(stage:str, stage_inputs:typing.List[typing.Any]) -> typing.Optional[typing.Dict[str, str]]:
+
+        """
+
+        Fetches a stage's results for the given inputs, marking them as recently used.
+
+        Parameters:
+        stage (str) : the stage, i.e. "preprocess" or "index".
+        stage_inputs (list - any) : everything that went into the stage, json serializable.
+
+        Returns:
+        stage_outputs (dict - str, str | None) : the stage's results, or None if they aren't cached or the cache is disabled.
+
+        """
+
+        if(not StageCache.is_enabled):
+            return None
+
+        entry_path = StageCache.get_entry_path(stage, stage_inputs)
+
+        if(not os.path.exists(entry_path)):
+            return None
+
+        try:
+
+            with open(entry_path, 'r', encoding='utf-8') as file:
+                stage_outputs = json.load(file)
+
+            os.utime(entry_path)
+
+        ## a damaged entry is just a miss, it'll be written again once the stage has run
+        except (OSError, json.JSONDecodeError):
+            Logger.log_action("Could not read stage cache entry " + entry_path + ", running the stage again.")
+            return None
+
+        return stage_outputs
+
+##-------------------start-of-put()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def put(stage:str, stage_inputs:typing.List[typing.Any], stage_outputs:typing.Dict[str, str]) -> None:
+
+        """
+
+        Stores a stage's results for the given inputs, then deletes the least recently used entries if there are more than max_entries.
+
+        Parameters:
+        stage (str) : the stage, i.e. "preprocess" or "index".
+        stage_inputs (list - any) : everything that went into the stage, json serializable.
+        stage_outputs (dict - str, str) : the stage's results.
+
+        """
+
+        if(not StageCache.is_enabled):
+            return
+
+        FileEnsurer.standard_create_directory(FileEnsurer.stage_cache_dir)
+
+        entry_path = StageCache.get_entry_path(stage, stage_inputs)
+
+        ## written to the side first, so an interrupted write never leaves a half written entry behind
+        temporary_path = entry_path + ".tmp"
+
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(stage_outputs, file, ensure_ascii=False)
+
+        os.replace(temporary_path, entry_path)
+
+        StageCache.evict_least_recently_used()
+
+##-------------------start-of-evict_least_recently_used()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def evict_least_recently_used() -> None:
+
+        """
+
+        Deletes the least recently used entries until there are max_entries left.
+
+        """
+
+        entry_paths = [os.path.join(FileEnsurer.stage_cache_dir, file_name) for file_name in os.listdir(FileEnsurer.stage_cache_dir) if file_name.endswith(".json")]
+
+        if(len(entry_paths) <= StageCache.max_entries):
+            return
+
+        entry_paths.sort(key=os.path.getmtime)
+
+        for entry_path in entry_paths[:len(entry_paths) - StageCache.max_entries]:
+            os.remove(entry_path)
+
+        Logger.log_action("Evicted " + str(len(entry_paths) - StageCache.max_entries) + " least recently used entries from the stage cache.")
+
+##-------------------start-of-purge()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def purge() -> None:
+
+        """
+
+        Deletes every entry in the stage cache.
+
+        """
+
+        if(not os.path.isdir(FileEnsurer.stage_cache_dir)):
+            return
+
+        for file_name in os.listdir(FileEnsurer.stage_cache_dir):
+            os.remove(os.path.join(FileEnsurer.stage_cache_dir, file_name))
+
+        Logger.log_action("Stage cache at " + FileEnsurer.stage_cache_dir + " was purged.")
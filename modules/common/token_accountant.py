@@ -0,0 +1,388 @@
+## built-in libraries
+import hashlib
+import math
+import os
+import re
+import shutil
+import threading
+import typing
+
+## third-party libraries
+import tiktoken
+
+## custom modules
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.logger import Logger
+
+##-------------------start-of-TokenAccountant--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class TokenAccountant:
+
+    """
+
+    TokenAccountant counts tokens for batch packing and cost estimates without re-encoding text it has already seen.
+    Encoders are loaded once per model, and token counts are kept per line for each encoding, so estimating again after the text or the settings change only encodes the lines that are new.
+    Shared between all translation jobs, as a line's token count never changes.
+    Encodings are only ever read from the local cache, if one isn't there an ApproximateEncoding is used instead while the real one is fetched in the background and swapped in once it arrives, so nothing waits on the network.
+
+    """
+
+    ## every message costs a few tokens on top of its content for its role and separators, and every reply is primed with a few more
+    ## see https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+    tokens_per_message = 3
+    tokens_per_reply = 3
+
+    ## the counts are dropped once there are this many, so a long lived webgui doesn't grow forever
+    max_cached_counts = 500000
+
+    ## where tiktoken downloads each encoding from, its cache files are named after the sha1 of this
+    encoding_url = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+    _encodings:typing.Dict[str, typing.Union[tiktoken.Encoding, "ApproximateEncoding"]] = {}
+
+    _is_cache_ready = False
+
+    ## encodings already being fetched in the background
+    _fetching_encodings:typing.Set[str] = set()
+
+    ## (encoding name, text) -> number of tokens
+    _token_counts:typing.Dict[typing.Tuple[str, str], int] = {}
+
+##-------------------start-of-get_encoding()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_encoding(model:str) -> typing.Union[tiktoken.Encoding, "ApproximateEncoding"]:
+
+        """
+
+        Gets the encoding a model uses, loading it only the first time.
+
+        Parameters:
+        model (str) : the model.
+
+        Returns:
+        encoding (tiktoken.Encoding | ApproximateEncoding) : the model's encoding, or an approximation of it if it isn't in the local cache.
+
+        """
+
+        if(model not in TokenAccountant._encodings):
+            TokenAccountant._encodings[model] = TokenAccountant.load_encoding(model)
+
+        return TokenAccountant._encodings[model]
+
+##-------------------start-of-load_encoding()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def load_encoding(model:str) -> typing.Union[tiktoken.Encoding, "ApproximateEncoding"]:
+
+        """
+
+        Loads a model's encoding from the local cache, never from the network.
+
+        Parameters:
+        model (str) : the model.
+
+        Returns:
+        encoding (tiktoken.Encoding | ApproximateEncoding) : the model's encoding, or an approximation of it if it isn't cached yet.
+
+        """
+
+        TokenAccountant.prepare_cache()
+
+        encoding_name = TokenAccountant.get_encoding_name(model)
+
+        if(TokenAccountant.is_encoding_cached(encoding_name)):
+            return tiktoken.get_encoding(encoding_name)
+
+        Logger.log_action(f"The {encoding_name} encoding isn't in {os.environ['TIKTOKEN_CACHE_DIR']} yet, token counts will be approximate until it is.", output=True)
+
+        TokenAccountant.fetch_encoding_in_background(encoding_name)
+
+        return ApproximateEncoding()
+
+##-------------------start-of-get_encoding_name()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_encoding_name(model:str) -> str:
+
+        """
+
+        Parameters:
+        model (str) : the model.
+
+        Returns:
+        encoding_name (str) : the name of the encoding the model uses, i.e. cl100k_base.
+
+        """
+
+        try:
+            return tiktoken.encoding_name_for_model(model)
+
+        ## newer models than the installed tiktoken knows of
+        except KeyError:
+            return "cl100k_base"
+
+##-------------------start-of-prepare_cache()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def prepare_cache() -> None:
+
+        """
+
+        Points tiktoken at the local cache, and files any <encoding name>.tiktoken files placed there under the names tiktoken looks for.
+
+        """
+
+        if(TokenAccountant._is_cache_ready):
+            return
+
+        ## a cache directory the user set themselves wins
+        os.environ.setdefault("TIKTOKEN_CACHE_DIR", FileEnsurer.tiktoken_cache_dir)
+
+        cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+
+        if(cache_dir != ""):
+
+            os.makedirs(cache_dir, exist_ok=True)
+
+            for file_name in os.listdir(cache_dir):
+
+                if(not file_name.endswith(".tiktoken")):
+                    continue
+
+                cache_path = TokenAccountant.get_cache_path(file_name[:-len(".tiktoken")])
+
+                if(not os.path.exists(cache_path)):
+                    shutil.copyfile(os.path.join(cache_dir, file_name), cache_path)
+                    Logger.log_action(f"Seeded the tiktoken cache with {file_name}.")
+
+        TokenAccountant._is_cache_ready = True
+
+##-------------------start-of-get_cache_path()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_cache_path(encoding_name:str) -> str:
+
+        """
+
+        Parameters:
+        encoding_name (str) : the encoding's name, i.e. cl100k_base.
+
+        Returns:
+        cache_path (str) : where tiktoken keeps the encoding in its cache.
+
+        """
+
+        return os.path.join(os.environ["TIKTOKEN_CACHE_DIR"], hashlib.sha1(TokenAccountant.encoding_url.format(encoding_name).encode()).hexdigest())
+
+##-------------------start-of-is_encoding_cached()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def is_encoding_cached(encoding_name:str) -> bool:
+
+        """
+
+        Parameters:
+        encoding_name (str) : the encoding's name, i.e. cl100k_base.
+
+        Returns:
+        is_cached (bool) : whether the encoding can be loaded without the network.
+
+        """
+
+        return os.environ["TIKTOKEN_CACHE_DIR"] != "" and os.path.exists(TokenAccountant.get_cache_path(encoding_name))
+
+##-------------------start-of-fetch_encoding_in_background()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def fetch_encoding_in_background(encoding_name:str) -> None:
+
+        """
+
+        Downloads an encoding into the local cache on a background thread. Once it's there, the models approximating it switch to the real one, so a long lived webgui counts exactly from then on. Failing (i.e. without internet access) is fine.
+
+        Parameters:
+        encoding_name (str) : the encoding's name, i.e. cl100k_base.
+
+        """
+
+        if(encoding_name in TokenAccountant._fetching_encodings):
+            return
+
+        TokenAccountant._fetching_encodings.add(encoding_name)
+
+        def fetch() -> None:
+
+            try:
+                tiktoken.get_encoding(encoding_name)
+                Logger.log_action(f"Fetched the {encoding_name} encoding into the tiktoken cache.")
+
+                ## dropped rather than replaced here, get_encoding() then loads the real encoding from the cache the next time each model is counted
+                for model, encoding in list(TokenAccountant._encodings.items()):
+                    if(isinstance(encoding, ApproximateEncoding) and TokenAccountant.get_encoding_name(model) == encoding_name):
+                        TokenAccountant._encodings.pop(model, None)
+
+            except Exception as e:
+                Logger.log_action(f"Could not fetch the {encoding_name} encoding ({e}), place {encoding_name}.tiktoken in {os.environ['TIKTOKEN_CACHE_DIR']} to count tokens exactly.")
+
+        threading.Thread(target=fetch, daemon=True).start()
+
+##-------------------start-of-count_tokens()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_tokens(text:str, model:str) -> int:
+
+        """
+
+        Counts the tokens in a piece of text, only encoding it if it hasn't been counted before.
+
+        Parameters:
+        text (str) : the text to count.
+        model (str) : the model whose encoding to count with.
+
+        Returns:
+        num_tokens (int) : the number of tokens in the text.
+
+        """
+
+        encoding = TokenAccountant.get_encoding(model)
+
+        key = (encoding.name, text)
+
+        num_tokens = TokenAccountant._token_counts.get(key)
+
+        if(num_tokens is None):
+
+            if(len(TokenAccountant._token_counts) >= TokenAccountant.max_cached_counts):
+                TokenAccountant._token_counts.clear()
+
+            num_tokens = len(encoding.encode(text))
+
+            TokenAccountant._token_counts[key] = num_tokens
+
+        return num_tokens
+
+##-------------------start-of-count_lines_tokens()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_lines_tokens(lines:typing.List[str], model:str) -> int:
+
+        """
+
+        Counts the tokens in a text line by line, so lines seen before cost nothing to count.
+
+        Parameters:
+        lines (list - str) : the lines of the text, without newlines.
+        model (str) : the model whose encoding to count with.
+
+        Returns:
+        num_tokens (int) : the number of tokens in the text.
+
+        """
+
+        return sum(TokenAccountant.count_tokens(line + '\n', model) for line in lines)
+
+##-------------------start-of-count_messages_tokens()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_messages_tokens(messages:typing.List[typing.Any], model:str) -> int:
+
+        """
+
+        Counts the prompt tokens of a request, including the overhead of each message and of priming the reply.
+
+        Parameters:
+        messages (list - SystemTranslationMessage | ModelTranslationMessage) : the messages of the request.
+        model (str) : the model whose encoding to count with.
+
+        Returns:
+        num_tokens (int) : the number of prompt tokens the request costs.
+
+        """
+
+        num_tokens = TokenAccountant.tokens_per_reply
+
+        for message in messages:
+            num_tokens += TokenAccountant.tokens_per_message + TokenAccountant.count_tokens(message["role"], model) + TokenAccountant.count_tokens(message["content"], model)
+
+        return num_tokens
+
+##-------------------start-of-count_batches_tokens()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_batches_tokens(translation_batches:typing.List[typing.Any], model:str) -> typing.Tuple[int, int]:
+
+        """
+
+        Counts the tokens of every batch that will be sent.
+
+        Parameters:
+        translation_batches (list - SystemTranslationMessage | ModelTranslationMessage) : the batches, as Kijiku builds them (system message, prompt, system message, prompt, ...).
+        model (str) : the model whose encoding to count with.
+
+        Returns:
+        num_input_tokens (int) : the prompt tokens of every request, system messages and overhead included.
+        num_text_tokens (int) : the tokens of the text in the prompts alone, roughly what the translations will cost.
+
+        """
+
+        num_input_tokens = 0
+        num_text_tokens = 0
+
+        for i in range(0, len(translation_batches) - 1, 2):
+            num_input_tokens += TokenAccountant.count_messages_tokens([translation_batches[i], translation_batches[i+1]], model)
+            num_text_tokens += TokenAccountant.count_tokens(translation_batches[i+1]["content"], model)
+
+        return num_input_tokens, num_text_tokens
+
+##-------------------start-of-ApproximateEncoding--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class ApproximateEncoding:
+
+    """
+
+    A fast stand-in for a tiktoken encoding, for when the real one isn't available.
+    Japanese text costs about a token per kana and a bit more per kanji, while latin text costs about a token per four letters. Errs on the high side, so batches packed with it still fit.
+
+    """
+
+    name = "approximate"
+
+    ## ascii letters and digits are counted by the run, everything else per character
+    latin_run_pattern = re.compile(r'[A-Za-z0-9]+')
+    kanji_pattern = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]')
+
+    tokens_per_kanji = 1.5
+    chars_per_latin_token = 4
+
+##-------------------start-of-encode()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def encode(self, text:str) -> typing.List[int]:
+
+        """
+
+        Approximates encoding a piece of text, only the length of the result is meaningful.
+
+        Parameters:
+        text (str) : the text to encode.
+
+        Returns:
+        tokens (list - int) : placeholder tokens, as many as the text is estimated to cost.
+
+        """
+
+        num_tokens = 0.0
+
+        for latin_run in ApproximateEncoding.latin_run_pattern.findall(text):
+            num_tokens += math.ceil(len(latin_run) / ApproximateEncoding.chars_per_latin_token)
+
+        remaining_text = ApproximateEncoding.latin_run_pattern.sub("", text)
+
+        num_kanji = len(ApproximateEncoding.kanji_pattern.findall(remaining_text))
+
+        ## spaces mostly merge into the token after them
+        num_other_chars = len(remaining_text) - num_kanji - remaining_text.count(" ")
+
+        num_tokens += num_kanji * ApproximateEncoding.tokens_per_kanji + num_other_chars
+
+        return [0] * math.ceil(num_tokens)
@@ -1,7 +1,10 @@
 ## built-in libraries
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import os
+import json
+import time
 import typing
 import platform
 import subprocess
@@ -15,6 +18,10 @@ class Toolkit():
 
     CURRENT_VERSION = "v3.3.2"
 
+    ## how long the update check waits on github, and how long a successful check is reused for
+    update_check_timeout = 3.0
+    update_check_ttl = 21600
+
 ##-------------------start-of-clear_console()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -163,11 +170,15 @@ class Toolkit():
 ##-------------------start-of-check_update()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    def check_update() -> typing.Tuple[bool, str]:
+    def check_update(cache_path:str | None = None) -> typing.Tuple[bool, str]:
 
         """
 
         Determines if Kudasai has a new latest release, and confirms if an internet connection is present or not.
+        Gives up after a few seconds, and reuses a recent successful check if one is cached, so it never holds up startup for long.
+
+        Parameters:
+        cache_path (str | None | optional) : where to cache the result of a successful check, None to not cache it.
 
         Returns:
         is_connection (bool) : Whether or not the user has an internet connection.
@@ -178,13 +189,26 @@ class Toolkit():
         update_prompt = ""
         is_connection = True
 
+        if(cache_path is not None and os.path.exists(cache_path)):
+
+            try:
+
+                with open(cache_path, "r", encoding="utf-8") as file:
+                    cached_check = json.load(file)
+
+                if(time.time() - cached_check["time"] < Toolkit.update_check_ttl and cached_check["version"] == Toolkit.CURRENT_VERSION):
+                    return is_connection, cached_check["update_prompt"]
+
+            ## a broken cache is just checked again
+            except Exception:
+                pass
+
         try:
 
             from urllib.request import urlopen
-            import json
             from distutils.version import LooseVersion
 
-            response = urlopen("https://api.github.com/repos/Bikatr7/Kudasai/releases/latest")
+            response = urlopen("https://api.github.com/repos/Bikatr7/Kudasai/releases/latest", timeout=Toolkit.update_check_timeout)
             data = json.loads(response.read().decode())
 
             latest_version = str(data["tag_name"])
@@ -197,19 +221,51 @@ class Toolkit():
                 if(release_notes):
                     update_prompt += "\nRelease notes:\n\n" + release_notes + '\n'
 
+            if(cache_path is not None):
+
+                try:
+
+                    with open(cache_path, "w", encoding="utf-8") as file:
+                        json.dump({"time": time.time(), "version": Toolkit.CURRENT_VERSION, "update_prompt": update_prompt}, file)
+
+                except OSError:
+                    pass
+
             return is_connection, update_prompt
 
         ## used to determine if user lacks an internet connection.
         except:
 
-            print("You seem to lack an internet connection, this will prevent you from checking from update notification and machine translation.\n")
-
-            Toolkit.pause_console()
-
             is_connection = False
 
             return is_connection, update_prompt
 
+##-------------------start-of-start_update_check()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def start_update_check(cache_path:str | None = None) -> Future:
+
+        """
+
+        Runs check_update() in the background, so it can happen while Kudasai is doing other things.
+
+        Parameters:
+        cache_path (str | None | optional) : where to cache the result of a successful check, None to not cache it.
+
+        Returns:
+        update_check (Future) : resolves to check_update()'s result.
+
+        """
+
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        update_check = executor.submit(Toolkit.check_update, cache_path)
+
+        ## lets the thread exit once the check is done, without waiting on it here
+        executor.shutdown(wait=False)
+
+        return update_check
+
 ##-------------------start-of-get_timestamp()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
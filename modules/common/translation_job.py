@@ -0,0 +1,222 @@
+## built-in libraries
+import contextvars
+import copy
+import itertools
+import types
+import typing
+
+##-------------------start-of-TranslationJob--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class TranslationJob:
+
+    """
+
+    TranslationJob holds the state of a single translation run, so several runs can go at once in one process (i.e. several users of the webgui).
+    Classes built with JobScoped keep their class attributes (text, batches, settings, api client, log, etc.) on the active job instead of on the class, so each run only ever sees its own.
+    A job is active inside its with block, as well as in every task started from there, since asyncio copies the context into new tasks.
+    Outside of a job the class attributes are used directly, exactly as before.
+
+    """
+
+    ## the jobs currently running, oldest first
+    active_jobs:typing.List["TranslationJob"] = []
+
+    _current_job:contextvars.ContextVar[typing.Optional["TranslationJob"]] = contextvars.ContextVar("current_translation_job", default=None)
+
+    _job_ids = itertools.count(1)
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self, owner:typing.Optional[str]=None) -> None:
+
+        """
+
+        Parameters:
+        owner (str | None) : what started the job, i.e. a webgui session's tab, so the job can be found again to interrupt it or show its log.
+
+        """
+
+        self.job_id = next(TranslationJob._job_ids)
+
+        self.owner = owner
+
+        ## whether the job's with block is still running
+        self.is_running = False
+
+        ## class -> attribute name -> the job's value
+        self.state:typing.Dict[type, typing.Dict[str, typing.Any]] = {}
+
+        self._token:typing.Optional[contextvars.Token] = None
+
+##-------------------start-of-__enter__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __enter__(self) -> "TranslationJob":
+
+        """
+
+        Makes the job the active one for the current context.
+
+        """
+
+        self._token = TranslationJob._current_job.set(self)
+
+        TranslationJob.active_jobs.append(self)
+
+        self.is_running = True
+
+        return self
+
+##-------------------start-of-__exit__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __exit__(self, *args) -> None:
+
+        """
+
+        Ends the job, dropping its state so its text and results can be reclaimed.
+
+        """
+
+        if(self._token is not None):
+            TranslationJob._current_job.reset(self._token)
+
+        TranslationJob.active_jobs.remove(self)
+
+        self.is_running = False
+
+        self.state.clear()
+
+##-------------------start-of-get_current()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_current() -> typing.Optional["TranslationJob"]:
+
+        """
+
+        Returns:
+        job (TranslationJob | None) : the job active in the current context, if any.
+
+        """
+
+        return TranslationJob._current_job.get()
+
+##-------------------start-of-get_owned_by()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def get_owned_by(owner:str) -> typing.Optional["TranslationJob"]:
+
+        """
+
+        Parameters:
+        owner (str) : what started the job.
+
+        Returns:
+        job (TranslationJob | None) : the most recently started running job with that owner, if any.
+
+        """
+
+        for job in reversed(TranslationJob.active_jobs):
+            if(job.owner == owner):
+                return job
+
+        return None
+
+##-------------------start-of-get_value()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def get_value(self, cls:type, name:str, default:typing.Any=None) -> typing.Any:
+
+        """
+
+        Reads one of the job's values from outside the job, i.e. for showing a running job's log.
+
+        Parameters:
+        cls (type) : the class the attribute belongs to.
+        name (str) : the attribute's name.
+        default (any) : returned if the job hasn't touched the attribute yet.
+
+        Returns:
+        value (any) : the job's value for the attribute.
+
+        """
+
+        return self.state.get(cls, {}).get(name, default)
+
+##-------------------start-of-set_value()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def set_value(self, cls:type, name:str, value:typing.Any) -> None:
+
+        """
+
+        Sets one of the job's values from outside the job, i.e. for interrupting a running job.
+
+        Parameters:
+        cls (type) : the class the attribute belongs to.
+        name (str) : the attribute's name.
+        value (any) : the job's new value for the attribute.
+
+        """
+
+        self.state.setdefault(cls, {})[name] = value
+
+##-------------------start-of-JobScoped--------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class JobScoped(type):
+
+    """
+
+    Metaclass that makes a static class's data attributes per job, see TranslationJob.
+    Every class attribute that isn't a method is scoped, a job gets its own copy of the class's value the first time it reads it.
+    Attributes named in a class's _job_shared_attributes are left shared between all jobs.
+
+    """
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(cls, name:str, bases:tuple, namespace:dict) -> None:
+
+        super().__init__(name, bases, namespace)
+
+        scoped_attributes = set(namespace.get("__annotations__", {}))
+
+        scoped_attributes.update(attribute for attribute, value in namespace.items()
+                                 if not attribute.startswith("__") and not isinstance(value, (staticmethod, classmethod, property, types.FunctionType)))
+
+        scoped_attributes -= set(namespace.get("_job_shared_attributes", ())) | {"_job_shared_attributes"}
+
+        type.__setattr__(cls, "_job_scoped_attributes", frozenset(scoped_attributes))
+
+##-------------------start-of-__getattribute__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __getattribute__(cls, name:str) -> typing.Any:
+
+        if(name in type.__getattribute__(cls, "_job_scoped_attributes")):
+
+            job = TranslationJob._current_job.get()
+
+            if(job is not None):
+
+                job_state = job.state.setdefault(cls, {})
+
+                if(name not in job_state):
+
+                    value = type.__getattribute__(cls, name)
+
+                    ## containers are copied so a job's appends never reach the class or another job, anything else is replaced rather than mutated
+                    job_state[name] = copy.deepcopy(value) if isinstance(value, (list, dict, set)) else value
+
+                return job_state[name]
+
+        return type.__getattribute__(cls, name)
+
+##-------------------start-of-__setattr__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __setattr__(cls, name:str, value:typing.Any) -> None:
+
+        if(name in type.__getattribute__(cls, "_job_scoped_attributes")):
+
+            job = TranslationJob._current_job.get()
+
+            if(job is not None):
+                job.state.setdefault(cls, {})[name] = value
+                return
+
+        type.__setattr__(cls, name, value)
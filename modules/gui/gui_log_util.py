@@ -0,0 +1,90 @@
+## built-in libraries
+import typing
+
+## custom modules
+from modules.common.logger import Logger
+from modules.common.translation_job import TranslationJob
+
+class GuiLogView:
+
+    """
+
+    GuiLogView is what a debug log box shows of a running translation, only ever reading the lines logged since its last read.
+    It holds at most max_lines lines, dropping the oldest half at once when full, so most updates only add to the end of the box (which gradio sends as just the new text) and the cost of an update doesn't grow with the length of the run.
+
+    """
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self, max_lines:int=2000) -> None:
+
+        """
+
+        Constructor for GuiLogView class.
+
+        Parameters:
+        max_lines (int | optional) : the most lines to show at once.
+
+        """
+
+        self.max_lines = max_lines
+
+        self.lines:typing.List[str] = []
+
+        self.cursor = 0
+
+        ## the job being shown, None for the log outside of any job
+        self.job:TranslationJob | None = None
+
+##-------------------start-of-update()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def update(self, job:TranslationJob) -> bool:
+
+        """
+
+        Reads what the given job logged since the last update, starting over if it's a different job from last time.
+
+        Parameters:
+        self (object - GuiLogView) : The GuiLogView object.
+        job (object - TranslationJob) : The job whose log to show.
+
+        Returns:
+        is_changed (bool) : whether there is anything new to show.
+
+        """
+
+        if(job is not self.job):
+            self.job = job
+            self.lines = []
+            self.cursor = 0
+
+        new_lines, self.cursor = Logger.read_entries(self.cursor, job.get_value(Logger, "entries", []), job.get_value(Logger, "first_entry_index", 0))
+
+        if(len(new_lines) == 0):
+            return False
+
+        self.lines.extend(new_lines)
+
+        if(len(self.lines) > self.max_lines):
+            del self.lines[:len(self.lines) - self.max_lines // 2]
+
+        return True
+
+##-------------------start-of-get_text()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def get_text(self) -> str:
+
+        """
+
+        Parameters:
+        self (object - GuiLogView) : The GuiLogView object.
+
+        Returns:
+        log_text (str) : the lines to show.
+
+        """
+
+        if(len(self.lines) == 0):
+            return "No log content found."
+
+        return "".join(self.lines)
@@ -1,14 +1,22 @@
 ## built-in libraries
 import typing
+import asyncio
 
 ## third-party libraries
 from deepl.translator import Translator
 
-class DeepLService:
+## custom modules
+from modules.common.translation_job import JobScoped
+
+class DeepLService(metaclass=JobScoped):
 
     api_key:str
     translator:Translator
 
+    ## DeepL takes at most 50 texts and 128 KiB per request, the size is kept under that to leave room for the rest of the request
+    max_texts_per_request = 50
+    max_request_bytes = 120 * 1024
+
 ##-------------------start-of-translate()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
     
     @staticmethod
@@ -37,6 +45,51 @@ class DeepLService:
         except Exception as e:
             raise e
 
+##-------------------start-of-translate_texts()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    
+    @staticmethod
+    def translate_texts(texts:typing.List[str], target_lang:str, source_lang:str) -> typing.List[str]:
+
+        """
+
+        Translates several texts in a single request, each on its own as if they were sent one by one.
+        The texts must fit within max_texts_per_request and max_request_bytes.
+
+        Parameters:
+        texts (list - string) : The texts to translate.
+        target_lang (string) : The target language.
+        source_lang (string) : The source language.
+
+        Returns:
+        translations (list - string) : The translated texts, in the same order.
+
+        """
+
+        results = DeepLService.translator.translate_text(texts, target_lang=target_lang, source_lang=source_lang)
+
+        return [str(result) for result in results] # type: ignore | a list of texts always gets a list of results
+
+##-------------------start-of-translate_texts_async()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    async def translate_texts_async(texts:typing.List[str], target_lang:str, source_lang:str) -> typing.List[str]:
+
+        """
+
+        Same as translate_texts(), but the request is made on a worker thread so several can be in flight at once.
+
+        Parameters:
+        texts (list - string) : The texts to translate.
+        target_lang (string) : The target language.
+        source_lang (string) : The source language.
+
+        Returns:
+        translations (list - string) : The translated texts, in the same order.
+
+        """
+
+        return await asyncio.to_thread(DeepLService.translate_texts, texts, target_lang, source_lang)
+
 ##-------------------start-of-set_api_key()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -53,6 +106,9 @@ class DeepLService:
 
         DeepLService.api_key = api_key
 
+        ## creating the translator doesn't contact DeepL, so this is free even when the key isn't tested
+        DeepLService.translator = Translator(api_key)
+
 ##-------------------start-of-test_api_key_validity()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
     
     @staticmethod
@@ -72,8 +128,6 @@ class DeepLService:
 
         try:
 
-            DeepLService.translator = Translator(DeepLService.api_key)
-
             DeepLService.translator.translate_text("test", target_lang="JA")
 
             validity = True
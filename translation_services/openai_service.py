@@ -1,16 +1,21 @@
 ## built-in libraries
 import typing
+import time
 
 ## third-party libraries
 from openai import AsyncOpenAI
 
 ## custom modules
-from modules.common.exceptions import InvalidAPIKeyException
+from modules.common.translation_job import JobScoped
+from modules.common.exceptions import InvalidAPIKeyException, StreamAbortedException
+from modules.common.logger import Logger
 from modules.common.decorators import do_nothing_decorator
+from modules.common.rate_limiter import RateLimiter
+from modules.common.token_accountant import TokenAccountant
 
 from custom_classes.messages import SystemTranslationMessage, ModelTranslationMessage
 
-class OpenAIService:
+class OpenAIService(metaclass=JobScoped):
 
     ## async client session
     client = AsyncOpenAI(max_retries=0, api_key="DummyKey")
@@ -27,6 +32,21 @@ class OpenAIService:
 
     decorator_to_use:typing.Callable = do_nothing_decorator
 
+    ## client-side requests/tokens per minute pacing, None if no limits are set for the model
+    rate_limiter:RateLimiter | None = None
+
+    ## without max_tokens, the completion is estimated as this many times the prompt's tokens when charging the rate limiter
+    expected_completion_ratio = 1.0
+
+    ## a streamed completion is cut off once it is this many times longer than its prompt, as it has almost certainly run away
+    runaway_completion_ratio = 3.0
+
+    ## streaming stats for the run summary
+    num_streamed_requests = 0
+    total_time_to_first_token = 0.0
+    total_streamed_tokens = 0
+    total_streaming_time = 0.0
+
 ##-------------------start-of-set_api_key()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -41,7 +61,8 @@ class OpenAIService:
 
         """
 
-        OpenAIService.client.api_key = api_key
+        ## a copy rather than setting the key in place, so each translation job keeps its own key while sharing the same connection pool
+        OpenAIService.client = OpenAIService.client.with_options(api_key=api_key)
 
 ##-------------------start-of-set_decorator()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -59,59 +80,236 @@ class OpenAIService:
 
         OpenAIService.decorator_to_use = decorator
 
+##-------------------start-of-set_rate_limits()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def set_rate_limits(requests_per_minute:int | None, tokens_per_minute:int | None) -> None:
+
+        """
+
+        Sets the client-side rate limits, requests are then paced to stay under them instead of running into the API's.
+
+        Parameters:
+        requests_per_minute (int | None) : the requests per minute limit, None for no limit.
+        tokens_per_minute (int | None) : the tokens per minute limit, None for no limit.
+
+        """
+
+        if(requests_per_minute is None and tokens_per_minute is None):
+            OpenAIService.rate_limiter = None
+
+        else:
+            OpenAIService.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+##-------------------start-of-estimate_request_tokens()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def estimate_request_tokens(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage) -> int:
+
+        """
+
+        Estimates how many tokens a request will count against the tokens per minute limit, its prompt plus its completion.
+        Like the API, max_tokens is counted as the completion when it is set.
+
+        Parameters:
+        translation_instructions (object - SystemTranslationMessage | ModelTranslationMessage) : The system message also known as the instructions.
+        translation_prompt (object - ModelTranslationMessage) : The user message also known as the prompt.
+
+        Returns:
+        estimated_tokens (int) : the estimated tokens of the request.
+
+        """
+
+        ## each message costs a few tokens for its role and separators, and the reply is primed with a few more
+        num_prompt_tokens = OpenAIService.count_tokens(translation_instructions["content"]) + OpenAIService.count_tokens(translation_prompt["content"]) + 10
+
+        if(OpenAIService.max_tokens is not None):
+            num_completion_tokens = OpenAIService.max_tokens
+
+        else:
+            num_completion_tokens = int(OpenAIService.count_tokens(translation_prompt["content"]) * OpenAIService.expected_completion_ratio)
+
+        return num_prompt_tokens + num_completion_tokens
+
+##-------------------start-of-count_tokens()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def count_tokens(text:str) -> int:
+
+        """
+
+        Counts the tokens in a piece of text for the current model.
+
+        Parameters:
+        text (str) : the text to count.
+
+        Returns:
+        num_tokens (int) : the number of tokens in the text.
+
+        """
+
+        return TokenAccountant.count_tokens(text, OpenAIService.model)
+
 ##-------------------start-of-trans()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    async def translate_message(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage) -> str:
+    async def translate_message(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage, is_line_count_checked:bool=False) -> typing.Tuple[str, float, int]:
         decorated_function = OpenAIService.decorator_to_use(OpenAIService._translate_message)
-        return await decorated_function(translation_instructions, translation_prompt)
+        return await decorated_function(translation_instructions, translation_prompt, is_line_count_checked)
 
 ##-------------------start-of-_translate_message()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
     ## backoff wrapper for retrying on errors, As of OpenAI > 1.0.0, it comes with a built in backoff system, but I've grown accustomed to this one so I'm keeping it.
     @staticmethod
-    async def _translate_message(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage) -> str:
+    async def _translate_message(translation_instructions:SystemTranslationMessage | ModelTranslationMessage, translation_prompt:ModelTranslationMessage, is_line_count_checked:bool=False) -> typing.Tuple[str, float, int]:
 
         """
 
         Translates a system and user message.
+        The completion is always streamed internally, so a response that is clearly malformed or running away can be cut off as soon as it goes wrong instead of paying for all of it.
 
         Parameters:
         translation_instructions (object - SystemTranslationMessage | ModelTranslationMessage) : The system message also known as the instructions.
         translation_prompt (object - ModelTranslationMessage) : The user message also known as the prompt.
+        is_line_count_checked (bool) : whether to abort the response once it has clearly more lines than the prompt.
 
         Returns:
         output (string) a string that gpt gives to us also known as the translation.
+        request_latency (float) : seconds from sending the request to the end of the stream, not counting any wait on the rate limiter.
+        num_tokens (int) : the request's prompt and completion tokens.
 
         """
 
         if(OpenAIService.client.api_key == "DummyKey"):
             raise InvalidAPIKeyException("OpenAI")
 
+        num_prompt_tokens = OpenAIService.count_tokens(translation_instructions["content"]) + OpenAIService.count_tokens(translation_prompt["content"]) + 10
+
+        ## charged per attempt, so retries made by the decorator are paced as well
+        if(OpenAIService.rate_limiter is not None):
+            estimated_tokens = OpenAIService.estimate_request_tokens(translation_instructions, translation_prompt)
+            await OpenAIService.rate_limiter.acquire(estimated_tokens)
+
+        expected_num_lines = len([line for line in translation_prompt["content"].split('\n') if line.strip()])
+        max_num_lines = expected_num_lines + max(2, expected_num_lines // 5)
+
+        max_completion_tokens = max(256, int(OpenAIService.count_tokens(translation_prompt["content"]) * OpenAIService.runaway_completion_ratio))
+
+        request_start = time.time()
+
         ## logit bias is currently excluded due to a lack of need, and the fact that i am lazy
+        ## the stream setting is kept at False for the user facing settings, streaming here is an internal detail
+        try:
+
+            response = await OpenAIService.client.chat.completions.create(
+                model=OpenAIService.model,
+                messages=[
+                    translation_instructions,
+                    translation_prompt,
+                ], # type: ignore | Seems to work for now.
+
+                temperature = OpenAIService.temperature,
+                top_p = OpenAIService.top_p,
+                n = OpenAIService.n,
+                stream = True,
+                stream_options = {"include_usage": True},
+                stop = OpenAIService.stop,
+                presence_penalty = OpenAIService.presence_penalty,
+                frequency_penalty = OpenAIService.frequency_penalty,
+                max_tokens = OpenAIService.max_tokens       
+
+            )
+
+        ## a request that was refused or never reached the api used no tokens, so the estimate is handed back before the decorator retries it
+        except Exception:
+
+            if(OpenAIService.rate_limiter is not None):
+                OpenAIService.rate_limiter.reconcile(estimated_tokens, 0)
+
+            raise
+
+        output_chunks = []
+        num_completion_tokens = 0
+        time_to_first_token = None
+        usage = None
+
+        try:
+
+            async for chunk in response:
+
+                ## the usage comes in its own chunk at the very end
+                if(chunk.usage is not None):
+                    usage = chunk.usage
+
+                if(len(chunk.choices) == 0 or not chunk.choices[0].delta.content):
+                    continue
+
+                content = chunk.choices[0].delta.content
+
+                if(time_to_first_token is None):
+                    time_to_first_token = time.time() - request_start
+
+                output_chunks.append(content)
 
-        response = await OpenAIService.client.chat.completions.create(
-            model=OpenAIService.model,
-            messages=[
-                translation_instructions,
-                translation_prompt,
-            ], # type: ignore | Seems to work for now.
+                ## each content chunk is a token
+                num_completion_tokens += 1
 
-            temperature = OpenAIService.temperature,
-            top_p = OpenAIService.top_p,
-            n = OpenAIService.n,
-            stream = OpenAIService.stream,
-            stop = OpenAIService.stop,
-            presence_penalty = OpenAIService.presence_penalty,
-            frequency_penalty = OpenAIService.frequency_penalty,
-            max_tokens = OpenAIService.max_tokens       
+                if(num_completion_tokens > max_completion_tokens):
+                    raise StreamAbortedException(f"the response passed {max_completion_tokens} tokens for a prompt of {expected_num_lines} lines")
 
-        )
+                ## lines can only have finished if a newline just came in
+                if(is_line_count_checked and '\n' in content):
+
+                    num_finished_lines = len([line for line in ''.join(output_chunks).split('\n')[:-1] if line.strip()])
+
+                    if(num_finished_lines > max_num_lines):
+                        raise StreamAbortedException(f"the response passed {max_num_lines} lines for a prompt of {expected_num_lines} lines")
+
+        finally:
+
+            await response.close()
+
+            request_latency = time.time() - request_start
+
+            num_tokens = usage.total_tokens if usage is not None else num_prompt_tokens + num_completion_tokens
+
+            if(OpenAIService.rate_limiter is not None):
+                OpenAIService.rate_limiter.reconcile(estimated_tokens, num_tokens)
+
+            OpenAIService.log_streaming_stats(time_to_first_token, num_completion_tokens, request_latency)
 
         ## if anyone knows how to type hint this please let me know
-        output = response.choices[0].message.content
+        output = ''.join(output_chunks)
         
-        return output
+        return output, request_latency, num_tokens
+
+##-------------------start-of-log_streaming_stats()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def log_streaming_stats(time_to_first_token:float | None, num_completion_tokens:int, request_duration:float) -> None:
+
+        """
+
+        Logs the time to first token and token rate of a streamed response, and adds them to the run's totals.
+
+        Parameters:
+        time_to_first_token (float | None) : seconds until the first token arrived, None if none did.
+        num_completion_tokens (int) : the number of tokens streamed.
+        request_duration (float) : seconds from sending the request to the end of the stream.
+
+        """
+
+        if(time_to_first_token is None):
+            return
+
+        generation_time = max(request_duration - time_to_first_token, 0.001)
+
+        OpenAIService.num_streamed_requests += 1
+        OpenAIService.total_time_to_first_token += time_to_first_token
+        OpenAIService.total_streamed_tokens += num_completion_tokens
+        OpenAIService.total_streaming_time += generation_time
+
+        Logger.log_action(f"Time to first token : {round(time_to_first_token, 2)}s, {num_completion_tokens} tokens at {round(num_completion_tokens / generation_time, 1)} tokens per second.")
     
 ##-------------------start-of-test_api_key_validity()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
     
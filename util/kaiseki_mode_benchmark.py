@@ -0,0 +1,213 @@
+## built-in libraries
+from pathlib import Path
+
+import sys
+import os
+import time
+import base64
+
+## Calculates the path to the modules directory and add it to sys.path
+current_dir = Path(__file__).resolve().parent
+parent_dir = current_dir.parent
+
+## Add the parent directory to sys.path so 'modules' can be found
+sys.path.append(str(parent_dir))
+
+## custom modules
+from modules.common.toolkit import Toolkit
+from modules.common.file_ensurer import FileEnsurer
+from modules.common.fragment_cache import FragmentCache
+from modules.common.progress_renderer import ProgressRenderer
+
+from translation_services.deepl_service import DeepLService
+
+from models.kaiseki import Kaiseki
+
+class SimulatedTranslator:
+
+    """
+
+    Stands in for DeepL when there is no api key, taking a fixed time per request plus a little per character and returning the text as is.
+
+    """
+
+    request_latency = 0.15
+    character_latency = 0.0002
+
+    def translate_text(self, text, target_lang, source_lang):
+
+        texts = text if isinstance(text, list) else [text]
+
+        time.sleep(SimulatedTranslator.request_latency + SimulatedTranslator.character_latency * sum(len(t) for t in texts))
+
+        return texts if isinstance(text, list) else text
+
+class KaisekiModeBenchmark:
+
+    """
+
+    Util script for comparing Kaiseki's whole sentence mode against translating sentence parts, in requests, characters sent and wall time.
+    Uses the saved DeepL api key if there is one (this spends quota), otherwise a simulated DeepL. The fragment cache is turned off so every run sends everything.
+    Also makes sure both modes put back the punctuation a line starts with exactly once.
+
+    """
+
+    ## each starts with punctuation before any text, and doesn't have it anywhere else
+    leading_punctuation_lines = ["...!? 何だと!?", "!? そうか。", "...... え？ 何？"]
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self) -> None:
+
+        """
+
+        Constructor for KaisekiModeBenchmark class.
+
+        """
+
+        os.system("title " + "Kaiseki Mode Benchmark")
+
+##-------------------start-of-set_up_translator()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def set_up_translator() -> bool:
+
+        """
+
+        Sets DeepLService up with the saved api key, or the simulated DeepL if there isn't one.
+
+        Returns:
+        is_simulated (bool) : whether the simulated DeepL is used.
+
+        """
+
+        if(os.path.exists(FileEnsurer.deepl_api_key_path)):
+
+            with open(FileEnsurer.deepl_api_key_path, 'r', encoding='utf-8') as file:
+                DeepLService.set_api_key(base64.b64decode((file.read()).encode('utf-8')).decode('utf-8'))
+
+            return False
+
+        DeepLService.translator = SimulatedTranslator() # type: ignore | only translate_text() is used
+
+        return True
+
+##-------------------start-of-time_mode()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def time_mode(lines:list[str], is_whole_sentence_mode:bool, max_texts_per_request:int) -> tuple[int, int, int, float]:
+
+        """
+
+        Translates the lines in one mode.
+
+        Parameters:
+        lines (list - str) : the lines to translate.
+        is_whole_sentence_mode (bool) : whether to send whole sentences rather than sentence parts.
+        max_texts_per_request (int) : how many texts may go in one request, 1 for a request per text.
+
+        Returns:
+        num_requests (int) : requests sent.
+        num_texts (int) : texts sent.
+        num_characters (int) : characters sent.
+        time_taken (float) : seconds taken.
+
+        """
+
+        Kaiseki.reset_static_variables()
+
+        Kaiseki.is_whole_sentence_mode = is_whole_sentence_mode
+        Kaiseki.text_to_translate = list(lines)
+
+        DeepLService.max_texts_per_request = max_texts_per_request
+
+        time_start = time.perf_counter()
+
+        Kaiseki.commence_translation()
+
+        return Kaiseki.num_requests, Kaiseki.num_translated_fragments, Kaiseki.num_sent_characters, time.perf_counter() - time_start
+
+##-------------------start-of-check_leading_punctuation()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def check_leading_punctuation(is_whole_sentence_mode:bool) -> bool:
+
+        """
+
+        Translates the leading punctuation lines with the simulated DeepL, which returns text as is, and checks each comes back with its leading punctuation once.
+
+        Parameters:
+        is_whole_sentence_mode (bool) : whether to send whole sentences rather than sentence parts.
+
+        Returns:
+        is_kept_once (bool) : whether every line's leading punctuation was kept, and not doubled.
+
+        """
+
+        translator = DeepLService.translator
+
+        DeepLService.translator = SimulatedTranslator() # type: ignore | only translate_text() is used
+
+        try:
+            KaisekiModeBenchmark.time_mode(KaisekiModeBenchmark.leading_punctuation_lines, is_whole_sentence_mode, DeepLService.max_texts_per_request)
+
+        finally:
+            DeepLService.translator = translator
+
+        return all(translated_line.count(line.split(" ")[0]) == 1 for line, translated_line in zip(KaisekiModeBenchmark.leading_punctuation_lines, Kaiseki.translated_text))
+
+##-------------------start-of-run()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def run(self, text_file:str) -> None:
+
+        """
+
+        Runs each mode, with and without several texts to a request, and prints the results.
+
+        Parameters:
+        self (object - KaisekiModeBenchmark) : The KaisekiModeBenchmark object.
+        text_file (str) : the text to translate.
+
+        """
+
+        with open(text_file, 'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+
+        FragmentCache.is_enabled = False
+        ProgressRenderer.is_quiet = True
+
+        is_simulated = KaisekiModeBenchmark.set_up_translator()
+
+        max_texts_per_request = DeepLService.max_texts_per_request
+
+        print("Text : " + text_file + " (" + str(len(lines)) + " lines)")
+        print("DeepL : " + ("simulated, " + str(SimulatedTranslator.request_latency) + " seconds per request" if is_simulated else "live, using the saved api key") + "\n")
+
+        for label, is_whole_sentence_mode, num_texts_per_request in [("Sentence parts, a request per part", False, 1),
+                                                                     ("Whole sentences, a request per sentence", True, 1),
+                                                                     ("Sentence parts, batched", False, max_texts_per_request),
+                                                                     ("Whole sentences, batched", True, max_texts_per_request)]:
+
+            num_requests, num_texts, num_characters, time_taken = KaisekiModeBenchmark.time_mode(lines, is_whole_sentence_mode, num_texts_per_request)
+
+            print(label + " : " + str(num_requests) + " requests, " + str(num_texts) + " texts, " + str(num_characters) + " characters, " + str(round(time_taken, 4)) + " seconds")
+
+        DeepLService.max_texts_per_request = max_texts_per_request
+
+        print("\nLeading Punctuation Kept Once (sentence parts) : " + str(KaisekiModeBenchmark.check_leading_punctuation(False)))
+        print("Leading Punctuation Kept Once (whole sentences) : " + str(KaisekiModeBenchmark.check_leading_punctuation(True)))
+
+        print()
+
+        Toolkit.pause_console()
+
+##-------------------start-of-sub_main()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+client = KaisekiModeBenchmark()
+
+## checks sys arguments, the text file is optional
+if(__name__ == '__main__'):
+
+    Toolkit.clear_console()
+
+    client.run(sys.argv[1] if len(sys.argv) > 1 else os.path.join(parent_dir, "demo", "demo_sample_text.txt"))
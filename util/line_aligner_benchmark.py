@@ -0,0 +1,260 @@
+## built-in libraries
+from pathlib import Path
+
+import sys
+import os
+import time
+import random
+import re
+
+## Calculates the path to the modules directory and add it to sys.path
+current_dir = Path(__file__).resolve().parent
+parent_dir = current_dir.parent
+
+## Add the parent directory to sys.path so 'modules' can be found
+sys.path.append(str(parent_dir))
+
+## custom modules
+from modules.common.toolkit import Toolkit
+from modules.common.line_aligner import LineAligner
+
+class LineAlignerBenchmark:
+
+    """
+
+    Util script for timing LineAligner on malformed batches, and making sure repairing them the way Kijiku.repair_malformed_batch() does never loses, duplicates or misplaces a line.
+    Each generated batch has lines merged, added, dropped or split, the lines LineAligner doesn't trust are "re-requested" by filling in their known translations, and the result has to be exactly one correct translation per source line.
+    Faults right next to each other that cancel out (i.e. a dropped line with a line added just after it) leave nothing in the lengths to go on, so the generated faults are kept min_fault_spacing lines apart.
+
+    """
+
+    ## the sentences the batches' lines are made from, a line is one to four of them and a fifth of lines are dialogue
+    ## each line's translation is generated to be about twice as long give or take a quarter, with a sentence per sentence, though a translator sometimes splits or joins one
+    sample_sentences = ["彼女はそう言って、静かに部屋を出ていった。", "俺は何も言えなかった。", "空は青く、風は穏やかだった。", "はい。", "え？", "……なるほど、そういうことか。",
+                        "窓の外では、遠くの街の明かりがぼんやりと滲んでいた。", "待ってくれ、まだ話は終わっていない！", "静寂。", "本当にそれでいいの？　後悔しない？"]
+
+    num_batches = 500
+    num_lines_per_batch = 30
+
+    sentence_count_change_chance = 0.15
+
+    min_fault_spacing = 3
+
+    seed = 17
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self) -> None:
+
+        """
+
+        Constructor for LineAlignerBenchmark class.
+
+        """
+
+        os.system("title " + "Line Aligner Benchmark")
+
+##-------------------start-of-generate_batch()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def generate_batch(generator:random.Random) -> tuple[list[str], list[str]]:
+
+        """
+
+        Generates a batch of source lines and their correct translations, each translation tagged with its line number so a misplaced line can't pass for the right one.
+
+        Parameters:
+        generator (object - random.Random) : the random number generator.
+
+        Returns:
+        source_lines (list - str) : the source lines.
+        translations (list - str) : the correct translation of each source line.
+
+        """
+
+        source_lines = []
+
+        for _ in range(LineAlignerBenchmark.num_lines_per_batch):
+
+            source_line = "".join(generator.choice(LineAlignerBenchmark.sample_sentences) for _ in range(generator.randint(1, 4)))
+
+            source_lines.append("「" + source_line + "」" if generator.random() < 0.2 else source_line)
+
+        translations = []
+
+        for index, source_line in enumerate(source_lines):
+
+            tag = "EN<" + str(index) + ">"
+
+            num_sentences = len(re.findall("[。！？]+", source_line))
+
+            if(generator.random() < LineAlignerBenchmark.sentence_count_change_chance):
+                num_sentences = max(1, num_sentences + generator.choice([-1, 1]))
+
+            length = max(len(tag) + 3 * num_sentences, int(len(source_line) * 2 * generator.uniform(0.75, 1.25)))
+
+            ## the words after the tag split into sentences of about the same length
+            sentence_length = (length - len(tag)) // num_sentences
+
+            translation = tag + " " + " ".join("w" * (sentence_length - 2) + "." for _ in range(num_sentences))
+
+            translations.append("\"" + translation + "\"" if source_line.startswith("「") else translation)
+
+        return source_lines, translations
+
+##-------------------start-of-malform_batch()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def malform_batch(translations:list[str], generator:random.Random) -> list[str]:
+
+        """
+
+        Breaks a batch's translation the ways the api does, merging two lines, adding a line, dropping a line or splitting one, one to three times.
+        Only batches that end up with the wrong number of lines are malformed as far as Kijiku can tell, so a batch that doesn't is broken again.
+
+        Parameters:
+        translations (list - str) : the correct translations.
+        generator (object - random.Random) : the random number generator.
+
+        Returns:
+        malformed_lines (list - str) : the translated lines as the api might return them.
+
+        """
+
+        malformed_lines = list(translations)
+
+        while(len(malformed_lines) == len(translations)):
+
+            malformed_lines = list(translations)
+
+            ## broken from the end backwards, so a fault never moves the lines where the next one goes
+            fault_indices = sorted(generator.sample(range(0, len(translations) - 1, LineAlignerBenchmark.min_fault_spacing), generator.randint(1, 3)), reverse=True)
+
+            for index in fault_indices:
+                LineAlignerBenchmark.add_fault(malformed_lines, index, generator)
+
+        return malformed_lines
+
+##-------------------start-of-add_fault()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def add_fault(malformed_lines:list[str], index:int, generator:random.Random) -> None:
+
+        """
+
+        Breaks the translated lines at an index in one of the ways the api does.
+
+        Parameters:
+        malformed_lines (list - str) : the translated lines, changed in place.
+        index (int) : where to break them.
+        generator (object - random.Random) : the random number generator.
+
+        """
+
+        fault = generator.choice(["merge", "insert", "drop", "split"])
+
+        if(fault == "merge"):
+            malformed_lines[index:index + 2] = [malformed_lines[index] + " " + malformed_lines[index + 1]]
+
+        elif(fault == "insert"):
+            malformed_lines.insert(index, "Note: this is extra.")
+
+        elif(fault == "drop"):
+            del malformed_lines[index]
+
+        else:
+            middle = len(malformed_lines[index]) // 2
+            malformed_lines[index:index + 1] = [malformed_lines[index][:middle], malformed_lines[index][middle:]]
+
+##-------------------start-of-repair()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def repair(source_lines:list[str], malformed_lines:list[str], translations:list[str]) -> tuple[list[str | None], int, int]:
+
+        """
+
+        Repairs a batch the way Kijiku.repair_malformed_batch() does, with the re-requested spans coming back correct.
+
+        Parameters:
+        source_lines (list - str) : the source lines.
+        malformed_lines (list - str) : the malformed translated lines.
+        translations (list - str) : the correct translations, standing in for the re-requests.
+
+        Returns:
+        repaired_lines (list - str | None) : the repaired translation of each source line.
+        num_kept_lines (int) : the lines kept from the malformed translation.
+        num_rerequested_lines (int) : the lines re-requested.
+
+        """
+
+        repaired_lines = LineAligner.align(source_lines, malformed_lines)
+        unaligned_spans = LineAligner.get_unaligned_spans(repaired_lines)
+
+        num_rerequested_lines = sum(end - start for start, end in unaligned_spans)
+
+        for start, end in unaligned_spans:
+            repaired_lines[start:end] = translations[start:end]
+
+        return repaired_lines, len(source_lines) - num_rerequested_lines, num_rerequested_lines
+
+##-------------------start-of-run()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def run(self) -> None:
+
+        """
+
+        Repairs the generated batches, then prints how long alignment took and whether every repaired batch came out right.
+
+        Parameters:
+        self (object - LineAlignerBenchmark) : The LineAlignerBenchmark object.
+
+        """
+
+        generator = random.Random(LineAlignerBenchmark.seed)
+
+        num_wrong_batches = 0
+        num_kept_lines = 0
+        num_rerequested_lines = 0
+
+        time_taken = 0.0
+
+        ## the batch from the bug report, two lines merged into one and a note added straight after them, with a line dropped further on
+        source_lines, translations = LineAlignerBenchmark.generate_batch(generator)
+        batches = [(source_lines, translations, translations[:10] + [translations[10] + " " + translations[11], "Note: this is extra."] + translations[12:20] + translations[21:])]
+
+        for _ in range(LineAlignerBenchmark.num_batches):
+            source_lines, translations = LineAlignerBenchmark.generate_batch(generator)
+            batches.append((source_lines, translations, LineAlignerBenchmark.malform_batch(translations, generator)))
+
+        for source_lines, translations, malformed_lines in batches:
+
+            time_start = time.perf_counter()
+
+            repaired_lines, num_batch_kept_lines, num_batch_rerequested_lines = LineAlignerBenchmark.repair(source_lines, malformed_lines, translations)
+
+            time_taken += time.perf_counter() - time_start
+
+            num_kept_lines += num_batch_kept_lines
+            num_rerequested_lines += num_batch_rerequested_lines
+
+            ## every line has to be there once, in its place
+            if(repaired_lines != translations):
+                num_wrong_batches += 1
+
+        print("Batches : " + str(len(batches)) + " (" + str(LineAlignerBenchmark.num_lines_per_batch) + " lines each)")
+        print("Alignment Time : " + str(round(time_taken / len(batches) * 1000, 2)) + " ms per batch")
+        print("Lines Kept : " + str(num_kept_lines))
+        print("Lines Re-requested : " + str(num_rerequested_lines) + " (" + str(round(num_rerequested_lines / max(num_kept_lines + num_rerequested_lines, 1) * 100, 1)) + "%)")
+        print("Batches Repaired Correctly : " + str(len(batches) - num_wrong_batches) + " of " + str(len(batches)) + "\n")
+
+        Toolkit.pause_console()
+
+##-------------------start-of-sub_main()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+client = LineAlignerBenchmark()
+
+if(__name__ == '__main__'):
+
+    Toolkit.clear_console()
+
+    client.run()
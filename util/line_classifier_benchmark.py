@@ -0,0 +1,162 @@
+## built-in libraries
+from pathlib import Path
+
+import sys
+import os
+import re
+import time
+import random
+
+## Calculates the path to the modules directory and add it to sys.path
+current_dir = Path(__file__).resolve().parent
+parent_dir = current_dir.parent
+
+## Add the parent directory to sys.path so 'modules' can be found
+sys.path.append(str(parent_dir))
+
+## third-party libraries
+from kairyou import KatakanaUtil
+
+## custom modules
+from modules.common.toolkit import Toolkit
+from modules.common.line_classifier import LineClassifier
+
+class LineClassifierBenchmark:
+
+    """
+
+    Util script for timing LineClassifier against the line checks Kijiku used to run inline, and making sure they agree.
+
+    """
+
+    ## the kinds of lines a light novel is made of, weighted roughly by how often they come up
+    sample_lines = ["「……」", "「はい」", "◇", "▼", "　", "", "１２", "Part 3", "OK!", "――", "ーー", "「え？」", "※", "...",
+                    "彼女はそう言って、静かに部屋を出ていった。", "俺は何も言えなかった。", "空は青く、風は穏やかだった。"]
+
+    sample_weights = [4, 2, 1, 1, 3, 6, 1, 1, 1, 1, 1, 2, 1, 1, 30, 30, 30]
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self) -> None:
+
+        """
+
+        Constructor for LineClassifierBenchmark class.
+
+        """
+
+        os.system("title " + "Line Classifier Benchmark")
+
+        self.lines:list[str] = []
+
+##-------------------start-of-legacy_classify()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def legacy_classify(sentence:str) -> str:
+
+        """
+
+        The checks Kijiku.generate_prompt() used to run on every line, patterns compiled per call as they were.
+
+        Parameters:
+        sentence (str) : the line to classify.
+
+        Returns:
+        line_type (str) : what Kijiku did with the line, "pov change", "part marker", "skip" or "translatable".
+
+        """
+
+        non_word_pattern = re.compile(r'^[\W_\s\n-]+$')
+        alphanumeric_pattern = re.compile(r'^[A-Za-z0-9\s\.,\'\?!]+\n*$')
+
+        is_part_in_sentence = "part" in sentence.lower()
+
+        if(any(char in sentence for char in ["▼", "△", "◇"])):
+            return "pov change"
+
+        elif(is_part_in_sentence or all(char in ["１","２","３","４","５","６","７","８","９", " "] for char in sentence) and not all(char in [" "] for char in sentence)):
+            return "part marker"
+
+        elif(non_word_pattern.match(sentence) or KatakanaUtil.is_punctuation(sentence)):
+            return "skip"
+
+        elif(alphanumeric_pattern.match(sentence) and not is_part_in_sentence):
+            return "skip"
+
+        return "translatable"
+
+##-------------------start-of-to_kijiku_action()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def to_kijiku_action(line_type:str) -> str:
+
+        """
+
+        Maps a LineClassifier type to what Kijiku does with the line, so it can be compared to legacy_classify().
+
+        Parameters:
+        line_type (str) : the LineClassifier type.
+
+        Returns:
+        action (str) : "pov change", "part marker", "skip" or "translatable".
+
+        """
+
+        if(line_type in [LineClassifier.EMPTY, LineClassifier.PUNCTUATION, LineClassifier.QUOTED_PUNCTUATION, LineClassifier.LATIN]):
+            return "skip"
+
+        return line_type
+
+##-------------------start-of-run()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def run(self, num_lines:int, text_file:str | None = None) -> None:
+
+        """
+
+        Times both on the same lines and prints the results.
+
+        Parameters:
+        self (object - LineClassifierBenchmark) : The LineClassifierBenchmark object.
+        num_lines (int) : how many lines to generate if no text file is given.
+        text_file (str | None) : a text to use instead of generated lines.
+
+        """
+
+        if(text_file is not None):
+            with open(text_file, 'r', encoding='utf-8') as file:
+                self.lines = file.read().splitlines()
+
+        else:
+            random.seed(0)
+            self.lines = random.choices(LineClassifierBenchmark.sample_lines, weights=LineClassifierBenchmark.sample_weights, k=num_lines)
+
+        time_start = time.perf_counter()
+        legacy_results = [LineClassifierBenchmark.legacy_classify(line) for line in self.lines]
+        legacy_time = time.perf_counter() - time_start
+
+        LineClassifier.classify.cache_clear()
+
+        time_start = time.perf_counter()
+        line_types = LineClassifier.classify_lines(self.lines)
+        classifier_time = time.perf_counter() - time_start
+
+        num_mismatches = sum(1 for legacy_result, line_type in zip(legacy_results, line_types) if legacy_result != LineClassifierBenchmark.to_kijiku_action(line_type))
+
+        print("Number of Lines : " + str(len(self.lines)))
+        print("Inline Checks : " + str(round(legacy_time, 4)) + " seconds")
+        print("LineClassifier : " + str(round(classifier_time, 4)) + " seconds")
+        print("Speedup : " + str(round(legacy_time / max(classifier_time, 1e-9), 1)) + "x")
+        print("Lines Classified Differently : " + str(num_mismatches) + "\n")
+
+        Toolkit.pause_console()
+
+##-------------------start-of-sub_main()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+client = LineClassifierBenchmark()
+
+## checks sys arguments, a text file is optional
+if(__name__ == '__main__'):
+
+    Toolkit.clear_console()
+
+    client.run(100000, sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,152 @@
+## built-in libraries
+from pathlib import Path
+
+import sys
+import os
+import time
+import tempfile
+
+## Calculates the path to the modules directory and add it to sys.path
+current_dir = Path(__file__).resolve().parent
+parent_dir = current_dir.parent
+
+## Add the parent directory to sys.path so 'modules' can be found
+sys.path.append(str(parent_dir))
+
+## custom modules
+from modules.common.toolkit import Toolkit
+from modules.common.logger import Logger
+
+class LegacyLogger:
+
+    """
+
+    The logger as it was, a string grown with += and a timestamp formatted for every line.
+
+    """
+
+    current_batch = ""
+
+    @staticmethod
+    def log_action(action:str) -> None:
+        LegacyLogger.current_batch += Toolkit.get_timestamp() + action + "\n"
+
+class LoggerBenchmark:
+
+    """
+
+    Util script for timing Logger against the string backed logger it replaced.
+    The old logger copies the whole log on every line, so it is only run on part of the lines by default, 1M lines would take hours.
+
+    """
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self) -> None:
+
+        """
+
+        Constructor for LoggerBenchmark class.
+
+        """
+
+        os.system("title " + "Logger Benchmark")
+
+##-------------------start-of-time_legacy_logger()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def time_legacy_logger(num_lines:int, log_file_path:str) -> float:
+
+        """
+
+        Times the old logger, including writing its batch to the log file at the end.
+
+        Parameters:
+        num_lines (int) : how many lines to log.
+        log_file_path (str) : where to write the log.
+
+        Returns:
+        time_taken (float) : seconds taken.
+
+        """
+
+        LegacyLogger.current_batch = ""
+
+        time_start = time.perf_counter()
+
+        for i in range(num_lines):
+            LegacyLogger.log_action("Sentence : " + str(i) + ", Sentence is punctuation... skipping.")
+
+        with open(log_file_path, 'a+', encoding="utf-8") as file:
+            file.write(LegacyLogger.current_batch)
+
+        return time.perf_counter() - time_start
+
+##-------------------start-of-time_logger()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def time_logger(num_lines:int, log_file_path:str, level:int) -> float:
+
+        """
+
+        Times Logger, including waiting for everything to be written at the end.
+
+        Parameters:
+        num_lines (int) : how many lines to log.
+        log_file_path (str) : where to write the log.
+        level (int) : the level the lines are logged at.
+
+        Returns:
+        time_taken (float) : seconds taken.
+
+        """
+
+        Logger.log_file_path = log_file_path
+        Logger.clear_batch()
+
+        time_start = time.perf_counter()
+
+        for i in range(num_lines):
+            Logger.log_action("Sentence : %s, Sentence is punctuation... skipping.", i, level=level)
+
+        Logger.push_batch()
+
+        return time.perf_counter() - time_start
+
+##-------------------start-of-run()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def run(self, num_lines:int, num_legacy_lines:int) -> None:
+
+        """
+
+        Times both and prints the results.
+
+        Parameters:
+        self (object - LoggerBenchmark) : The LoggerBenchmark object.
+        num_lines (int) : how many lines to log with Logger.
+        num_legacy_lines (int) : how many lines to log with the old logger.
+
+        """
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            legacy_time = LoggerBenchmark.time_legacy_logger(num_legacy_lines, os.path.join(temp_dir, "legacy_log.txt"))
+            logger_time = LoggerBenchmark.time_logger(num_lines, os.path.join(temp_dir, "debug_log.txt"), Logger.INFO)
+            suppressed_time = LoggerBenchmark.time_logger(num_lines, os.path.join(temp_dir, "debug_log.txt"), Logger.DEBUG)
+
+        print("Old Logger (" + str(num_legacy_lines) + " lines) : " + str(round(legacy_time, 4)) + " seconds, " + str(round(legacy_time / num_legacy_lines * 1e6, 2)) + " microseconds per line")
+        print("Logger (" + str(num_lines) + " lines) : " + str(round(logger_time, 4)) + " seconds, " + str(round(logger_time / num_lines * 1e6, 2)) + " microseconds per line")
+        print("Logger, below the level (" + str(num_lines) + " lines) : " + str(round(suppressed_time, 4)) + " seconds, " + str(round(suppressed_time / num_lines * 1e6, 2)) + " microseconds per line\n")
+
+        Toolkit.pause_console()
+
+##-------------------start-of-sub_main()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+client = LoggerBenchmark()
+
+## checks sys arguments, the number of lines for each logger is optional
+if(__name__ == '__main__'):
+
+    Toolkit.clear_console()
+
+    client.run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
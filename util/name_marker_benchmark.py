@@ -0,0 +1,211 @@
+## built-in libraries
+from pathlib import Path
+
+import sys
+import os
+import re
+import time
+import random
+import collections
+
+## Calculates the path to the modules directory and add it to sys.path
+current_dir = Path(__file__).resolve().parent
+parent_dir = current_dir.parent
+
+## Add the parent directory to sys.path so 'modules' can be found
+sys.path.append(str(parent_dir))
+
+## custom modules
+from modules.common.toolkit import Toolkit
+from modules.common.name_marker import NameMarker
+
+## stands in for kairyou's NameAndOccurrence, which has the same fields
+NameAndOccurrence = collections.namedtuple("NameAndOccurrence", ["name", "occurrence"])
+
+class NameMarkerBenchmark:
+
+    """
+
+    Util script for timing NameMarker against the per name marking Kudasai.mark_indexed_names() used to do, and making sure they mark the same text.
+    The two can only differ where a flagged name runs into another name, as the old marking counted each name's occurrences in text already marked for the names before it.
+
+    """
+
+    katakana = [chr(code_point) for code_point in range(ord("ァ"), ord("ヺ") + 1)]
+
+    ## the narration the names are scattered through, no katakana so the generated names can't run into each other
+    sample_filler = ["彼女はそう言って、静かに部屋を出ていった。", "俺は何も言えなかった。", "空は青く、風は穏やかだった。", "「はい」", "「え？」", "と", "は", "が", "の"]
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self) -> None:
+
+        """
+
+        Constructor for NameMarkerBenchmark class.
+
+        """
+
+        os.system("title " + "Name Marker Benchmark")
+
+##-------------------start-of-legacy_mark()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def legacy_mark(text:str, unique_names:list) -> str:
+
+        """
+
+        Kudasai.mark_indexed_names() as it was, compiling a pattern per name and rebuilding the text for each.
+
+        Parameters:
+        text (str) : the text to mark.
+        unique_names (list - NameAndOccurrence) : the names and which occurrence of each to mark.
+
+        Returns:
+        marked_text (str) : the marked text.
+
+        """
+
+        for name_tuple in unique_names:
+            name = name_tuple.name
+            pattern = re.compile(re.escape(name))
+
+            current_pos = 0
+            new_text = ""
+            last_end = 0
+
+            for match in pattern.finditer(text):
+                current_pos += 1
+                if(current_pos == name_tuple.occurrence):
+                    new_text += text[last_end:match.start()] + f">>>{name}<<<"
+                    last_end = match.end()
+
+            new_text += text[last_end:]
+            text = new_text
+
+        return text
+
+##-------------------start-of-generate_text()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def generate_text(num_names:int, num_characters:int) -> tuple[str, list[str]]:
+
+        """
+
+        Generates a text with names scattered through it, none of them inside another.
+
+        Parameters:
+        num_names (int) : how many different names to use.
+        num_characters (int) : roughly how long the text should be.
+
+        Returns:
+        text (str) : the generated text.
+        names (list - str) : the names used.
+
+        """
+
+        names = set()
+
+        while(len(names) < num_names):
+            names.add("".join(random.choices(NameMarkerBenchmark.katakana, k=random.randint(3, 6))))
+
+        ## a name inside a longer one would be counted differently by the old marking, see the class docstring
+        names = sorted(name for name in names if not any(name != other_name and name in other_name for other_name in names))
+
+        parts = []
+        length = 0
+
+        while(length < num_characters):
+            part = random.choice(NameMarkerBenchmark.sample_filler) + random.choice(names)
+            parts.append(part)
+            length += len(part)
+
+        return "".join(parts), names
+
+##-------------------start-of-flag_occurrences()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def flag_occurrences(text:str, names:list[str], num_flagged_per_name:int) -> list:
+
+        """
+
+        Picks some occurrences of each name to mark, as the indexer would.
+
+        Parameters:
+        text (str) : the text.
+        names (list - str) : the names.
+        num_flagged_per_name (int) : how many occurrences of each name to flag at most.
+
+        Returns:
+        unique_names (list - NameAndOccurrence) : the flagged occurrences.
+
+        """
+
+        unique_names = []
+
+        for name in names:
+
+            num_occurrences = text.count(name)
+
+            for occurrence in random.sample(range(1, num_occurrences + 1), min(num_flagged_per_name, num_occurrences)):
+                unique_names.append(NameAndOccurrence(name, occurrence))
+
+        return unique_names
+
+##-------------------start-of-run()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def run(self, num_names:int, num_characters:int, text_file:str | None = None) -> None:
+
+        """
+
+        Times both on the same text and names and prints the results.
+
+        Parameters:
+        self (object - NameMarkerBenchmark) : The NameMarkerBenchmark object.
+        num_names (int) : how many names to flag.
+        num_characters (int) : how long a text to generate if no text file is given.
+        text_file (str | None) : a text to use instead, its katakana words are used as the names.
+
+        """
+
+        random.seed(0)
+
+        if(text_file is not None):
+
+            with open(text_file, 'r', encoding='utf-8') as file:
+                text = file.read()
+
+            names = [name for name, _ in collections.Counter(re.findall(r"[ァ-ヺー]{2,}", text)).most_common(num_names)]
+
+        else:
+            text, names = NameMarkerBenchmark.generate_text(num_names, num_characters)
+
+        unique_names = NameMarkerBenchmark.flag_occurrences(text, names, 3)
+
+        time_start = time.perf_counter()
+        legacy_text = NameMarkerBenchmark.legacy_mark(text, unique_names)
+        legacy_time = time.perf_counter() - time_start
+
+        time_start = time.perf_counter()
+        marked_text = NameMarker.mark(text, unique_names)
+        marker_time = time.perf_counter() - time_start
+
+        print("Text Length : " + str(len(text)) + " characters")
+        print("Names : " + str(len(names)) + " (" + str(len(unique_names)) + " occurrences flagged)")
+        print("Per Name Marking : " + str(round(legacy_time, 4)) + " seconds")
+        print("NameMarker : " + str(round(marker_time, 4)) + " seconds")
+        print("Speedup : " + str(round(legacy_time / max(marker_time, 1e-9), 1)) + "x")
+        print("Same Marked Text : " + str(legacy_text == marked_text) + "\n")
+
+        Toolkit.pause_console()
+
+##-------------------start-of-sub_main()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+client = NameMarkerBenchmark()
+
+## checks sys arguments, a text file is optional
+if(__name__ == '__main__'):
+
+    Toolkit.clear_console()
+
+    client.run(300, 500000, sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,165 @@
+## built-in libraries
+from pathlib import Path
+
+import sys
+import os
+import time
+import subprocess
+import statistics
+
+## Calculates the path to the modules directory and add it to sys.path
+current_dir = Path(__file__).resolve().parent
+parent_dir = current_dir.parent
+
+## Add the parent directory to sys.path so 'modules' can be found
+sys.path.append(str(parent_dir))
+
+## custom modules
+from modules.common.toolkit import Toolkit
+
+class StartupBenchmark:
+
+    """
+
+    Util script for timing how long Kudasai takes to start, each measurement is taken in a fresh interpreter so nothing is already imported.
+
+    """
+
+    ## the modules Kudasai used to import before showing anything
+    heavy_modules = ["kairyou", "openai", "deepl", "tiktoken", "backoff", "gradio"]
+
+    ## what the console version asks first, the benchmark stops once it is shown
+    first_prompt = "Please enter the path to the input file"
+
+##-------------------start-of-__init__()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def __init__(self) -> None:
+
+        """
+
+        Constructor for StartupBenchmark class.
+
+        """
+
+        os.system("title " + "Startup Benchmark")
+
+##-------------------start-of-time_import()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def time_import(module_name:str) -> float | None:
+
+        """
+
+        Times importing a module in a fresh interpreter.
+
+        Parameters:
+        module_name (str) : the module to import.
+
+        Returns:
+        import_time (float | None) : seconds the import took, None if it failed (i.e. the module isn't installed).
+
+        """
+
+        code = f"import time; start = time.perf_counter(); import {module_name}; print(time.perf_counter() - start)"
+
+        result = subprocess.run([sys.executable, "-c", code], cwd=str(parent_dir), capture_output=True, text=True)
+
+        if(result.returncode != 0):
+            return None
+
+        return float(result.stdout.strip().splitlines()[-1])
+
+##-------------------start-of-time_first_prompt()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def time_first_prompt(timeout:float=60.0) -> float | None:
+
+        """
+
+        Times a cold start of the console version, from launching the interpreter to the first prompt being shown.
+
+        Parameters:
+        timeout (float | optional) : seconds to wait for the prompt before giving up.
+
+        Returns:
+        startup_time (float | None) : seconds until the first prompt, None if it never came.
+
+        """
+
+        start = time.perf_counter()
+
+        process = subprocess.Popen([sys.executable, "-u", "kudasai.py"], cwd=str(parent_dir), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+        startup_time = None
+
+        try:
+
+            output = ""
+
+            while(time.perf_counter() - start < timeout):
+
+                char = process.stdout.read(1) # type: ignore | stdout is always piped here
+
+                if(char == ""):
+                    break
+
+                output += char
+
+                if(output.endswith(StartupBenchmark.first_prompt)):
+                    startup_time = time.perf_counter() - start
+                    break
+
+        finally:
+            process.kill()
+            process.wait()
+
+        return startup_time
+
+##-------------------start-of-run()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    def run(self, num_runs:int) -> None:
+
+        """
+
+        Takes each measurement several times and prints the medians.
+
+        Parameters:
+        self (object - StartupBenchmark) : The StartupBenchmark object.
+        num_runs (int) : how many times to take each measurement.
+
+        """
+
+        print("Runs per measurement : " + str(num_runs) + "\n")
+
+        for module_name in ["kudasai"] + StartupBenchmark.heavy_modules:
+
+            import_times = [StartupBenchmark.time_import(module_name) for _ in range(num_runs)]
+
+            if(None in import_times):
+                print("import " + module_name + " : failed (not installed?)")
+
+            else:
+                print("import " + module_name + " : " + str(round(statistics.median(import_times), 4)) + " seconds") # type: ignore | None was ruled out above
+
+        startup_times = [StartupBenchmark.time_first_prompt() for _ in range(num_runs)]
+
+        if(None in startup_times):
+            print("\nCold start to first prompt : the prompt never came")
+
+        else:
+            print("\nCold start to first prompt : " + str(round(statistics.median(startup_times), 4)) + " seconds") # type: ignore | None was ruled out above
+
+        print()
+
+        Toolkit.pause_console()
+
+##-------------------start-of-sub_main()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+client = StartupBenchmark()
+
+## checks sys arguments, the number of runs is optional
+if(__name__ == '__main__'):
+
+    Toolkit.clear_console()
+
+    client.run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
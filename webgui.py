@@ -1,20 +1,25 @@
 ## built-in libraries
 import typing
 import base64
+import os
+import sys
+import time
 
 ## third-party libraries
 import gradio as gr
 
-from kairyou import Indexer
-from kairyou import Kairyou
-
 ## custom modules
 from modules.common.toolkit import Toolkit
 from modules.common.logger import Logger
 from modules.common.file_ensurer import FileEnsurer
+from modules.common.response_cache import ResponseCache
+from modules.common.translation_job import TranslationJob
+from modules.common.api_key_validations import ApiKeyValidations
+from modules.common.progress_renderer import ProgressRenderer
 
 from modules.gui.gui_file_util import gui_get_text_from_file, gui_get_json_from_file
 from modules.gui.gui_json_util import GuiJsonUtil
+from modules.gui.gui_log_util import GuiLogView
 
 from handlers.json_handler import JsonHandler
 
@@ -49,8 +54,9 @@ class KudasaiGUI:
     }
     """
 
-    ## used for whether the debug log tab for kaiseki/kijiku should be actively refreshing based of Logger.current_batch
-    is_translation_ongoing = False
+    ## how often the debug log boxes check for new lines, and how long they wait for a translation to start
+    log_stream_interval = 0.25
+    log_stream_start_timeout = 10.0
 
 ##-------------------start-of-build_gui()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -66,27 +72,123 @@ class KudasaiGUI:
 
 ##-------------------start-of-Utility-Functions---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-##-------------------start-of-fetch_log_content()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##-------------------start-of-stream_log_content()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-            def fetch_log_content() -> str:
+            def stream_log_content(owner:str) -> typing.Iterator[str]:
 
                 """
                 
-                Fetches the log content from the current log batch.
+                Streams the log of a tab's running translation to its debug log box, pushing only when something new was logged.
+                As each update mostly adds to the end of what was last sent, gradio only sends the new lines to the browser.
+                Only the job the tab started is followed, so a translation running in another tab never shows up in this one.
+
+                Parameters:
+                owner (str) : The owner of the tab's jobs, see get_job_owner().
 
                 Returns:
-                log_text (str) : The log text.
+                log_text (str) : The log text, yielded whenever it changes.
 
                 """
 
-                if(self.is_translation_ongoing == False):
-                    return "No translation ongoing"
+                log_view = GuiLogView()
 
-                if(Logger.current_batch == ""):
-                    return "No log content found."
-                
-                return Logger.current_batch
+                ## the translation is started by the same click, give it a moment to get going
+                time_start = time.time()
+
+                while(TranslationJob.get_owned_by(owner) is None):
+
+                    if(time.time() - time_start > self.log_stream_start_timeout):
+                        yield "No translation ongoing"
+                        return
+
+                    time.sleep(self.log_stream_interval)
+
+                ## ends once the tab's translation does, or once it is cleared, a translation the tab started after it is followed on from there
+                while(True):
+
+                    job = TranslationJob.get_owned_by(owner)
+
+                    if(job is None or job.get_value(FileEnsurer, "do_interrupt", False)):
+                        return
+
+                    if(log_view.update(job)):
+                        yield log_view.get_text()
+
+                    time.sleep(self.log_stream_interval)
+
+##-------------------start-of-stream_kaiseki_log_content()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+            def stream_kaiseki_log_content(request:gr.Request) -> typing.Iterator[str]:
+
+                """
+
+                Streams the log of the Kaiseki translation started by the same click to the Kaiseki tab's debug log box.
+
+                Parameters:
+                request (gr.Request) : The request, whose session the translation belongs to.
+
+                Returns:
+                log_text (str) : The log text, yielded whenever it changes.
+
+                """
+
+                yield from stream_log_content(get_job_owner(request, "kaiseki"))
+
+##-------------------start-of-stream_kijiku_log_content()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+            def stream_kijiku_log_content(request:gr.Request) -> typing.Iterator[str]:
+
+                """
+
+                Streams the log of the Kijiku translation started by the same click to the Kijiku tab's debug log box.
+
+                Parameters:
+                request (gr.Request) : The request, whose session the translation belongs to.
+
+                Returns:
+                log_text (str) : The log text, yielded whenever it changes.
+
+                """
+
+                yield from stream_log_content(get_job_owner(request, "kijiku"))
             
+##-------------------start-of-get_job_owner()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+            def get_job_owner(request:gr.Request, tab:str) -> str:
+
+                """
+
+                Gets the owner of the translation jobs a tab of a browser session starts, so its clear button and debug log box can find its job among everyone else's.
+
+                Parameters:
+                request (gr.Request) : The request.
+                tab (str) : The tab, i.e. "kaiseki" or "kijiku".
+
+                Returns:
+                owner (str) : The owner of the tab's jobs.
+
+                """
+
+                return str(request.session_hash) + "/" + tab
+
+##-------------------start-of-interrupt_job()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+            def interrupt_job(owner:str) -> None:
+
+                """
+
+                Interrupts the running translation job with the given owner, if there is one.
+
+                Parameters:
+                owner (str) : The owner of the job.
+
+                """
+
+                job = TranslationJob.get_owned_by(owner)
+
+                if(job is not None):
+                    job.set_value(FileEnsurer, "do_interrupt", True)
+
 ##-------------------start-of-get_saved_kaiseki_api_key()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
             def get_saved_kaiseki_api_key() -> str:
@@ -163,7 +265,10 @@ class KudasaiGUI:
                     14 : "je_check_mode",
                     15 : "num_malformed_batch_retries",
                     16 : "batch_retry_timeout",
-                    17 : "num_concurrent_batches"
+                    17 : "num_concurrent_batches",
+                    18 : "batch_packing_mode",
+                    19 : "num_tokens_per_batch",
+                    20 : "line_deduplication_mode"
                 }
 
                 for index, setting in enumerate(kijiku_settings):
@@ -269,6 +374,9 @@ class KudasaiGUI:
                             with gr.Row():
                                 self.kaiseki_api_key_input = gr.Textbox(label='API Key', value=get_saved_kaiseki_api_key, lines=1, show_label=True, interactive=True, type='password')
 
+                            with gr.Row():
+                                self.kaiseki_whole_sentence_checkbox = gr.Checkbox(label='Translate Whole Sentences', value=False, info="Sends each line to DeepL once instead of a part at a time, putting the punctuation back afterwards.", interactive=True)
+
                             with gr.Row():
                                 self.translate_button_kaiseki = gr.Button('Translate', variant="primary")
                                 self.clear_button_kaiseki = gr.Button('Clear', variant='stop')
@@ -305,6 +413,9 @@ class KudasaiGUI:
                             with gr.Row():
                                 self.kijiku_api_key_input = gr.Textbox(label='API Key', value=get_saved_kijiku_api_key, lines=1, max_lines=2, show_label=True, interactive=True, type='password')
 
+                            with gr.Row():
+                                self.kijiku_resume_checkbox = gr.Checkbox(label='Resume Interrupted Translation', value=False, info="Skips the batches an interrupted translation of the same text already finished, using the checkpoint journal in the output folder.", interactive=True)
+
                             with gr.Row():
                                 self.translate_button_kijiku = gr.Button('Translate', variant="primary")
                                 self.calculate_costs_button_kijiku = gr.Button('Calculate Costs', variant='secondary')
@@ -472,7 +583,7 @@ class KudasaiGUI:
 
                             self.num_malformed_batch_retries_input_field = gr.Textbox(label='Number of Malformed Batch Retries',
                                                                                       value=GuiJsonUtil.fetch_kijiku_setting_key_values("num_malformed_batch_retries"),
-                                                                                      info="How many times Kijiku will attempt to mend a malformed batch, only for gpt4. Be careful with increasing as cost increases at (cost * length * n) at worst case.",
+                                                                                      info="How many times Kijiku will attempt to mend a malformed batch, only for gpt4. Be careful with increasing as cost increases at (cost * length * n) at worst case. Each retry first tries to keep the lines that line up with the Japanese and only re-request the ones that don't, only resending the whole batch if most of it is off.",
                                                                                       lines=1,
                                                                                       max_lines=1,
                                                                                       show_label=True,
@@ -490,13 +601,38 @@ class KudasaiGUI:
 
                             self.num_concurrent_batches_input_field = gr.Textbox(label='Number of Concurrent Batches Allowed',
                                                                                 value=GuiJsonUtil.fetch_kijiku_setting_key_values("num_concurrent_batches"),
-                                                                                info="How many translations batches Kijiku will send to OpenAI at a time.",
+                                                                                info="How many translations batches Kijiku will send to OpenAI at a time. Kijiku starts lower and raises or lowers the number as OpenAI allows (backing off on rate limits and rising latency), this is the most it will ever send at once.",
                                                                                 lines=1,
                                                                                 max_lines=1,
                                                                                 show_label=True,
                                                                                 interactive=True,
                                                                                 elem_id="num_concurrent_batches")
 
+                            self.batch_packing_mode_input_field = gr.Dropdown(label='Batch Packing Mode',
+                                                                              value=int(GuiJsonUtil.fetch_kijiku_setting_key_values("batch_packing_mode")),
+                                                                              choices=[1, 2],
+                                                                              info="1 or 2. 1 builds batches of num_lines lines. 2 packs each batch up to num_tokens_per_batch tokens instead, which sends far fewer requests on dialogue heavy text and keeps long narration from overflowing the context. In mode 2, lines that are too long for a batch on their own are split at the end of their sentences.",
+                                                                              show_label=True,
+                                                                              interactive=True,
+                                                                              elem_id="batch_packing_mode")
+
+                            self.num_tokens_per_batch_input_field = gr.Textbox(label='Number of Tokens Per Batch',
+                                                                               value=GuiJsonUtil.fetch_kijiku_setting_key_values("num_tokens_per_batch"),
+                                                                               info="The number of tokens of Japanese text to pack into a batch when batch_packing_mode is 2. Kijiku will lower this if the batch, the system message and the expected translation would not fit in the model's context length.",
+                                                                               lines=1,
+                                                                               max_lines=1,
+                                                                               show_label=True,
+                                                                               interactive=True,
+                                                                               elem_id="num_tokens_per_batch")
+
+                            self.line_deduplication_mode_input_field = gr.Dropdown(label='Line Deduplication Mode',
+                                                                                   value=int(GuiJsonUtil.fetch_kijiku_setting_key_values("line_deduplication_mode")),
+                                                                                   choices=[1, 2],
+                                                                                   info="1 or 2. 1 sends every line as it is. 2 sends each distinct line only once per run, so repeated lines like 「はい」, 「え？」, scene separators and chapter headers are translated the first time they appear and that translation is reused everywhere else they occur. The tokens this saves are shown with the cost estimate. A repeat is left untranslated if its first occurrence comes back malformed.",
+                                                                                   show_label=True,
+                                                                                   interactive=True,
+                                                                                   elem_id="line_deduplication_mode")
+
                     with gr.Row():
                         gr.Markdown("(stream, logit_bias, stop and n are included for legacy purposes, current versions of Kudasai will hardcode their values when validating the Kijiku_rule.json to their default values.)")
 
@@ -504,6 +640,13 @@ class KudasaiGUI:
                         self.apply_changes_button = gr.Button('Apply Changes')
                         self.discard_changes_button = gr.Button('Discard Changes', variant='stop')
 
+                    with gr.Row():
+                        self.response_cache_stats_output_field = gr.Textbox(label='Response Cache', lines=6, max_lines=6, show_label=True, interactive=False)
+
+                    with gr.Row():
+                        self.refresh_response_cache_stats_button = gr.Button('Refresh Cache Stats')
+                        self.purge_response_cache_button = gr.Button('Purge Cache', variant='stop')
+
                 ## tab 7 | Logging
                 with gr.Tab("Logging") as self.logging_tab:
 
@@ -532,7 +675,7 @@ class KudasaiGUI:
 
                 """
 
-                Kudasai.connection, update_prompt = Toolkit.check_update()
+                Kudasai.connection, update_prompt = Kudasai.get_update_check_result()
 
                 if(update_prompt != ""):
                     gr.Info("Update available, see https://github.com/Bikatr7/Kudasai/releases/latest/ for more information.")
@@ -570,33 +713,28 @@ class KudasaiGUI:
 
 
                             ## looks like file will just be the file path
-                            ## but directory will be a list of file paths, I can't think of a workaround right now, so will have to update kairyou to accept a list of file paths. 
-                            ## wait nvm im a genius, let's just read all the files and concatenate them into one string lmfao
+                            ## but directory will be a list of file paths, which the knowledge base index takes as is, indexing each file on its own
 
                             knowledge_base_paths = []
-                            knowledge_base_string = ""
 
                             text_to_index = gui_get_text_from_file(input_txt_file)
                             replacements = gui_get_json_from_file(input_json_file_preprocessing)
 
                             if(knowledge_base_file is not None):
-                                knowledge_base_paths.append(knowledge_base_file)
+                                knowledge_base_paths.append(knowledge_base_file.name)
 
                             else:
-                                knowledge_base_paths = [file for file in knowledge_base_directory]
+                                knowledge_base_paths = [file.name for file in knowledge_base_directory]
 
-                            for file in knowledge_base_paths:
-                                knowledge_base_string += gui_get_text_from_file(file)
+                            gr.Info("Indexing takes a while the first time a knowledge base is used, please be patient.")
 
-                            gr.Info("Indexing takes a while, please be patient.")
-
-                            unique_names, indexing_log = Indexer.index(text_to_index, knowledge_base_string, replacements)
+                            ## restored from the stage cache if the text, knowledge base and replacements haven't changed since they were last indexed
+                            ## otherwise only the knowledge base files not already in the knowledge base index are run through the NER model, uploads are matched by their contents
+                            indexed_text, indexing_log = Kudasai.index_text(text_to_index, knowledge_base_paths, replacements)
 
                             ## Indexer does not directly log anything, in case of anything else touching it, we will grab the log from the log file
                             log_text = FileEnsurer.standard_read_file(Logger.log_file_path)
 
-                            indexed_text = Kudasai.mark_indexed_names(text_to_index, unique_names)
-
                             return indexed_text, indexing_log, log_text, log_text
 
                         else:
@@ -642,7 +780,8 @@ class KudasaiGUI:
 
                     replacements = gui_get_json_from_file(input_json_file_preprocessing)
 
-                    preprocessed_text, preprocessing_log, error_log =  Kairyou.preprocess(text_to_preprocess, replacements)
+                    ## restored from the stage cache if the text and replacements haven't changed since they were last preprocessed
+                    preprocessed_text, preprocessing_log, error_log = Kudasai.preprocess_text(text_to_preprocess, replacements)
 
                     timestamp = Toolkit.get_timestamp(is_archival=True)
 
@@ -657,7 +796,7 @@ class KudasaiGUI:
                 
 ##-------------------start-of-kaiseki_translate_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-            def kaiseki_translate_button_click(input_txt_file:gr.File, input_text:gr.Textbox, api_key_input:gr.Textbox) -> typing.Tuple[str, str, str]:
+            async def kaiseki_translate_button_click(input_txt_file:gr.File, input_text:gr.Textbox, api_key_input:gr.Textbox, is_whole_sentence_mode:bool, request:gr.Request) -> typing.Tuple[str, str, str]:
 
                 """
                 
@@ -668,6 +807,8 @@ class KudasaiGUI:
                 input_txt_file (gr.File) : The input txt file.
                 input_text (gr.Textbox) : The input text.
                 api_key_input (gr.Textbox) : The API key input.
+                is_whole_sentence_mode (bool) : Whether to send whole sentences to DeepL rather than sentence parts.
+                request (gr.Request) : The request, whose session the job belongs to.
 
                 Returns:
                 translated_text (str) : The translated text.
@@ -676,62 +817,73 @@ class KudasaiGUI:
 
                 """
 
-                if(Kudasai.connection == False):
-                    raise gr.Error("No internet connection detected, please connect to the internet to use translation features of Kudasai.")
+                ## everything the run touches lives on its own job, so translations started from several tabs don't trip over each other
+                with TranslationJob(owner=get_job_owner(request, "kaiseki")) as job:
 
-                ## in case of subsequent runs, we need to reset the static variables
-                Kaiseki.reset_static_variables()
+                    ## another job is already writing to the usual output files
+                    if(len(TranslationJob.active_jobs) > 1):
+                        FileEnsurer.redirect_run_outputs(os.path.join(FileEnsurer.output_dir, f"job_{job.job_id}"))
 
-                ## start of translation, so we can assume that that we don't want to interrupt it
-                FileEnsurer.do_interrupt = False
+                    if(Kudasai.connection == False):
+                        raise gr.Error("No internet connection detected, please connect to the internet to use translation features of Kudasai.")
 
-                ## if translate button is clicked, we can assume that the translation is ongoing
-                self.is_translation_ongoing = True
+                    ## in case of subsequent runs, we need to reset the static variables
+                    Kaiseki.reset_static_variables()
+
+                    ## start of translation, so we can assume that that we don't want to interrupt it
+                    FileEnsurer.do_interrupt = False
                 
-                if(input_txt_file is None and input_text == ""):
-                    raise gr.Error("No TXT file or text selected")
+                    if(input_txt_file is None and input_text == ""):
+                        raise gr.Error("No TXT file or text selected")
                 
-                if(api_key_input == ""):
-                    raise gr.Error("No API key provided")
+                    if(api_key_input == ""):
+                        raise gr.Error("No API key provided")
                 
-                if(input_txt_file is not None):
-                    text_to_translate = gui_get_text_from_file(input_txt_file)
+                    if(input_txt_file is not None):
+                        text_to_translate = gui_get_text_from_file(input_txt_file)
 
-                else:
-                    text_to_translate = input_text
+                    else:
+                        text_to_translate = input_text
 
-                try:
-                    DeepLService.set_api_key(str(api_key_input))
+                    try:
+                        DeepLService.set_api_key(str(api_key_input))
 
-                    is_valid, e = DeepLService.test_api_key_validity()
+                        if(not ApiKeyValidations.is_validated("deepl", str(api_key_input))):
 
-                    if(is_valid == False and e is not None):
-                        raise e
+                            is_valid, e = DeepLService.test_api_key_validity()
 
-                except:
-                    raise gr.Error("Invalid API key")
+                            if(is_valid == False and e is not None):
+                                raise e
+
+                            ApiKeyValidations.record_validation("deepl", str(api_key_input))
+
+                    except:
+                        raise gr.Error("Invalid API key")
                 
-                Kaiseki.text_to_translate  = [line for line in str(text_to_translate).splitlines()]
+                    Kaiseki.text_to_translate  = [line for line in str(text_to_translate).splitlines()]
 
-                Kaiseki.commence_translation()
+                    Kaiseki.is_whole_sentence_mode = bool(is_whole_sentence_mode)
 
-                Kaiseki.write_kaiseki_results()
+                    ## runs on gradio's event loop rather than tying up a worker thread for the whole translation
+                    await Kaiseki.commence_translation_async()
 
-                ## je check text and translated text are lists of strings, so we need to convert them to strings
-                translated_text = "\n".join(Kaiseki.translated_text)
-                je_check_text = "\n".join(Kaiseki.je_check_text)
+                    Kaiseki.write_kaiseki_results()
 
-                ## Log text is cleared from the client, so we need to get it from the log file
-                log_text = FileEnsurer.standard_read_file(Logger.log_file_path)
+                    ## je check text and translated text are lists of strings, so we need to convert them to strings
+                    translated_text = "\n".join(Kaiseki.translated_text)
+                    je_check_text = "\n".join(Kaiseki.je_check_text)
 
-                ## also gonna want to update the api key file with the new api key
-                FileEnsurer.standard_overwrite_file(FileEnsurer.deepl_api_key_path, base64.b64encode(str(api_key_input).encode('utf-8')).decode('utf-8'), omit=True)
+                    ## Log text is cleared from the client, so we need to get it from the log file
+                    log_text = FileEnsurer.standard_read_file(Logger.log_file_path)
+
+                    ## also gonna want to update the api key file with the new api key
+                    FileEnsurer.standard_overwrite_file(FileEnsurer.deepl_api_key_path, base64.b64encode(str(api_key_input).encode('utf-8')).decode('utf-8'), omit=True)
 
-                return translated_text, je_check_text, log_text
+                    return translated_text, je_check_text, log_text
             
 ##-------------------start-of-kijiku_translate_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
             
-            async def kijiku_translate_button_click(input_txt_file:gr.File, input_text:gr.Textbox, api_key_input:gr.Textbox) -> typing.Tuple[str, str, str]:
+            async def kijiku_translate_button_click(input_txt_file:gr.File, input_text:gr.Textbox, api_key_input:gr.Textbox, is_resuming:bool, request:gr.Request) -> typing.Tuple[str, str, str]:
 
                 """
                 
@@ -742,6 +894,8 @@ class KudasaiGUI:
                 input_txt_file (gr.File) : The input txt file.
                 input_text (gr.Textbox) : The input text.
                 api_key_input (gr.Textbox) : The API key input.
+                is_resuming (bool) : Whether to resume an interrupted translation from the checkpoint journal.
+                request (gr.Request) : The request, whose session the job belongs to.
 
                 Returns:
                 translated_text (str) : The translated text.
@@ -750,69 +904,79 @@ class KudasaiGUI:
                 
                 """
 
-                if(Kudasai.connection == False):
-                    raise gr.Error("No internet connection detected, please connect to the internet to use translation features of Kudasai.")
+                ## everything the run touches lives on its own job, so translations started from several tabs don't trip over each other
+                with TranslationJob(owner=get_job_owner(request, "kijiku")) as job:
 
-                ## in case of subsequent runs, we need to reset the static variables
-                Kijiku.reset_static_variables()
+                    ## another job is already writing to the usual output files
+                    if(len(TranslationJob.active_jobs) > 1):
+                        FileEnsurer.redirect_run_outputs(os.path.join(FileEnsurer.output_dir, f"job_{job.job_id}"))
 
-                ## start of translation, so we can assume that that we don't want to interrupt it
-                FileEnsurer.do_interrupt = False
+                    if(Kudasai.connection == False):
+                        raise gr.Error("No internet connection detected, please connect to the internet to use translation features of Kudasai.")
 
-                ## if translate button is clicked, we can assume that the translation is ongoing
-                self.is_translation_ongoing = True
+                    ## in case of subsequent runs, we need to reset the static variables
+                    Kijiku.reset_static_variables()
 
-                ## first, set the json in the json handler to the json currently set as in gui_json_util
-                JsonHandler.current_kijiku_rules = GuiJsonUtil.current_kijiku_rules
+                    ## start of translation, so we can assume that that we don't want to interrupt it
+                    FileEnsurer.do_interrupt = False
 
-                ## due to the bug with the settings need to validate json again.
-                ## bug has been resolved, but we'll keep this here just in case
-                try:
-                    JsonHandler.validate_json()
+                    ## first, set the json in the json handler to the json currently set as in gui_json_util
+                    JsonHandler.current_kijiku_rules = GuiJsonUtil.current_kijiku_rules
 
-                except:
-                    raise gr.Error("Issue with Kijiku settings detected, please look at the settings tab and ensure all values are valid. This is a known bug, and will be hopefully fixed in the future.")
+                    ## due to the bug with the settings need to validate json again.
+                    ## bug has been resolved, but we'll keep this here just in case
+                    try:
+                        JsonHandler.validate_json()
 
-                ## next api key
-                try:
-                    OpenAIService.set_api_key(str(api_key_input))
+                    except:
+                        raise gr.Error("Issue with Kijiku settings detected, please look at the settings tab and ensure all values are valid. This is a known bug, and will be hopefully fixed in the future.")
 
-                    is_valid, e = await OpenAIService.test_api_key_validity()
+                    ## next api key
+                    try:
+                        OpenAIService.set_api_key(str(api_key_input))
 
-                    if(is_valid == False and e is not None):
-                        raise e
+                        if(not ApiKeyValidations.is_validated("openai", str(api_key_input))):
 
-                except:
-                    raise gr.Error("Invalid API key")
+                            is_valid, e = await OpenAIService.test_api_key_validity()
+
+                            if(is_valid == False and e is not None):
+                                raise e
+
+                            ApiKeyValidations.record_validation("openai", str(api_key_input))
+
+                    except:
+                        raise gr.Error("Invalid API key")
                 
-                ## setup text to translate
-                if(input_txt_file is None and input_text == ""):
-                    raise gr.Error("No TXT file or text selected")
+                    ## setup text to translate
+                    if(input_txt_file is None and input_text == ""):
+                        raise gr.Error("No TXT file or text selected")
                 
-                if(input_txt_file is not None):
-                    text_to_translate = gui_get_text_from_file(input_txt_file)
+                    if(input_txt_file is not None):
+                        text_to_translate = gui_get_text_from_file(input_txt_file)
                 
-                else:
-                    text_to_translate = input_text
+                    else:
+                        text_to_translate = input_text
 
-                ## need to convert to list of strings
-                Kijiku.text_to_translate = [line for line in str(text_to_translate).splitlines()]
+                    ## need to convert to list of strings
+                    Kijiku.text_to_translate = [line for line in str(text_to_translate).splitlines()]
 
-                ## commence translation
-                await Kijiku.commence_translation(is_webgui=True)
-                Kijiku.write_kijiku_results()
+                    Kijiku.is_resuming = bool(is_resuming)
 
-                ## je check text and translated text are lists of strings, so we need to convert them to strings
-                translated_text = "\n".join(Kijiku.translated_text)
-                je_check_text = "\n".join(Kijiku.je_check_text)
+                    ## commence translation
+                    await Kijiku.commence_translation(is_webgui=True)
+                    Kijiku.write_kijiku_results()
 
-                ## Log text is cleared from the client, so we need to get it from the log file
-                log_text = FileEnsurer.standard_read_file(Logger.log_file_path)
+                    ## je check text and translated text are lists of strings, so we need to convert them to strings
+                    translated_text = "\n".join(Kijiku.translated_text)
+                    je_check_text = "\n".join(Kijiku.je_check_text)
+
+                    ## Log text is cleared from the client, so we need to get it from the log file
+                    log_text = FileEnsurer.standard_read_file(Logger.log_file_path)
 
-                ## also gonna want to update the api key file with the new api key
-                FileEnsurer.standard_overwrite_file(FileEnsurer.openai_api_key_path, base64.b64encode(str(api_key_input).encode('utf-8')).decode('utf-8'), omit=True)
+                    ## also gonna want to update the api key file with the new api key
+                    FileEnsurer.standard_overwrite_file(FileEnsurer.openai_api_key_path, base64.b64encode(str(api_key_input).encode('utf-8')).decode('utf-8'), omit=True)
 
-                return translated_text, je_check_text, log_text
+                    return translated_text, je_check_text, log_text
             
 ##-------------------start-of-kijiku_calculate_costs_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -844,10 +1008,20 @@ class KudasaiGUI:
                 else:
                     text_to_translate = input_text
 
-                ## need to convert to list of strings
-                Kijiku.text_to_translate = [line for line in str(text_to_translate).splitlines()]
+                ## the estimate builds the batches, which mustn't touch a translation that might be running
+                with TranslationJob():
 
-                num_tokens, estimated_cost, model = Kijiku.estimate_cost(model)
+                    JsonHandler.current_kijiku_rules = GuiJsonUtil.current_kijiku_rules
+
+                    ## need to convert to list of strings
+                    Kijiku.text_to_translate = [line for line in str(text_to_translate).splitlines()]
+
+                    ## built the same way the translation will build them, so every batch's system message and overhead is counted
+                    ## token counts are cached per line, so clicking again after changing the text or settings only counts what changed
+                    Kijiku.load_translation_settings()
+                    Kijiku.build_translation_batches()
+
+                    num_tokens, estimated_cost, model = Kijiku.estimate_cost(model)
 
                 cost_estimation = "Estimated number of tokens : " + str(num_tokens) + "\n" + "Estimated minimum cost : " + str(estimated_cost) + " USD"
                 
@@ -914,12 +1088,15 @@ class KudasaiGUI:
             
 ##-------------------start-of-kaiseki_run_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
             
-            def kaiseki_clear_button_click() -> typing.Tuple[None, str, str, str, str]:
+            def kaiseki_clear_button_click(request:gr.Request) -> typing.Tuple[None, str, str, str, str]:
 
                 """
                 
                 Clears all fields on the Kaiseki tab. As well as the input fields.
 
+                Parameters:
+                request (gr.Request) : The request, whose session's translation is interrupted.
+
                 Returns:
                 input_txt_file_kaiseki (gr.File) : An empty file.
                 input_text_kaiseki (str) : An empty string.
@@ -930,10 +1107,8 @@ class KudasaiGUI:
                 """
 
                 ## if clear button is clicked, we can assume that the translation is over, or that the user wants to cancel the translation
-                self.is_translation_ongoing = False
-
-                ## Same as above, we can assume that the user wants to cancel the translation
-                FileEnsurer.do_interrupt = True
+                ## only this session's job is interrupted, any other tab's translation carries on
+                interrupt_job(get_job_owner(request, "kaiseki"))
                 
                 input_file_kaiseki = None
 
@@ -947,12 +1122,15 @@ class KudasaiGUI:
             
 ##-------------------start-of-kijiku_clear_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
             
-            def kijiku_clear_button_click() -> typing.Tuple[None, str, gr.File, str, str, str]:
+            def kijiku_clear_button_click(request:gr.Request) -> typing.Tuple[None, str, gr.File, str, str, str]:
 
                 """
                 
                 Clears all fields on the Kijiku tab. As well as the input fields.
 
+                Parameters:
+                request (gr.Request) : The request, whose session's translation is interrupted.
+
                 Returns:
                 input_txt_file_kijiku (gr.File) : An empty file.
                 input_text_kijiku (str) : An empty string.
@@ -963,10 +1141,8 @@ class KudasaiGUI:
                 """
 
                 ## if clear button is clicked, we can assume that the translation is over, or that the user wants to cancel the translation
-                self.is_translation_ongoing = False
-
-                ## Same as above, we can assume that the user wants to cancel the translation
-                FileEnsurer.do_interrupt = True
+                ## only this session's job is interrupted, any other tab's translation carries on
+                interrupt_job(get_job_owner(request, "kijiku"))
 
                 input_file_kijiku = None
 
@@ -1020,7 +1196,10 @@ class KudasaiGUI:
                                         je_check_mode:str,
                                         num_malformed_batch:str,
                                         batch_retry_timeout:str,
-                                        num_concurrent_batches:str) -> None:
+                                        num_concurrent_batches:str,
+                                        batch_packing_mode:str,
+                                        num_tokens_per_batch:str,
+                                        line_deduplication_mode:str) -> None:
                 
                 """
 
@@ -1046,6 +1225,9 @@ class KudasaiGUI:
                 num_malformed_batch (str) : The number of malformed batch retries.
                 batch_retry_timeout (str) : The batch retry timeout.
                 num_concurrent_batches (str) : The number of concurrent batches.
+                batch_packing_mode (str) : The batch packing mode.
+                num_tokens_per_batch (str) : The number of tokens per batch.
+                line_deduplication_mode (str) : The line deduplication mode.
 
 
                 """
@@ -1071,7 +1253,10 @@ class KudasaiGUI:
                                 je_check_mode,
                                 num_malformed_batch,
                                 batch_retry_timeout,
-                                num_concurrent_batches]
+                                num_concurrent_batches,
+                                batch_packing_mode,
+                                num_tokens_per_batch,
+                                line_deduplication_mode]
                 
                 ## create the new key-value pair list
                 new_key_value_tuple_pairs = create_new_key_value_tuple_pairs(settings_list)
@@ -1087,7 +1272,7 @@ class KudasaiGUI:
             
 ##-------------------start-of-refresh_kijiku_settings_fields()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-            def refresh_kijiku_settings_fields(input_kijiku_rules_file:gr.File) -> typing.Tuple[str, str, float, float, str, str, str, str, str, float, float, int, str, int, int, str, str, str]:
+            def refresh_kijiku_settings_fields(input_kijiku_rules_file:gr.File) -> typing.Tuple[str, str, float, float, str, str, str, str, str, float, float, int, str, int, int, str, str, str, int, str, int]:
 
                 """
                 
@@ -1115,6 +1300,9 @@ class KudasaiGUI:
                 num_malformed_batch_retries_input_field_value (str) : The new num malformed batch retries input field value.
                 batch_retry_timeout_input_field_value (str) : The new batch retry timeout input field value.
                 num_concurrent_batches_input_field_value (str) : The new num concurrent batches input field value.
+                batch_packing_mode_input_field_value (int) : The new batch packing mode input field value.
+                num_tokens_per_batch_input_field_value (str) : The new num tokens per batch input field value.
+                line_deduplication_mode_input_field_value (int) : The new line deduplication mode input field value.
 
                 """
 
@@ -1145,17 +1333,20 @@ class KudasaiGUI:
                     num_malformed_batch_retries_input_field_value = str(GuiJsonUtil.fetch_kijiku_setting_key_values("num_malformed_batch_retries"))
                     batch_retry_timeout_input_field_value = str(GuiJsonUtil.fetch_kijiku_setting_key_values("batch_retry_timeout"))
                     num_concurrent_batches_input_field_value = str(GuiJsonUtil.fetch_kijiku_setting_key_values("num_concurrent_batches"))
+                    batch_packing_mode_input_field_value = int(GuiJsonUtil.fetch_kijiku_setting_key_values("batch_packing_mode"))
+                    num_tokens_per_batch_input_field_value = str(GuiJsonUtil.fetch_kijiku_setting_key_values("num_tokens_per_batch"))
+                    line_deduplication_mode_input_field_value = int(GuiJsonUtil.fetch_kijiku_setting_key_values("line_deduplication_mode"))
 
                 except:
 
                     GuiJsonUtil.current_kijiku_rules = JsonHandler.current_kijiku_rules
                     raise gr.Error("Invalid Custom Kijiku Rules File")
                 
-                return model_input_field_value, system_message_input_field_value, temperature_input_field_value, top_p_input_field_value, n_input_field_value, stream_input_field_value, stop_input_field_value, logit_bias_input_field_value, max_tokens_input_field_value, presence_penalty_input_field_value, frequency_penalty_input_field_value, message_mode_input_field_value, num_lines_input_field_value, sentence_fragmenter_mode_input_field_value, je_check_mode_input_field_value, num_malformed_batch_retries_input_field_value, batch_retry_timeout_input_field_value, num_concurrent_batches_input_field_value
+                return model_input_field_value, system_message_input_field_value, temperature_input_field_value, top_p_input_field_value, n_input_field_value, stream_input_field_value, stop_input_field_value, logit_bias_input_field_value, max_tokens_input_field_value, presence_penalty_input_field_value, frequency_penalty_input_field_value, message_mode_input_field_value, num_lines_input_field_value, sentence_fragmenter_mode_input_field_value, je_check_mode_input_field_value, num_malformed_batch_retries_input_field_value, batch_retry_timeout_input_field_value, num_concurrent_batches_input_field_value, batch_packing_mode_input_field_value, num_tokens_per_batch_input_field_value, line_deduplication_mode_input_field_value
             
 ##-------------------start-of-clear_kijiku_settings_input_fields()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
         
-            def clear_kijiku_settings_input_fields() -> typing.Tuple[None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None]:                                                                     
+            def clear_kijiku_settings_input_fields() -> typing.Tuple[None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None]:                                                                     
 
                 """
 
@@ -1181,8 +1372,11 @@ class KudasaiGUI:
                 num_malformed_batch_retries_input_field_value = None
                 batch_retry_timeout_input_field_value = None
                 num_concurrent_batches_input_field_value = None
+                batch_packing_mode_input_field_value = None
+                num_tokens_per_batch_input_field_value = None
+                line_deduplication_mode_input_field_value = None
 
-                return model_input_field_value, system_message_input_field_value, temperature_input_field_value, top_p_input_field_value, n_input_field_value, stream_input_field_value, stop_input_field_value, logit_bias_input_field_value, max_tokens_input_field_value, presence_penalty_input_field_value, frequency_penalty_input_field_value, message_mode_input_field_value, num_lines_input_field_value, sentence_fragmenter_mode_input_field_value, je_check_mode_input_field_value, num_malformed_batch_retries_input_field_value, batch_retry_timeout_input_field_value, num_concurrent_batches_input_field_value
+                return model_input_field_value, system_message_input_field_value, temperature_input_field_value, top_p_input_field_value, n_input_field_value, stream_input_field_value, stop_input_field_value, logit_bias_input_field_value, max_tokens_input_field_value, presence_penalty_input_field_value, frequency_penalty_input_field_value, message_mode_input_field_value, num_lines_input_field_value, sentence_fragmenter_mode_input_field_value, je_check_mode_input_field_value, num_malformed_batch_retries_input_field_value, batch_retry_timeout_input_field_value, num_concurrent_batches_input_field_value, batch_packing_mode_input_field_value, num_tokens_per_batch_input_field_value, line_deduplication_mode_input_field_value
 
 ##-------------------start-of-fetch_log_content()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
             
@@ -1203,6 +1397,40 @@ class KudasaiGUI:
 
                 return log_text, error_log
             
+##-------------------start-of-fetch_response_cache_stats()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+            def fetch_response_cache_stats() -> str:
+
+                """
+
+                Fetches a summary of Kijiku's response cache.
+
+                Returns:
+                cache_stats (str) : The response cache summary.
+
+                """
+
+                return ResponseCache.get_stats()
+
+##-------------------start-of-purge_response_cache_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+            def purge_response_cache_button_click() -> str:
+
+                """
+
+                Deletes everything in Kijiku's response cache.
+
+                Returns:
+                cache_stats (str) : The response cache summary after purging.
+
+                """
+
+                ResponseCache.purge()
+
+                gr.Info("Response Cache Purged")
+
+                return ResponseCache.get_stats()
+
 ##-------------------start-of-send_to_kairyou()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
             def send_to_kairyou(input_text:str) -> str:
@@ -1318,19 +1546,22 @@ class KudasaiGUI:
                                                 inputs=[
                                                     self.input_txt_file_kaiseki, ## input txt file to translate
                                                     self.input_text_kaiseki, ## input text to translate
-                                                    self.kaiseki_api_key_input], ## api key input
+                                                    self.kaiseki_api_key_input, ## api key input
+                                                    self.kaiseki_whole_sentence_checkbox], ## whole sentence mode
                                                 
                                                 outputs=[
                                                     self.output_field_kaiseki, ## translated text
                                                     self.kaiseki_je_check_text_field, ## je check text field on kaiseki tab
-                                                    self.debug_log_output_field_log_tab]) ## debug log on log tab
+                                                    self.debug_log_output_field_log_tab], ## debug log on log tab
+
+                                                concurrency_limit=None) ## translations are scoped per job, so one user's translation must not queue behind another's
             ## for the kaiseki debug log
-            self.translate_button_kaiseki.click(fn=fetch_log_content,
+            self.translate_button_kaiseki.click(fn=stream_kaiseki_log_content,
                                                 inputs=[],
 
                                                 outputs=[self.debug_log_output_field_kaiseki_tab], ## debug log on kaiseki tab
 
-                                                every=.1) ## update every 100ms
+                                                concurrency_limit=None) ## streams until the translation ends, so it must not hold up anyone else's
             
 
 ##-------------------start-of-kijiku_translate_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -1340,19 +1571,22 @@ class KudasaiGUI:
                                                 inputs=[
                                                     self.input_txt_file_kijiku, ## input txt file to translate
                                                     self.input_text_kijiku, ## input text to translate
-                                                    self.kijiku_api_key_input], ## api key input
+                                                    self.kijiku_api_key_input, ## api key input
+                                                    self.kijiku_resume_checkbox], ## whether to resume from the checkpoint journal
                                                 
                                                 outputs=[
                                                     self.kijiku_translated_text_output_field, ## translated text
                                                     self.kijiku_je_check_text_field, ## je check text field on kijiku tab
-                                                    self.debug_log_output_field_log_tab])
+                                                    self.debug_log_output_field_log_tab],
+
+                                                concurrency_limit=None) ## translations are scoped per job, so one user's translation must not queue behind another's
             ## for the kijiku debug log
-            self.translate_button_kijiku.click(fn=fetch_log_content,
+            self.translate_button_kijiku.click(fn=stream_kijiku_log_content,
                                                 inputs=[],
 
                                                 outputs=[self.debug_log_output_field_kijiku_tab], ## debug log on kijiku tab
 
-                                                every=.1) ## update every 100ms
+                                                concurrency_limit=None) ## streams until the translation ends, so it must not hold up anyone else's
             
 
 ##-------------------start-of-kijiku_calculate_costs_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -1362,7 +1596,9 @@ class KudasaiGUI:
                                                             self.input_txt_file_kijiku, ## input txt file to calculate costs
                                                             self.input_text_kijiku], ## input text to calculate costs
                 
-                                                        outputs=[self.kijiku_translated_text_output_field]) ## functions as an output field for the cost output field
+                                                        outputs=[self.kijiku_translated_text_output_field], ## functions as an output field for the cost output field
+
+                                                        concurrency_limit=None) ## must be usable while a translation is running
             
 ##-------------------start-of-indexing_clear_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -1403,7 +1639,9 @@ class KudasaiGUI:
                                                 self.kaiseki_je_check_text_field, ## je check text field on kaiseki tab
                                                 self.debug_log_output_field_kaiseki_tab], ## debug log on kaiseki tab
 
-                                            cancels=kaiseki_translation_process) ## cancels the translation process
+                                            cancels=kaiseki_translation_process, ## cancels the translation process
+
+                                            concurrency_limit=None) ## has to run while the translation it interrupts is still going
 ##-------------------start-of-clear_button_kijiku_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
             
             self.clear_button_kijiku.click(kijiku_clear_button_click,
@@ -1417,7 +1655,9 @@ class KudasaiGUI:
                                                 self.kijiku_je_check_text_field, ## je check text field on kijiku tab
                                                 self.debug_log_output_field_kijiku_tab], ## debug log on kijiku tab
             
-                                            cancels=kijiku_translation_process)
+                                            cancels=kijiku_translation_process,
+
+                                            concurrency_limit=None) ## has to run while the translation it interrupts is still going
 ##-------------------start-of-clear_log_button_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
             self.clear_log_button.click(clear_log_button_click,
@@ -1449,7 +1689,10 @@ class KudasaiGUI:
                                                 self.je_check_mode_input_field, ## je check mode input field
                                                 self.num_malformed_batch_retries_input_field, ## num malformed batch retries input field
                                                 self.batch_retry_timeout_input_field, ## batch retry timeout input field
-                                                self.num_concurrent_batches_input_field], ## num concurrent batches input field
+                                                self.num_concurrent_batches_input_field, ## num concurrent batches input field
+                                                self.batch_packing_mode_input_field, ## batch packing mode input field
+                                                self.num_tokens_per_batch_input_field, ## num tokens per batch input field
+                                                self.line_deduplication_mode_input_field], ## line deduplication mode input field
                                             
                                             outputs=[])
 
@@ -1476,7 +1719,10 @@ class KudasaiGUI:
                                                 self.je_check_mode_input_field, ## je check mode input field
                                                 self.num_malformed_batch_retries_input_field, ## num malformed batch retries input field
                                                 self.batch_retry_timeout_input_field, ## batch retry timeout input field
-                                                self.num_concurrent_batches_input_field]) ## num concurrent batches input field
+                                                self.num_concurrent_batches_input_field, ## num concurrent batches input field
+                                                self.batch_packing_mode_input_field, ## batch packing mode input field
+                                                self.num_tokens_per_batch_input_field, ## num tokens per batch input field
+                                                self.line_deduplication_mode_input_field]) ## line deduplication mode input field
 
 
 ##-------------------start-of-input_kijiku_rules_file_upload()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -1502,7 +1748,10 @@ class KudasaiGUI:
                                                     self.je_check_mode_input_field, ## je check mode input field
                                                     self.num_malformed_batch_retries_input_field, ## num malformed batch retries input field
                                                     self.batch_retry_timeout_input_field, ## batch retry timeout input field
-                                                    self.num_concurrent_batches_input_field]) ## num concurrent batches input field
+                                                    self.num_concurrent_batches_input_field, ## num concurrent batches input field
+                                                    self.batch_packing_mode_input_field, ## batch packing mode input field
+                                                    self.num_tokens_per_batch_input_field, ## num tokens per batch input field
+                                                    self.line_deduplication_mode_input_field]) ## line deduplication mode input field
             
             self.input_kijiku_rules_file.clear(clear_kijiku_settings_input_fields,
                                                 inputs=[],
@@ -1525,7 +1774,27 @@ class KudasaiGUI:
                                                     self.je_check_mode_input_field, ## je check mode input field
                                                     self.num_malformed_batch_retries_input_field, ## num malformed batch retries input field
                                                     self.batch_retry_timeout_input_field, ## batch retry timeout input field
-                                                    self.num_concurrent_batches_input_field]) ## num concurrent batches input field
+                                                    self.num_concurrent_batches_input_field, ## num concurrent batches input field
+                                                    self.batch_packing_mode_input_field, ## batch packing mode input field
+                                                    self.num_tokens_per_batch_input_field, ## num tokens per batch input field
+                                                    self.line_deduplication_mode_input_field]) ## line deduplication mode input field
+
+##-------------------start-of-response_cache_buttons_click()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+            self.kijiku_settings_tab.select(fetch_response_cache_stats,
+                                            inputs=[],
+
+                                            outputs=[self.response_cache_stats_output_field])
+
+            self.refresh_response_cache_stats_button.click(fetch_response_cache_stats,
+                                                           inputs=[],
+
+                                                           outputs=[self.response_cache_stats_output_field])
+
+            self.purge_response_cache_button.click(purge_response_cache_button_click,
+                                                   inputs=[],
+
+                                                   outputs=[self.response_cache_stats_output_field])
 
 ##-------------------start-of-logging_tab.select()---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -1725,6 +1994,12 @@ if(__name__ == '__main__'):
 
     try:
 
+        if("--debug" in sys.argv[1:]):
+            Logger.level = Logger.DEBUG
+
+        ## progress is shown in the browser, nobody is watching the console
+        ProgressRenderer.is_quiet = True
+
         kudasai_gui = KudasaiGUI()
         kudasai_gui.launch()
 